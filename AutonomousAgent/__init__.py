@@ -1,10 +1,11 @@
 from .config import NEWS_TOOLS, IOT_TOOLS, GOOGLE_TOOLS
-from .core import  GoogleAgent, ServiceHandler
+from .core import  GoogleAgent, AgentHost, ServiceHandler
 
 __all__ = [
     "NEWS_TOOLS",
     "IOT_TOOLS",
     "GOOGLE_TOOLS",
     "GoogleAgent",
+    "AgentHost",
     "ServiceHandler", 
 ]
\ No newline at end of file
@@ -0,0 +1,246 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from threading import Thread, Lock
+from typing import Dict, Any, List, Callable
+
+from ..core.assistants import gemini_assistant
+from ..core.assistants.gemini_assistant import GoogleAgent
+from ..core.services.iot_transport import FakeBroker
+from ..core.services.telemetry import telemetry as span_telemetry
+from ..testing import FakeGemini, EchoDevice
+
+
+PROMPT = Path(__file__).resolve().parent.parent / "data" / "prompt.json"
+REPLY  = json.dumps({"response" : "done"})
+
+
+class NoSleep:
+    # stands in for the time module inside gemini_assistant so the pacing sleep of _update_process is not measured
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    def sleep(self, seconds):
+        pass
+
+
+class DispatchTimer:
+    # splits GoogleAgent.dispatch_function_calls wall time into tool bodies and everything around them
+    def __init__(self, agent:GoogleAgent):
+        self.lock = Lock()
+        self.bodies:List[float]   = []
+        self.overhead:List[float] = []
+
+        function_map = agent.service_handler.FUNCTION_MAP
+        for name, function in list(function_map.items()):
+            function_map[name] = self._body(function)
+
+        dispatch = agent.dispatch_function_calls
+        def timed_dispatch(function_calls):
+            with self.lock:
+                self.bodies = []
+            start = time.perf_counter()
+            result = dispatch(function_calls)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.overhead.append(elapsed - max(self.bodies, default=0))
+            return result
+        agent.dispatch_function_calls = timed_dispatch
+
+    def _body(self, function:Callable) -> Callable:
+        def timed(**params):
+            start = time.perf_counter()
+            try:
+                return function(**params)
+            finally:
+                with self.lock:
+                    self.bodies.append(time.perf_counter() - start)
+        return timed
+
+
+def workloads(things:List[str]) -> Dict[str,Dict[str,Any]]:
+    thing = things[0]
+    sensors = [f"{thing}/sensor{i}" for i in range(4)]
+    get_states = ("iot_get_states", {"topics" : sensors})
+    set_states = ("iot_set_states", {"topics" : [f"{thing}/light0/command"], "states" : ["ON"]})
+    return {
+            "chat"           : {"script" : [REPLY], "run" : lambda agent: agent.process_user_query("hello")},
+            "iot_get"        : {"script" : [[get_states], REPLY], "run" : lambda agent: agent.process_user_query("what is the temperature")},
+            "iot_set"        : {"script" : [[set_states], REPLY], "run" : lambda agent: agent.process_user_query("turn on the light")},
+            "parallel_tools" : {"script" : [[get_states, set_states], REPLY], "run" : lambda agent: agent.process_user_query("check and switch")},
+            "fast_path_set"  : {"script" : [REPLY], "run" : lambda agent: agent.process_user_query(f"turn on {thing} light 1")},
+            "fast_path_get"  : {"script" : [REPLY], "run" : lambda agent: agent.process_user_query(f"what is sensor1 of {thing}")},
+            "entry_point"    : {"script" : [REPLY], "run" : lambda agent: agent.entry_point()},
+            "update_process" : {"script" : [REPLY], "run" : lambda agent: agent._update_process()},
+           }
+
+
+def build_agent(things:int, latency:float, jitter:float, videos_folder:str, document:str, telemetry:Dict[str,Any]=None,
+                chunk_delay:float=0, response_cache:Dict[str,Any]=None, voice:Dict[str,Any]=None, memory:Dict[str,Any]=None,
+                video:Dict[str,Any]=None):
+    broker = FakeBroker()
+    names = [f"thing{index}" for index in range(things)]
+    model = FakeGemini(script=[REPLY], latency=latency, jitter=jitter, chunk_delay=chunk_delay)
+    config = {
+              "document_path" : document,
+              "base_context"  : str(PROMPT),
+              "fast_path"     : {},
+              "iot" : {
+                       "iot_endpoint"      : None,
+                       "iot_thing_names"   : names,
+                       "iot_root_cacert"   : None,
+                       "iot_device_cert"   : None,
+                       "iot_private_key"   : None,
+                       "command_timeout"   : 2,
+                       "transport_factory" : broker.client,
+                      },
+             }
+    if telemetry is not None:
+        config["telemetry"] = telemetry
+    if response_cache is not None:
+        config["response_cache"] = response_cache
+    if voice is not None:
+        config["voice"] = voice
+    if memory is not None:
+        config["memory"] = memory
+    if video is not None:
+        config["video"] = video
+    agent = GoogleAgent(service_config=config, api_key="fake", model_name="fake-gemini", videos_folder=videos_folder, model_factory=model)
+
+    while broker.subscriber_count() < 2 * things:
+        time.sleep(0.01)
+    devices = [EchoDevice(broker, name, seed=index) for index, name in enumerate(names)]
+    for device in devices:
+        device.announce()
+    broker.flush()
+
+    def report():
+        while True:
+            for device in devices:
+                device.report()
+            time.sleep(1)
+    Thread(target=report, daemon=True).start()
+
+    iot = agent.service_handler.service_handler.iot_object
+    while not iot.get_iot_status():
+        time.sleep(0.1)
+    return agent, model, names
+
+
+def percentile(samples:List[float], q:float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def measure(agent:GoogleAgent, run:Callable, turns:int, warmup:int) -> Dict[str,float]:
+    for _ in range(warmup):
+        run(agent)
+
+    latencies = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        run(agent)
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    peaks, retained = [], 0
+    baseline = tracemalloc.get_traced_memory()[0]
+    for _ in range(max(1, turns // 4)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        run(agent)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    retained = (tracemalloc.get_traced_memory()[0] - baseline) / len(peaks)
+    tracemalloc.stop()
+
+    return {
+            "p50_ms"         : percentile(latencies, 0.5) * 1e3,
+            "p99_ms"         : percentile(latencies, 0.99) * 1e3,
+            "alloc_peak_kib" : percentile(peaks, 0.5) / 1024,
+            "retained_b"     : retained,
+           }
+
+
+def compare(results:Dict[str,Dict[str,float]], baseline:Dict[str,Dict[str,float]], tolerance:float) -> List[str]:
+    regressions = []
+    for workload, metrics in results.items():
+        for metric in ("p50_ms", "p99_ms", "dispatch_us", "alloc_peak_kib"):
+            previous, current = baseline.get(workload, {}).get(metric), metrics.get(metric)
+            if previous and current is not None and current > previous * (1 + tolerance):
+                regressions.append(f"{workload}.{metric}: {previous:.3f} -> {current:.3f} (+{(current / previous - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GoogleAgent turn overhead against a fake Gemini backend")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--things", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0, help="fake model latency per call, seconds")
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--only", help="comma separated workloads")
+    parser.add_argument("--telemetry", action="store_true", help="run with spans and a JSON lines trace enabled")
+    parser.add_argument("--save", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a metric counts as a regression")
+    args = parser.parse_args()
+
+    results:Dict[str,Dict[str,float]] = {}
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w") as sink:
+        document = os.path.join(folder, "document.txt")
+        with open(document, "w") as file:
+            file.write("benchmark owner document\n")
+
+        with contextlib.redirect_stdout(sink):
+            telemetry = {"trace_file" : os.path.join(folder, "trace.jsonl")} if args.telemetry else None
+            agent, model, names = build_agent(args.things, args.latency, args.jitter, folder, document, telemetry)
+        timer = DispatchTimer(agent)
+        selected = workloads(names)
+        if args.only:
+            selected = {name : selected[name] for name in args.only.split(",")}
+
+        previous_time, gemini_assistant.time = gemini_assistant.time, NoSleep()
+        try:
+            for name, workload in selected.items():
+                model.set_script(workload["script"])
+                timer.overhead = []
+                with contextlib.redirect_stdout(sink):
+                    results[name] = measure(agent, workload["run"], args.turns, args.warmup)
+                results[name]["dispatch_us"] = percentile(timer.overhead, 0.5) * 1e6 if timer.overhead else None
+        finally:
+            gemini_assistant.time = previous_time
+            agent.service_handler.service_handler.iot_object.stop = True
+            agent.service_handler.scheduler.shutdown()
+
+    print(f"{'workload':<16} {'p50':>9} {'p99':>9} {'dispatch':>11} {'alloc/turn':>11} {'retained':>10}")
+    for name, metrics in results.items():
+        dispatch = f"{metrics['dispatch_us']:>8,.0f} us" if metrics["dispatch_us"] is not None else f"{'-':>11}"
+        print(f"{name:<16} {metrics['p50_ms']:>6.3f} ms {metrics['p99_ms']:>6.3f} ms {dispatch} {metrics['alloc_peak_kib']:>7,.1f} KiB {metrics['retained_b']:>8,.0f} B")
+
+    if args.telemetry:
+        print(f"\n{'span':<28} {'count':>8} {'mean':>11}")
+        for name, stats in sorted(span_telemetry.snapshot().items()):
+            print(f"{name:<28} {stats['count']:>8} {stats['mean'] * 1e6:>8,.0f} us")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"args" : vars(args), "results" : results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
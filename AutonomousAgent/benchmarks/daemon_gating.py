@@ -0,0 +1,90 @@
+import argparse
+import random
+import time
+from typing import Dict, Any, List, Tuple
+
+from ..core.assistants.daemon import AgentDaemon
+
+
+def simulate(hours:float, things:int, sensors:int, anomalies:int, mails_per_hour:int, urgent_ratio:float, seed:int):
+    # one batch of updates per simulated second, plus the times anomalies and urgent mails were injected
+    rng = random.Random(seed)
+    seconds = int(hours * 3600)
+    baselines = {f"thing{t}/sensor{s}" : rng.uniform(10, 90) for t in range(things) for s in range(sensors)}
+    lights = {f"thing{t}/light0/state" : "OFF" for t in range(things)}
+
+    spikes = {rng.randrange(300, seconds - 60) : rng.choice(list(baselines)) for _ in range(anomalies)}
+    mail_times = {rng.randrange(seconds) for _ in range(int(mails_per_hour * hours))}
+    urgent_at, spike_until = [], {}
+
+    mail_id = 0
+    for second in range(seconds):
+        if second in spikes:
+            spike_until[spikes[second]] = second + 10
+        batch:List[Tuple[str,tuple]] = []
+        for t in range(things):
+            thing = f"thing{t}"
+            readings:Dict[str,Any] = {}
+            for s in range(sensors):
+                topic = f"{thing}/sensor{s}"
+                value = baselines[topic] + rng.gauss(0, 1)
+                if spike_until.get(topic, -1) >= second:
+                    value += 12
+                readings[topic] = round(value, 2)
+            light = f"{thing}/light0/state"
+            if rng.random() < 0.0005:
+                lights[light] = "ON" if lights[light] == "OFF" else "OFF"
+            readings[light] = lights[light]
+            batch.append(("iot", (thing, readings)))
+
+        if second in mail_times:
+            urgent = rng.random() < urgent_ratio
+            if urgent:
+                urgent_at.append(second)
+            mail_id += 1
+            batch.append(("mail", ({0 : {"Id" : f"m{mail_id}", "From" : "someone@example.com", "Date" : str(second),
+                                         "suject" : "URGENT: pump failure" if urgent else "Weekly newsletter", "Body" : "..."}},)))
+        yield second, batch, sorted(spikes), urgent_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model calls of the significance gated daemon against a model call per tick")
+    parser.add_argument("--hours", type=float, default=1)
+    parser.add_argument("--things", type=int, default=4)
+    parser.add_argument("--sensors", type=int, default=8)
+    parser.add_argument("--anomalies", type=int, default=3)
+    parser.add_argument("--mails-per-hour", type=int, default=30)
+    parser.add_argument("--urgent-ratio", type=float, default=0.1)
+    parser.add_argument("--tick", type=float, default=1.0, help="seconds between entry_point calls of the polling loop")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    incidents:List[Tuple[float,List[Dict[str,Any]]]] = []
+    clock = {"now" : 0.0}
+    daemon = AgentDaemon(on_incident=lambda events: incidents.append((clock["now"], events)))
+
+    scoring, updates = 0.0, 0
+    spikes, urgent = [], []
+    for second, batch, spikes, urgent in simulate(args.hours, args.things, args.sensors, args.anomalies,
+                                                  args.mails_per_hour, args.urgent_ratio, args.seed):
+        clock["now"] = float(second)
+        start = time.perf_counter()
+        daemon._step(batch, float(second))
+        scoring += time.perf_counter() - start
+        updates += len(batch)
+
+    def detected(at:int, kind:str) -> bool:
+        return any(at <= when <= at + 120 and any(event["kind"] == kind for event in events) for when, events in incidents)
+
+    stats = daemon.stats()
+    ticks = args.hours * 3600 / args.tick
+    print(f"updates scored         {updates:,} ({scoring / max(updates, 1) * 1e6:.1f} us each)")
+    print(f"events / significant   {stats['events']:,} / {stats['significant']:,}")
+    print(f"model calls            {len(incidents):,} ({len(incidents) / args.hours:.1f}/hour, polling every {args.tick:g}s: {ticks / args.hours:,.0f}/hour)")
+    print(f"anomalies detected     {sum(detected(at, 'iot') for at in spikes)}/{len(spikes)}")
+    print(f"urgent mails detected  {sum(detected(at, 'mail') for at in urgent)}/{len(urgent)}")
+    print(f"events per incident    {sum(len(events) for _, events in incidents) / max(len(incidents), 1):.1f}")
+
+
+if __name__ == "__main__":
+    main()
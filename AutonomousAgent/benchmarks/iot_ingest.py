@@ -0,0 +1,111 @@
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Dict, Any, List, Tuple
+
+from ..core.services import iot_ingest
+from ..core.services.iot_ingest import MessageIngest
+
+
+class Message:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic:str, payload:bytes):
+        self.topic   = topic
+        self.payload = payload
+
+
+def make_traffic(things:int, messages:int, sensors:int=12, seed:int=0) -> Tuple[List[str], List[Message]]:
+    rng = random.Random(seed)
+    names = [f"thing{index}" for index in range(things)]
+    traffic = []
+    for name in names:
+        features = {"lights" : [f"{name}/light{i}/command" for i in range(4)], "sensors" : [f"{name}/sensor{i}" for i in range(sensors)]}
+        traffic.append(Message(f"{name}/topics", json.dumps(features).encode()))
+
+    for _ in range(messages):
+        name = rng.choice(names)
+        payload = {f"{name}/sensor{i}" : round(rng.uniform(0, 100), 2) for i in range(sensors)}
+        payload.update({f"{name}/light{i}/state" : rng.choice(("ON", "OFF")) for i in range(4)})
+        traffic.append(Message(f"{name}/data/all", json.dumps(payload).encode()))
+    return names, traffic
+
+
+class LegacyCallback:
+    # the IoT._aws_call_back/_update_states pair as it was before MessageIngest, kept as the baseline
+    def __init__(self):
+        self.sensors_data:Dict[str,Any]     = {}
+        self.feature_topics:Dict[str,Any]   = {}
+        self.iot_thing_topics:Dict[str,Any] = {}
+
+    def __call__(self, client, userdata, message):
+        if message.topic.split(("/"))[-1] == "topics":
+            topics = list(json.loads(message.payload).values())
+            self.iot_thing_topics[message.topic.split("/")[0]] = [topic for subtopics in topics for topic in subtopics ]
+        self._update_states(msg=json.loads(message.payload), topic=message.topic)
+
+    def _update_states(self, msg, topic):
+        if (topic == f"{topic.split('/')[0]}/data/all"):
+            self.sensors_data[topic.split('/')[0]] = msg
+        elif (topic == f"{topic.split('/')[0]}/topics"):
+            self.feature_topics[topic.split('/')[0]] = msg
+
+
+def run_legacy(names:List[str], traffic:List[Message]) -> Tuple[float, Any]:
+    callback = LegacyCallback()
+    start = time.perf_counter()
+    for message in traffic:
+        callback(None, None, message)
+    return time.perf_counter() - start, callback.sensors_data
+
+
+def run_ingest(names:List[str], traffic:List[Message], loads) -> Tuple[float, Any]:
+    previous, iot_ingest.loads = iot_ingest.loads, loads
+    try:
+        ingest = MessageIngest(thing_names=names)
+        start = time.perf_counter()
+        for message in traffic:
+            ingest.ingest(message.topic, message.payload)
+        return time.perf_counter() - start, ingest.sensors_data
+    finally:
+        iot_ingest.loads = previous
+
+
+def retained_bytes(builder) -> int:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    state = builder()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del state
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT callback ingest throughput")
+    parser.add_argument("--things", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--sensors", type=int, default=12)
+    args = parser.parse_args()
+
+    names, traffic = make_traffic(args.things, args.messages, args.sensors)
+    runs = [("legacy (json, dict)", lambda: run_legacy(names, traffic)),
+            ("ingest (json)", lambda: run_ingest(names, traffic, json.loads))]
+    try:
+        import orjson
+        runs.append(("ingest (orjson)", lambda: run_ingest(names, traffic, orjson.loads)))
+    except ImportError:
+        print("orjson not installed, skipping the orjson backend")
+
+    print(f"{len(traffic)} messages, {args.things} things, {args.sensors} sensors per payload")
+    for label, run in runs:
+        elapsed, _ = run()
+        memory = retained_bytes(lambda: run()[1])
+        print(f"{label:<22} {len(traffic) / elapsed:>12,.0f} msg/s   state {memory / 1024:>8,.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
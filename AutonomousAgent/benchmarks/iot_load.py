@@ -0,0 +1,150 @@
+import argparse
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from threading import Thread
+from typing import List, Tuple
+
+from ..core.services.iot_service import IoT
+from ..core.services.iot_transport import FakeBroker
+from .iot_ingest import Message, make_traffic
+
+
+def load_replay(path:str) -> Tuple[List[str], List[Message]]:
+    # JSON lines: {"topic": "thing/data/all", "payload": {...}}
+    traffic, names = [], []
+    with open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            payload = record["payload"]
+            traffic.append(Message(record["topic"], payload if isinstance(payload, str) else json.dumps(payload)))
+            thing = record["topic"].split("/")[0]
+            if thing not in names:
+                names.append(thing)
+    return names, traffic
+
+
+def first_messages(traffic:List[Message]) -> List[Message]:
+    # the feature list and one reading per thing, so every thing has state before the timed run
+    seen, priming = set(), []
+    for message in traffic:
+        if message.topic not in seen:
+            seen.add(message.topic)
+            priming.append(message)
+    return priming
+
+
+def start_iot(broker:FakeBroker, names:List[str], timeout:float=30) -> IoT:
+    iot = IoT(iot_endpoint=None, iot_thing_names=names, iot_root_cacert_path=None, iot_device_cert_path=None,
+              iot_private_key_path=None, transport_factory=broker.client)
+    deadline = time.time() + timeout
+    while broker.subscriber_count() < 2 * len(names) and time.time() < deadline:
+        time.sleep(0.01)
+    return iot
+
+
+def publish(broker:FakeBroker, traffic:List[Message], rate:float):
+    interval = 1.0 / rate if rate else 0
+    start = time.perf_counter()
+    for index, message in enumerate(traffic):
+        if interval:
+            delay = start + index * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        broker.publish(message.topic, message.payload)
+
+
+def percentile(samples:List[float], q:float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def run(names:List[str], traffic:List[Message], rate:float, lookups:int) -> dict:
+    broker = FakeBroker()
+    iot = start_iot(broker, names)
+
+    priming = first_messages(traffic)
+    for message in priming:
+        broker.publish(message.topic, message.payload)
+    broker.flush()
+
+    state_topics = [topic for thing in names for topic in iot.sensors_data.get(thing, {})] or ["missing"]
+    publisher = Thread(target=publish, args=(broker, traffic, rate), daemon=True)
+    delivered_before = broker.delivered
+    start = time.perf_counter()
+    publisher.start()
+
+    latencies = []
+    rng = random.Random(1)
+    while publisher.is_alive() or broker.queue.unfinished_tasks:
+        if len(latencies) < lookups:
+            topic = rng.choice(state_topics)
+            lookup_start = time.perf_counter()
+            iot.get_state(topic)
+            latencies.append(time.perf_counter() - lookup_start)
+        else:
+            time.sleep(0.001)
+    broker.flush()
+    elapsed = time.perf_counter() - start
+
+    reconnect_start = time.perf_counter()
+    broker.drop(iot.aws_client)
+    while broker.subscriber_count() < 2 * len(names):
+        time.sleep(0.001)
+    reconnect = time.perf_counter() - reconnect_start
+
+    iot.stop = True
+    return {
+            "throughput"   : (broker.delivered - delivered_before) / elapsed,
+            "lookup_p50_us": percentile(latencies, 0.5) * 1e6,
+            "lookup_p99_us": percentile(latencies, 0.99) * 1e6,
+            "lookup_mean_us": statistics.fmean(latencies) * 1e6 if latencies else float("nan"),
+            "reconnect_ms" : reconnect * 1000,
+           }
+
+
+def state_memory(names:List[str], traffic:List[Message]) -> int:
+    priming = first_messages(traffic)
+
+    tracemalloc.start()
+    broker = FakeBroker()
+    iot = start_iot(broker, names)
+    before = tracemalloc.take_snapshot()
+    for message in priming:
+        broker.publish(message.topic, message.payload)
+    broker.flush()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    iot.stop = True
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IoT load generator on the in-process broker")
+    parser.add_argument("--things", default="10,100,1000", help="comma separated fleet sizes")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="messages per second, 0 for as fast as possible")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--replay", help="JSON lines file of recorded traffic, replaces the synthetic traffic")
+    args = parser.parse_args()
+
+    if args.replay:
+        names, traffic = load_replay(args.replay)
+        sizes = [(names, traffic)]
+    else:
+        sizes = [make_traffic(int(size), args.messages) for size in args.things.split(",")]
+
+    print(f"{'things':>8} {'msg/s':>10} {'get_state p50':>14} {'p99':>10} {'reconnect':>10} {'state':>10}")
+    for names, traffic in sizes:
+        result = run(names, traffic, args.rate, args.lookups)
+        memory = state_memory(names, traffic)
+        print(f"{len(names):>8} {result['throughput']:>10,.0f} {result['lookup_p50_us']:>11,.1f} us {result['lookup_p99_us']:>7,.1f} us"
+              f" {result['reconnect_ms']:>7,.1f} ms {memory / 1024:>7,.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import random
+import time
+from threading import Thread
+from typing import Dict, Any, List
+
+from ..core.services.iot_service import IoT
+from ..core.services.iot_transport import FakeBroker
+from .iot_ingest import Message, make_traffic
+from .iot_load import publish, percentile
+
+
+# (name, IoT options): the per thing loop as it was, the same with batched requests, and the scalable mode
+MODES = [
+         ("per-thing",       {"subscription" : "per_thing", "subscribe_batch" : 1}),
+         ("per-thing batch", {"subscription" : "per_thing", "subscribe_batch" : 8}),
+         ("wildcard shards", {"subscription" : "wildcard", "shards" : 16}),
+        ]
+
+
+def wait_subscribed(broker:FakeBroker, expected:int, timeout:float=600):
+    deadline = time.time() + timeout
+    while broker.subscriber_count() < expected and time.time() < deadline:
+        time.sleep(0.001)
+
+
+def run(names:List[str], traffic:List[Message], options:Dict[str,Any], round_trip:float, lookups:int) -> Dict[str,float]:
+    broker = FakeBroker(round_trip=round_trip)
+    expected = 2 if options["subscription"] == "wildcard" else 2 * len(names)
+
+    start = time.perf_counter()
+    iot = IoT(iot_endpoint=None, iot_thing_names=names, iot_root_cacert_path=None, iot_device_cert_path=None,
+              iot_private_key_path=None, transport_factory=broker.client, **options)
+    wait_subscribed(broker, expected)
+    setup = time.perf_counter() - start
+    client_id = len(iot.aws_client.client_id)
+
+    # every thing announces its topics and reports once, then the mixed traffic runs while a reader takes snapshots
+    announced = {message.topic.split("/")[0] for message in traffic if message.topic.endswith("/topics")}
+    priming = [message for message in traffic if message.topic.endswith("/topics")]
+    for message in priming:
+        broker.publish(message.topic, message.payload)
+    broker.flush()
+    data = [message for message in traffic if not message.topic.endswith("/topics")]
+
+    publisher = Thread(target=publish, args=(broker, data, 0), daemon=True)
+    delivered = broker.delivered
+    begin = time.perf_counter()
+    publisher.start()
+    snapshots = []
+    while publisher.is_alive() or broker.queue.unfinished_tasks:
+        snapshot_start = time.perf_counter()
+        iot.get_all_data()
+        snapshots.append(time.perf_counter() - snapshot_start)
+        time.sleep(0.001)
+    broker.flush()
+    throughput = (broker.delivered - delivered) / (time.perf_counter() - begin)
+
+    rng = random.Random(0)
+    things = sorted(announced)
+    state_latency, command_latency = [], []
+    for _ in range(lookups):
+        thing = rng.choice(things)
+        lookup_start = time.perf_counter()
+        iot.get_state(f"{thing}/sensor{rng.randrange(12)}")
+        state_latency.append(time.perf_counter() - lookup_start)
+        command_start = time.perf_counter()
+        commands = iot.send_command(f"{thing}/light{rng.randrange(4)}/command", "ON")
+        command_latency.append(time.perf_counter() - command_start)
+        for command in commands:
+            iot.command_tracker.discard(command)
+
+    # a network failure: the broker drops the client, IoT reconnects and subscribes again
+    reconnect_start = time.perf_counter()
+    broker.drop(iot.aws_client)
+    wait_subscribed(broker, expected)
+    reconnect = time.perf_counter() - reconnect_start
+
+    iot.stop = True
+    iot.scheduler.shutdown()
+    return {
+            "setup_s"        : setup,
+            "client_id"      : client_id,
+            "throughput"     : throughput,
+            "snapshot_p50"   : percentile(snapshots, 0.5),
+            "state_p50"      : percentile(state_latency, 0.5),
+            "command_p50"    : percentile(command_latency, 0.5),
+            "reconnect_s"    : reconnect,
+           }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IoT fleet size scaling: subscriptions, client id, ingest, lookups and reconnect")
+    parser.add_argument("--things", default="100,1000,10000", help="comma separated fleet sizes")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--round-trip", type=float, default=0.0005, help="seconds per SUBSCRIBE request on the fake broker")
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'things':>7} {'mode':>16} {'subscribe':>10} {'client id':>10} {'msg/s':>9} {'snapshot':>10} {'get_state':>10}"
+          f" {'command':>10} {'reconnect':>10}")
+    for size in args.things.split(","):
+        names, traffic = make_traffic(int(size), args.messages)
+        for name, options in MODES:
+            result = run(names, traffic, options, args.round_trip, args.lookups)
+            print(f"{len(names):>7} {name:>16} {result['setup_s']:>8.3f} s {result['client_id']:>10} {result['throughput']:>9,.0f}"
+                  f" {result['snapshot_p50'] * 1e6:>7,.0f} us {result['state_p50'] * 1e6:>7,.1f} us {result['command_p50'] * 1e6:>7,.1f} us"
+                  f" {result['reconnect_s']:>8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+from typing import Dict, Any, List
+
+from ..core.services.memory import rss_bytes, memory_tracer
+from ..core.services.news_service import ArticleStore
+from .agent_turns import build_agent
+from .parse_offload import WORDS
+
+
+# a long running agent: every turn a new question, a long answer, an analysed clip and a few news articles
+
+
+def text(rng:random.Random, words:int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def budgets(enabled:bool, kib:int) -> Dict[str,Any]:
+    limit = kib * 1024 if enabled else None
+    return {
+            "memory"         : {"chat_history_bytes" : limit} if enabled else {},
+            "response_cache" : {"ttl" : 3600, "max_entries" : 100000, "max_bytes" : limit},
+            "video"          : {"path" : None, "max_events" : 100000, "max_bytes" : limit},
+            "news"           : {"max_articles" : 100000, "max_bytes" : limit},
+           }
+
+
+def run(enabled:bool, turns:int, checkpoints:int, kib:int, folder:str, document:str, sink) -> List[Dict[str,Any]]:
+    config = budgets(enabled, kib)
+    rng = random.Random(0)
+    answer = json.dumps({"response" : text(rng, 600), "action" : "none"})
+    with contextlib.redirect_stdout(sink):
+        agent, model, _ = build_agent(2, 0, 0, folder, document, response_cache=config["response_cache"], memory=config["memory"],
+                                      video=config["video"])
+    model.set_script([answer])
+    handler = agent.service_handler.service_handler
+    news = ArticleStore(**config["news"])
+
+    rows = []
+    memory_tracer.start()
+    try:
+        for turn in range(1, turns + 1):
+            agent.process_user_query(f"question number {turn} about the house")
+            handler.add_video_event(camera="garden", path=f"garden/{turn}.mp4", description=text(rng, 200))
+            news.add([{"title" : f"headline {turn}-{index}", "text" : f"{turn} {index} " + text(rng, 150)} for index in range(3)])
+            if turn % max(1, turns // checkpoints) == 0:
+                usage = agent.memory_usage()
+                rows.append({
+                             "turn"     : turn,
+                             "chat"     : usage["chat_history"]["bytes"],
+                             "cache"    : usage["response_cache"]["bytes"],
+                             "video"    : usage["video"]["bytes"],
+                             "news"     : news.memory_usage()["bytes"],
+                             "traced"   : usage["process"]["traced"],
+                             "rss"      : rss_bytes(),
+                            })
+    finally:
+        memory_tracer.stop()
+        with contextlib.redirect_stdout(sink):
+            handler.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of the in-memory stores over a long session, with and without byte budgets")
+    parser.add_argument("--turns", type=int, default=600)
+    parser.add_argument("--checkpoints", type=int, default=4)
+    parser.add_argument("--budget-kib", type=int, default=256, help="byte budget of each store")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w") as sink:
+        document = os.path.join(folder, "document.txt")
+        with open(document, "w") as file:
+            file.write("Company document.\n")
+
+        print(f"{'budgets':>8} {'turn':>6} {'chat':>10} {'cache':>10} {'video':>10} {'news':>10} {'traced':>10} {'rss':>10}")
+        for enabled in (False, True):
+            for row in run(enabled, args.turns, args.checkpoints, args.budget_kib, folder, document, sink):
+                print(f"{'on' if enabled else 'off':>8} {row['turn']:>6}" + "".join(
+                      f" {row[key] / 1024:>6,.0f} KiB" for key in ("chat", "cache", "video", "news", "traced", "rss")))
+
+
+if __name__ == "__main__":
+    main()
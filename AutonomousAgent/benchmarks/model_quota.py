@@ -0,0 +1,95 @@
+import argparse
+import time
+from threading import Thread, Lock
+from typing import Dict, Any, List, Callable
+
+import google.api_core.exceptions
+from tenacity import retry, wait_random_exponential, stop_after_attempt
+
+from ..core.services.model_governor import ModelGovernor, PRIORITIES
+from ..testing import FakeGemini
+
+
+# callers per priority: users asking questions, daemon incidents and video analysis all hitting the same quota
+CALLERS:Dict[str,int] = {"interactive" : 8, "incident" : 4, "background" : 8}
+
+
+def percentile(samples:List[float], q:float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def tenacity_caller(send:Callable[[str], Any]) -> Callable[[str, str], Any]:
+    # what GoogleAgent did before: every caller retries on its own
+    @retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3), reraise=True)
+    def call(content:str, priority:str):
+        return send(content)
+    return call
+
+
+def governed_caller(send:Callable[[str], Any], governor:ModelGovernor) -> Callable[[str, str], Any]:
+    def call(content:str, priority:str):
+        return governor.call(send, content, priority=priority)
+    return call
+
+
+def run(mode:str, duration:float, requests_per_minute:int, concurrency:int, latency:float) -> Dict[str,Any]:
+    model = FakeGemini(script=["{}"], latency=latency, jitter=latency / 2, requests_per_minute=requests_per_minute, max_concurrency=concurrency)
+    chat = model(model_name="fake-gemini").start_chat()
+    governor = ModelGovernor(requests_per_minute=requests_per_minute, initial_concurrency=concurrency * 2, max_concurrency=concurrency * 4)
+    call = governed_caller(chat.send_message, governor) if mode == "governor" else tenacity_caller(chat.send_message)
+
+    lock = Lock()
+    latencies:Dict[str,List[float]] = {name : [] for name in PRIORITIES}
+    failures = {"count" : 0}
+    deadline = time.monotonic() + duration
+
+    def caller(priority:str):
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                call("x" * 400, priority)
+            except google.api_core.exceptions.GoogleAPIError:
+                with lock:
+                    failures["count"] += 1
+                continue
+            with lock:
+                latencies[priority].append(time.monotonic() - start)
+
+    threads = [Thread(target=caller, args=(priority,), daemon=True) for priority, count in CALLERS.items() for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=duration + 120)
+
+    # whichever server limit binds first: the request rate or the calls in flight
+    capacity = min(requests_per_minute * duration / 60, concurrency * duration / latency)
+    return {
+            "served"    : model.quota.served,
+            "rejected"  : model.quota.rejected,
+            "failed"    : failures["count"],
+            "capacity"  : model.quota.served / capacity,
+            "latency"   : {name : (percentile(samples, 0.5), percentile(samples, 0.99), len(samples)) for name, samples in latencies.items()},
+            "limit"     : governor.limit if mode == "governor" else None,
+           }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model calls under a server quota, per caller tenacity retries against the shared governor")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--requests-per-minute", type=int, default=1200)
+    parser.add_argument("--concurrency", type=int, default=4, help="calls the fake server accepts at once")
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    for mode in ("tenacity", "governor"):
+        result = run(mode, args.duration, args.requests_per_minute, args.concurrency, args.latency)
+        print(f"{mode}: served {result['served']} ({result['capacity'] * 100:.0f}% of capacity), "
+              f"429s {result['rejected']}, failed calls {result['failed']}"
+              + (f", final concurrency {result['limit']:.1f}" if result["limit"] is not None else ""))
+        for name, (p50, p99, count) in result["latency"].items():
+            print(f"    {name:<12} {count:>6} calls  p50 {p50 * 1000:>8.0f} ms  p99 {p99 * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Any, List
+
+from ..core.assistants.agent_host import AgentHost
+from ..core.assistants.gemini_assistant import GoogleAgent
+from ..core.services.iot_transport import FakeBroker
+from ..testing import FakeGemini, EchoDevice
+
+
+PROMPT = Path(__file__).resolve().parent.parent / "data" / "prompt.json"
+REPLY  = json.dumps({"response" : "done"})
+
+
+def tenant_config(tenant:str, things:int, broker:FakeBroker, document:str) -> Dict[str,Any]:
+    return {
+            "document_path" : document,
+            "base_context"  : str(PROMPT),
+            "iot" : {
+                     "iot_endpoint"      : None,
+                     "iot_thing_names"   : [f"{tenant}-thing{index}" for index in range(things)],
+                     "iot_root_cacert"   : None,
+                     "iot_device_cert"   : None,
+                     "iot_private_key"   : None,
+                     "transport_factory" : broker.client,
+                    },
+           }
+
+
+def wait_subscribed(broker:FakeBroker, count:int):
+    while broker.subscriber_count() < count:
+        time.sleep(0.005)
+
+
+def start_devices(broker:FakeBroker, configs:List[Dict[str,Any]]) -> List[EchoDevice]:
+    devices = [EchoDevice(broker, name, seed=index) for index, name in enumerate(name for config in configs for name in config["iot"]["iot_thing_names"])]
+    for device in devices:
+        device.announce()
+        device.report()
+    broker.flush()
+    return devices
+
+
+def run(tenants:int, things:int, hosted:bool, folder:str, document:str) -> Dict[str,float]:
+    broker = FakeBroker()
+    model = FakeGemini(script=[REPLY])
+    configs = [tenant_config(f"t{index}", things, broker, document) for index in range(tenants)]
+
+    threads_before = threading.active_count()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        if hosted:
+            host = AgentHost(api_key="fake", model_name="fake-gemini", model_factory=model)
+            agents = [host.add(f"t{index}", config, videos_folder=folder) for index, config in enumerate(configs)]
+        else:
+            agents = [GoogleAgent(service_config=config, api_key="fake", model_name="fake-gemini", videos_folder=folder, model_factory=model)
+                      for config in configs]
+        wait_subscribed(broker, 2 * tenants * things)
+        start_devices(broker, configs)
+        for agent in agents:
+            agent.process_user_query("hello")
+    startup = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    threads = threading.active_count() - threads_before
+
+    for agent in agents:
+        handler = agent.service_handler.service_handler
+        handler.iot_object.stop = True
+        handler.scheduler.shutdown()
+    if hosted:
+        host.shutdown()
+    return {
+            "threads_per_tenant"  : threads / tenants,
+            "memory_per_tenant"   : memory / tenants,
+            "startup_per_tenant"  : startup / tenants,
+           }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Threads and memory per tenant, AgentHost against one GoogleAgent per household")
+    parser.add_argument("--tenants", default="10,50,100", help="comma separated tenant counts")
+    parser.add_argument("--things", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        document = os.path.join(folder, "document.txt")
+        with open(document, "w") as file:
+            file.write("benchmark owner document\n")
+
+        print(f"{'tenants':>8} {'mode':>10} {'threads/tenant':>15} {'memory/tenant':>14} {'startup/tenant':>15}")
+        for tenants in (int(count) for count in args.tenants.split(",")):
+            for hosted in (False, True):
+                result = run(tenants, args.things, hosted, folder, document)
+                print(f"{tenants:>8} {'host' if hosted else 'standalone':>10} {result['threads_per_tenant']:>15.2f} "
+                      f"{result['memory_per_tenant'] / 1024:>10,.0f} KiB {result['startup_per_tenant'] * 1000:>12.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import base64
+import json
+import random
+import time
+from threading import Thread, Event
+from typing import Dict, Any, List
+
+from ..core.services.google_service import Google
+from ..core.services.news_service import WebScraper
+from ..core.services.iot_ingest import MessageIngest
+from ..core.services.parse_pool import ParsePool
+from .iot_load import percentile
+
+
+WORDS = "the sensor kitchen meeting invoice garden light report weather tomorrow energy window door family".split()
+
+
+def make_messages(count:int, body_words:int=1500, seed:int=0) -> List[Dict[str,Any]]:
+    # Gmail API messages.get responses, multipart with a base64 text/plain part
+    rng = random.Random(seed)
+    messages = []
+    for index in range(count):
+        body = " ".join(rng.choice(WORDS) for _ in range(body_words))
+        data = base64.urlsafe_b64encode(body.encode()).decode()
+        messages.append({
+                        "id"           : f"m{index}",
+                        "threadId"     : f"t{index // 3}",
+                        "internalDate" : str(1700000000000 + index * 1000),
+                        "payload"      : {
+                                          "headers" : [{"name" : "From", "value" : f"sender{index}@example.com"},
+                                                       {"name" : "Subject", "value" : f"message {index}"}],
+                                          "parts"   : [{"mimeType" : "text/html", "body" : {"data" : data}},
+                                                       {"mimeType" : "text/plain", "body" : {"data" : data}}]
+                                         }
+                        })
+    return messages
+
+
+def make_page(articles:int, seed:int=0) -> str:
+    rng = random.Random(seed)
+    blocks = []
+    for index in range(articles):
+        text = " ".join(rng.choice(WORDS) for _ in range(120))
+        blocks.append(f"<article><h2><a href='/news/{index}'>headline {index}</a></h2><p>{text}</p><span>{index}</span></article>")
+    return f"<html><body><nav>{'<a href=/x>x</a>' * 50}</nav>{''.join(blocks)}</body></html>"
+
+
+def iot_lateness(ingest:MessageIngest, interval:float, stop:Event, lateness:List[float]):
+    # an MQTT callback due every interval, how late it runs is what a refresh costs the sensors
+    payloads = [json.dumps({f"thing0/sensor{i}" : i + step for i in range(12)}).encode() for step in range(7)]
+    due = time.perf_counter()
+    sequence = 0
+    while not stop.is_set():
+        due += interval
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        lateness.append(max(0.0, time.perf_counter() - due))
+        sequence += 1
+        ingest.ingest("thing0/data/all", payloads[sequence % len(payloads)])
+
+
+def refresh(google:Google, scraper:WebScraper, messages:List[Dict[str,Any]], pages:List[str]) -> float:
+    start = time.perf_counter()
+    mails = google._parse_messages(messages)
+    articles = [article for page in pages for article in scraper._extract_articles(page)]
+    assert len(mails) == len(messages) and articles
+    return time.perf_counter() - start
+
+
+def run(parser:ParsePool, messages:List[Dict[str,Any]], pages:List[str], interval:float, rounds:int) -> Dict[str,float]:
+    google = Google(client_credentials_file_path=None, parser=parser)
+    scraper = WebScraper(reference_website="https://news.example.com", load_links=False, parser=parser)
+    ingest = MessageIngest(["thing0"])
+    parser.warm()
+
+    stop, lateness = Event(), []
+    callback = Thread(target=iot_lateness, args=(ingest, interval, stop, lateness), daemon=True)
+    callback.start()
+    durations = [refresh(google, scraper, messages, pages) for _ in range(rounds)]
+    stop.set()
+    callback.join()
+    return {
+            "refresh_s"      : sum(durations) / len(durations),
+            "late_p50_ms"    : percentile(lateness, 0.5) * 1000,
+            "late_p99_ms"    : percentile(lateness, 0.99) * 1000,
+            "late_max_ms"    : max(lateness) * 1000 if lateness else float("nan"),
+            "callbacks"      : len(lateness),
+           }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IoT callback lateness while mails and news pages are parsed")
+    parser.add_argument("--mails", type=int, default=1000)
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--articles", type=int, default=60, help="articles per page")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between IoT callbacks")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    messages = make_messages(args.mails)
+    pages = [make_page(args.articles, seed=index) for index in range(args.pages)]
+
+    print(f"{'parsing':>10} {'refresh':>10} {'late p50':>10} {'p99':>10} {'max':>10} {'callbacks':>10}")
+    for name, pool in (("inline", ParsePool(workers=0)), (f"{args.workers} procs", ParsePool(workers=args.workers))):
+        try:
+            result = run(pool, messages, pages, args.interval, args.rounds)
+        finally:
+            pool.shutdown()
+        print(f"{name:>10} {result['refresh_s']:>8.2f} s {result['late_p50_ms']:>7.2f} ms {result['late_p99_ms']:>7.2f} ms"
+              f" {result['late_max_ms']:>7.2f} ms {result['callbacks']:>10}")
+
+
+if __name__ == "__main__":
+    main()
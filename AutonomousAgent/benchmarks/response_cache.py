@@ -0,0 +1,79 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, Any, List
+
+from .agent_turns import build_agent, percentile
+
+
+ANSWER = json.dumps({"response" : "Everything looks normal in the house.", "action" : "none"})
+# the same few questions, worded the way people repeat them
+QUESTIONS:List[str] = ["How is the house?", "how is the house", "Is everything OK at home?", "is everything ok at home",
+                       "What is the temperature in the living room?", "what is the temperature in the living room"]
+
+
+def workloads(thing:str) -> Dict[str,list]:
+    return {
+            "answer"     : [ANSWER],
+            "state_read" : [[("iot_get_states", {"topics" : [f"{thing}/light0/state"]})], ANSWER],
+            "sensor_read": [[("iot_get_states", {"topics" : [f"{thing}/sensor0"]})], ANSWER], # a new reading every second
+            "action"     : [[("iot_set_states", {"topics" : [f"{thing}/light0/command"], "states" : ["ON"]})], ANSWER],
+           }
+
+
+def run(cache:bool, turns:int, latency:float, folder:str, document:str, sink) -> Dict[str,Dict[str,Any]]:
+    with contextlib.redirect_stdout(sink):
+        agent, model, names = build_agent(2, latency, 0, folder, document, response_cache={"ttl" : 600} if cache else None)
+    results = {}
+    try:
+        for name, script in workloads(names[0]).items():
+            model.set_script(script)
+            if agent.response_cache:
+                agent.response_cache.clear()
+            rng = random.Random(0)
+            served = model.quota.served
+            samples:List[float] = []
+            with contextlib.redirect_stdout(sink):
+                for _ in range(turns):
+                    start = time.perf_counter()
+                    agent.process_user_query(rng.choice(QUESTIONS))
+                    samples.append(time.perf_counter() - start)
+            stats = agent.response_cache.stats() if agent.response_cache else {}
+            results[name] = {
+                             "model_calls" : model.quota.served - served,
+                             "p50"         : percentile(samples, 0.5),
+                             "hits"        : stats.get("hits", 0),
+                             "invalidated" : stats.get("invalidated", 0),
+                            }
+            if agent.response_cache:
+                agent.response_cache.counters.update({key : 0 for key in agent.response_cache.counters})
+    finally:
+        agent.service_handler.service_handler.iot_object.stop = True
+        agent.service_handler.scheduler.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model calls saved by the response cache on repeated questions")
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency, seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w") as sink:
+        document = os.path.join(folder, "document.txt")
+        with open(document, "w") as file:
+            file.write("benchmark owner document\n")
+
+        print(f"{'workload':<11} {'cache':<5} {'model calls':>11} {'p50':>9} {'hits':>5} {'invalidated':>12}")
+        for cache in (False, True):
+            for name, result in run(cache, args.turns, args.latency, folder, document, sink).items():
+                print(f"{name:<11} {'on' if cache else 'off':<5} {result['model_calls']:>11} {result['p50'] * 1000:>6.1f} ms "
+                      f"{result['hits']:>5} {result['invalidated']:>12}")
+
+
+if __name__ == "__main__":
+    main()
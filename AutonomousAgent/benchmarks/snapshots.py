@@ -0,0 +1,60 @@
+import argparse
+import json
+import time
+from threading import Thread, Event
+from typing import Dict, Any, Callable
+
+from ..core.services.snapshot import SnapshotMap
+
+
+def run(mode:str, things:int, readers:int, duration:float) -> Dict[str,Any]:
+    # one MQTT like writer adding and updating things, tool calls walking the whole state at the same time
+    state = SnapshotMap() if mode == "snapshot" else {}
+    read:Callable[[], dict] = (lambda: state.snapshot().data) if mode == "snapshot" else (lambda: state)
+    stop = Event()
+    counters = {"writes" : 0, "reads" : 0, "errors" : 0}
+
+    def writer():
+        index = 0
+        while not stop.is_set():
+            thing = f"thing{index % things}"
+            state[thing] = {f"{thing}/sensor{sensor}" : index + sensor for sensor in range(8)}
+            index += 1
+        counters["writes"] = index
+
+    def reader():
+        reads, errors = 0, 0
+        while not stop.is_set():
+            try:
+                # what a tool does with it: walk every thing, then serialise the answer
+                json.dumps({thing : len(readings) for thing, readings in read().items()})
+                reads += 1
+            except RuntimeError: # dictionary changed size during iteration
+                errors += 1
+        counters["reads"] += reads
+        counters["errors"] += errors
+
+    threads = [Thread(target=writer)] + [Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {key : value / duration if key != "errors" else value for key, value in counters.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Readers walking the IoT state while the MQTT thread writes it, live dict against copy on write")
+    parser.add_argument("--things", type=int, default=2000, help="distinct things, the state grows until each has reported")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=3)
+    args = parser.parse_args()
+
+    for mode in ("live", "snapshot"):
+        result = run(mode, args.things, args.readers, args.duration)
+        print(f"{mode:<9} writes {result['writes']:>10,.0f}/s   reads {result['reads']:>8,.0f}/s   reader crashes {result['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
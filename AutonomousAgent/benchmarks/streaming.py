@@ -0,0 +1,64 @@
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Any, List
+
+from .agent_turns import build_agent, percentile
+
+
+ANSWER = json.dumps({"response" : "The living room light is on and the temperature is 22 degrees. " * 6, "action" : "none"})
+
+
+def first_output(agent, query:str) -> Dict[str,float]:
+    # seconds until the first decoded character of the reply, and until the whole result
+    start = time.perf_counter()
+    first = None
+    for event in agent.stream_user_query(query):
+        if first is None and event["type"] == "field":
+            first = time.perf_counter() - start
+        if event["type"] == "result":
+            return {"first" : first if first is not None else time.perf_counter() - start, "total" : time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first token of stream_user_query against process_user_query")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model time to the first chunk, seconds")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="fake model time between chunks, seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w") as sink:
+        document = os.path.join(folder, "document.txt")
+        with open(document, "w") as file:
+            file.write("benchmark owner document\n")
+        with contextlib.redirect_stdout(sink):
+            agent, model, names = build_agent(2, args.latency, 0, folder, document, chunk_delay=args.chunk_delay)
+
+        workloads = {
+                     "answer"     : [ANSWER],
+                     "tool_call"  : [[("iot_get_states", {"topics" : [f"{names[0]}/sensor0"]})], ANSWER],
+                    }
+        try:
+            print(f"{'workload':<10} {'blocking p50':>13} {'first token p50':>16} {'stream total p50':>17}")
+            for name, script in workloads.items():
+                model.set_script(script)
+                blocking:List[float] = []
+                streamed:List[Dict[str,float]] = []
+                with contextlib.redirect_stdout(sink):
+                    for _ in range(args.turns):
+                        start = time.perf_counter()
+                        agent.process_user_query("how is the living room")
+                        blocking.append(time.perf_counter() - start)
+                        streamed.append(first_output(agent, "how is the living room"))
+                print(f"{name:<10} {percentile(blocking, 0.5) * 1000:>10.0f} ms {percentile([run['first'] for run in streamed], 0.5) * 1000:>13.0f} ms "
+                      f"{percentile([run['total'] for run in streamed], 0.5) * 1000:>14.0f} ms")
+        finally:
+            agent.service_handler.service_handler.iot_object.stop = True
+            agent.service_handler.scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+from typing import Dict, Any, List, Iterator
+
+import numpy as np
+
+from .agent_turns import build_agent
+from ..core.assistants.voice import read_wav
+from ..testing import FakeSynthesizer, conversation
+
+
+# a short question, a long request and a click the detector should ignore, in a quiet room
+LAYOUT = [("silence", 1.0), ("speech", 1.5), ("silence", 1.5), ("speech", 7.0), ("silence", 1.0), ("speech", 0.05), ("silence", 1.0)]
+TRANSCRIPTS = ["turn on the living room light", "light please and then tell me what the weather is",
+               "is tomorrow and whether I have meetings in the afternoon"]
+ANSWER = ("The living room light is now on. Tomorrow will be sunny with a high of 24 degrees. "
+          "You have two meetings in the afternoon: the design review at two and a call with the bank at four. "
+          "Nothing else is planned, enjoy your evening.")
+
+
+def paced(frames:Iterator[np.ndarray], rate:int, speed:float) -> Iterator[np.ndarray]:
+    # a microphone: every frame arrives when it has been spoken
+    start = time.perf_counter()
+    position = 0.0
+    for frame in frames:
+        position += len(frame) / rate
+        delay = start + position / speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield frame
+
+
+def speech_to_text(agent, path:str, spoken:List[tuple], speed:float, latency:float) -> Dict[str,Any]:
+    rate, frames = read_wav(path)
+    duration = sum(seconds for _, seconds in LAYOUT)
+    start = time.perf_counter()
+    events = []
+    for event in agent.stream_speech_to_text(paced(frames, rate, speed), sample_rate=rate):
+        events.append((time.perf_counter() - start, event))
+    finals = [(at, event) for at, event in events if event["final"]]
+    # how long after the speaker stopped each utterance was fully transcribed, in audio seconds
+    delays = [at * speed - end for (at, _), (_, end) in zip(finals, spoken)]
+    return {
+            "first_text" : events[0][0] * speed if events else None,
+            "whole_file" : duration + latency * speed, # record everything, then one call
+            "segments"   : len(events),
+            "utterances" : len(finals),
+            "sent"       : sum(event["end"] - event["start"] for _, event in events),
+            "duration"   : duration,
+            "delays"     : delays,
+            "text"       : " ".join(event["text"] for _, event in events),
+           }
+
+
+def text_to_speech(agent, synthesizer:FakeSynthesizer) -> Dict[str,float]:
+    start = time.perf_counter()
+    synthesizer(ANSWER) # one call for the whole answer
+    whole = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = None
+    for _ in agent.stream_text_to_speech(ANSWER):
+        if first is None:
+            first = time.perf_counter() - start
+    return {"whole" : whole, "first" : first, "total" : time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice activity gated streaming speech to text, chunked text to speech")
+    parser.add_argument("--latency", type=float, default=0.4, help="fake model latency per transcription, seconds")
+    parser.add_argument("--speed", type=float, default=4, help="how much faster than real time the recording is played")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w") as sink:
+        document = os.path.join(folder, "document.txt")
+        with open(document, "w") as file:
+            file.write("benchmark owner document\n")
+        path = os.path.join(folder, "conversation.wav")
+        spoken = conversation(path, LAYOUT)
+        synthesizer = FakeSynthesizer()
+        with contextlib.redirect_stdout(sink):
+            agent, model, _ = build_agent(1, 0, 0, folder, document, voice={"synthesizer" : synthesizer})
+        try:
+            transcriber = model.models[-1] # the tool-less model, shared with the video analyses
+            transcriber.latency.seconds = args.latency / args.speed
+            model.set_script(TRANSCRIPTS)
+
+            stt = speech_to_text(agent, path, [interval for interval in spoken if interval[1] - interval[0] > 0.5], args.speed, args.latency)
+            print(f"speech to text, {stt['duration']:.1f} s recording (times in audio seconds)")
+            print(f"    audio sent to the model {stt['sent']:.1f} s of {stt['duration']:.1f} s in {stt['segments']} segments, {stt['utterances']} utterances")
+            print(f"    first text after {stt['first_text']:.2f} s, whole file transcription {stt['whole_file']:.2f} s")
+            print(f"    utterance transcribed {', '.join(f'{delay:.2f}' for delay in stt['delays'])} s after the speaker stopped")
+            print(f"    text: {stt['text']}")
+
+            tts = text_to_speech(agent, synthesizer)
+            print(f"text to speech, {len(ANSWER)} characters")
+            print(f"    first audio after {tts['first'] * 1000:.0f} ms streamed (all of it after {tts['total'] * 1000:.0f} ms), "
+                  f"{tts['whole'] * 1000:.0f} ms for the whole text in one call")
+        finally:
+            agent.service_handler.service_handler.iot_object.stop = True
+            agent.service_handler.scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+from threading import Thread
+from typing import Dict, Any, List
+
+from ..core.assistants.gemini_assistant import GoogleAgent
+from ..core.services.iot_transport import FakeBroker
+from ..testing import FakeGemini, EchoDevice
+from .agent_turns import PROMPT, REPLY
+
+
+def boot_devices(broker:FakeBroker, names:List[str], delay:float) -> Thread:
+    # things come back on their own schedule, they announce their topics delay seconds after the agent subscribed
+    def run():
+        while broker.subscriber_count() < 2 * len(names):
+            time.sleep(0.005)
+        time.sleep(delay)
+        for index, name in enumerate(names):
+            EchoDevice(broker, name, seed=index).announce()
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def start(folder:str, document:str, things:int, latency:float, device_delay:float, warm:bool) -> Dict[str,Any]:
+    broker = FakeBroker()
+    names = [f"thing{index}" for index in range(things)]
+    model = FakeGemini(script=[REPLY], latency=latency)
+    config = {
+              "document_path" : document,
+              "base_context"  : str(PROMPT),
+              "user"          : {"name" : "Owner"},
+              "video"         : {"path" : os.path.join(folder, "video_events.jsonl")},
+              "iot" : {
+                       "iot_endpoint"      : None,
+                       "iot_thing_names"   : names,
+                       "iot_root_cacert"   : None,
+                       "iot_device_cert"   : None,
+                       "iot_private_key"   : None,
+                       "transport_factory" : broker.client,
+                      },
+             }
+    if warm:
+        config["state"] = {"path" : os.path.join(folder, "agent_state.json")}
+    boot_devices(broker, names, device_delay)
+
+    begin = time.perf_counter()
+    agent = GoogleAgent(service_config=config, api_key="fake", model_name="fake-gemini", videos_folder=folder, model_factory=model)
+    ready = time.perf_counter() - begin
+
+    context = json.loads(agent.service_handler.get_context())
+    return {
+            "agent"    : agent,
+            "ready_s"  : ready,
+            "topics"   : len(context.get("IoTSystemAvailable") or {}),
+            "priming"  : model.quota.served, # model calls spent before the first question
+           }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from process start to an agent with its full context, cold and from saved state")
+    parser.add_argument("--things", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.8, help="seconds per model call")
+    parser.add_argument("--device-delay", type=float, default=1.5, help="seconds before the things announce their topics")
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w") as sink:
+        document = os.path.join(folder, "document.txt")
+        with open(document, "w") as file:
+            file.write("Company document.\n")
+
+        print(f"{'start':>16} {'ready':>10} {'topics':>8} {'priming calls':>14} {'history':>8}")
+        for name, warm in (("cold", False), ("first (saving)", True), ("warm restart", True)):
+            with contextlib.redirect_stdout(sink):
+                result = start(folder, document, args.things, args.latency, args.device_delay, warm)
+            agent = result["agent"]
+            history = len(agent.llm.history)
+            print(f"{name:>16} {result['ready_s']:>8.3f} s {result['topics']:>8} {result['priming']:>14} {history:>8}")
+            with contextlib.redirect_stdout(sink):
+                for turn in range(args.turns):
+                    agent.process_user_query(f"question {turn}")
+                agent.service_handler.service_handler.close() # saves the state
+
+        path = os.path.join(folder, "agent_state.json")
+        if os.path.exists(path):
+            print(f"state file {os.path.getsize(path) / 1024:,.1f} KiB, version {json.load(open(path))['version']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
-from .tool_config import IOT_TOOLS, GOOGLE_TOOLS, NEWS_TOOLS, DOCUMENT_TOOL
+from .tool_config import IOT_TOOLS, GOOGLE_TOOLS, NEWS_TOOLS, VIDEO_TOOLS, DOCUMENT_TOOL, RESULT_TOOLS
 
 __all__ = [
             "IOT_TOOLS",
             "GOOGLE_TOOLS",
             "NEWS_TOOLS",
-            "DOCUMENT_TOOL"
+            "VIDEO_TOOLS",
+            "DOCUMENT_TOOL",
+            "RESULT_TOOLS"
         ]
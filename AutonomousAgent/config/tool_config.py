@@ -79,9 +79,34 @@ GOOGLE_TOOLS = [
         ],
         required=[]
     ),
+    ToolConfig(
+        name="search_mails",
+        description="Search the user's mailbox by keywords in the sender, subject or body. Use this when the user asks about specific emails (a sender, a topic, a date range) instead of reading the most recent ones.",
+        parameters=[
+            ParamConfig(
+                name="query",
+                type="string",
+                description="Keywords to search for in the sender, subject and body. Leave empty to list mails received since a date [Optional]",
+                items=ItemConfig(type="string")
+            ),
+            ParamConfig(
+                name="since",
+                type="string",
+                description="Only return mails received after this date, in YYYY-MM-DD or YYYY-MM-DD HH:MM:SS format [Optional]",
+                items=ItemConfig(type="string")
+            ),
+            ParamConfig(
+                name="limit",
+                type="integer",
+                description="Maximum number of mails to return, 10 by default [Optional]",
+                items=ItemConfig(type="integer", enum=[])
+            )
+        ],
+        required=[]
+    ),
     ToolConfig(
         name="send_mail",
-        description="Send an email on behalf of the user. Use this when the user wants to compose and send an email.",
+        description="Send an email on behalf of the user. Use this when the user wants to compose and send an email. The mail is queued and delivered in the background; the returned id can be checked with get_mail_status.",
         parameters=[
             ParamConfig(
                 name="to",
@@ -104,6 +129,19 @@ GOOGLE_TOOLS = [
         ],
         required=["to", "subject", "body"]
     ),
+    ToolConfig(
+        name="get_mail_status",
+        description="Check the delivery status of a mail sent with send_mail (queued, sending, sent or failed). send_mail only queues the mail and returns its id; use this when the user asks whether a mail was delivered.",
+        parameters=[
+            ParamConfig(
+                name="id",
+                type="string",
+                description="The id returned by send_mail",
+                items=ItemConfig(type="string")
+            )
+        ],
+        required=["id"]
+    ),
     ToolConfig(
         name="get_events",
         description="Retrieve upcoming calendar events. Use this when the user asks about their schedule or upcoming appointments.",
@@ -146,6 +184,29 @@ GOOGLE_TOOLS = [
             )
         ],
         required=["summary", "start_time", "end_time"]
+    ),
+    ToolConfig(
+        name="set_events",
+        description="Create several calendar events at once. Use this instead of repeated set_event calls when the user wants to schedule more than one event, for example a week of maintenance slots. Every event is checked before any is created.",
+        parameters=[
+            ParamConfig(
+                name="events",
+                type="array",
+                description="The events to create",
+                items=ItemConfig(
+                    type="object",
+                    properties=[
+                        ParamConfig(name="summary", type="string", description="Brief title or description of the event", items=ItemConfig(type="string")),
+                        ParamConfig(name="start_time", type="string", description="Start time of the event in YYYY-MM-DD HH:MM:SS format", items=ItemConfig(type="string")),
+                        ParamConfig(name="end_time", type="string", description="End time of the event in YYYY-MM-DD HH:MM:SS format", items=ItemConfig(type="string")),
+                        ParamConfig(name="location", type="string", description="Location of the event (optional)", items=ItemConfig(type="string")),
+                        ParamConfig(name="description", type="string", description="Detailed description of the event (optional)", items=ItemConfig(type="string"))
+                    ],
+                    required=["summary", "start_time", "end_time"]
+                )
+            )
+        ],
+        required=["events"]
     )
 ]
 
@@ -154,11 +215,74 @@ NEWS_TOOLS = [
     ToolConfig(
         name="get_news",
         description="Fetch the latest news articles. Use this when the user asks for current news or updates on recent events",
-        parameters=[],
+        parameters=[
+            ParamConfig(
+                name="since",
+                type="integer",
+                description="Cursor returned by a previous get_news call. Only articles published after it are returned [Optional]",
+                items=ItemConfig(type="integer", enum=[])
+            ),
+            ParamConfig(
+                name="number_of_articles",
+                type="integer",
+                description="Maximum number of articles to return, most relevant first [Optional]",
+                items=ItemConfig(type="integer", enum=[])
+            )
+        ],
         required=[]
     )
 ]
 
+VIDEO_TOOLS = [
+    ToolConfig(
+        name="get_video_events",
+        description="Read the log of analysed camera videos, oldest first. Use this to check what the cameras saw during a time window, for example around an incident, or to look at one camera only.",
+        parameters=[
+            ParamConfig(
+                name="since",
+                type="string",
+                description="Only return videos recorded after this date, in YYYY-MM-DD or YYYY-MM-DD HH:MM:SS format [Optional]",
+                items=ItemConfig(type="string")
+            ),
+            ParamConfig(
+                name="until",
+                type="string",
+                description="Only return videos recorded before this date, in YYYY-MM-DD or YYYY-MM-DD HH:MM:SS format [Optional]",
+                items=ItemConfig(type="string")
+            ),
+            ParamConfig(
+                name="camera",
+                type="string",
+                description="Name of the camera, as listed in the Cameras field of a previous result [Optional]",
+                items=ItemConfig(type="string")
+            ),
+            ParamConfig(
+                name="limit",
+                type="integer",
+                description="Maximum number of videos to return, the most recent of the window, 20 by default [Optional]",
+                items=ItemConfig(type="integer", enum=[])
+            )
+        ],
+        required=[]
+    )
+]
+
+RESULT_TOOLS = [
+    ToolConfig(
+        name="get_more_result",
+        description="Tool results are shortened to save space: long texts end with [more: <cursor>] and long lists carry a more_rows cursor. Use this to read the rest of a shortened result when you need the detail.",
+        parameters=[
+            ParamConfig(
+                name="cursor",
+                type="string",
+                description="The cursor found in the shortened result, for example c12",
+                items=ItemConfig(type="string")
+            )
+        ],
+        required=["cursor"]
+    )
+]
+
 DOCUMENT_TOOL = [
     ToolConfig(
         name="get_document_content",
@@ -1,8 +1,9 @@
-from .assistants import GoogleAgent
+from .assistants import GoogleAgent, AgentHost
 
-from .services.service_handler import ServiceHandler
+from .services.handler import ServiceHandler
 
 __all__ = [
     "GoogleAgent",
+    "AgentHost",
     "ServiceHandler"
 ]
\ No newline at end of file
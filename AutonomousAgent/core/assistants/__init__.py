@@ -1,5 +1,6 @@
 
 from .gemini_assistant import GoogleAgent
+from .agent_host import AgentHost
 
 __all__ = [ 
            "PersonalAssistant"
@@ -0,0 +1,126 @@
+import copy
+import os
+import threading
+from threading import Lock
+from typing import Dict, Any, List, Optional, Callable
+
+from .gemini_assistant import GoogleAgent
+from ...core.services.service_pool import ServicePool
+from ...core.services.memory import rss_bytes
+
+
+class AgentHost:
+    # many households in one process: one GoogleAgent per tenant on top of a single ServicePool
+    def __init__(self, api_key:str, model_name:str, model_factory:Optional[Callable[..., Any]] = None,
+                 workers:int=8, tool_workers:int=8, governor:Optional[Dict[str,Any]]=None, parsing:Optional[Dict[str,Any]]=None,
+                 tenant_workers:Optional[int]=None):
+        self.api_key:str        = api_key
+        self.model_name:str     = model_name
+        self.model_factory:Callable[..., Any] = model_factory
+        self.pool:ServicePool   = ServicePool(workers=workers, tool_workers=tool_workers, governor=governor, parsing=parsing,
+                                              tenant_workers=tenant_workers)
+        self.agents:Dict[str,GoogleAgent] = {}
+        self.lock:Lock          = Lock()
+
+
+    def _tenant_path(self, tenant:str, path:str) -> str:
+        # the tenant goes in front of the file name, an explicitly configured shared path gets it too
+        return os.path.join(os.path.dirname(path), f"{tenant}_{os.path.basename(path)}")
+
+
+    def _tenant_config(self, tenant:str, service_config:Dict[str,Dict]) -> Dict[str,Dict]:
+        config = copy.copy(service_config)
+        config["tenant"] = tenant
+        if "google" in config:
+            # per tenant mail databases, two households never read each other's mails
+            google = dict(config["google"])
+            google["mail_store"] = self._tenant_path(tenant, google.get("mail_store", "mail_store.db"))
+            google["outbox"]     = self._tenant_path(tenant, google.get("outbox", "mail_outbox.db"))
+            config["google"] = google
+        video = dict(config.get("video") or {})
+        if video.get("path", "") is not None: # None keeps the log in memory
+            video["path"] = self._tenant_path(tenant, video.get("path", "video_events.jsonl"))
+        config["video"] = video
+        if (config.get("response_cache") or {}).get("path"):
+            cache = dict(config["response_cache"])
+            cache["path"] = self._tenant_path(tenant, cache["path"])
+            config["response_cache"] = cache
+        if "state" in config:
+            state = dict(config["state"])
+            state["path"] = self._tenant_path(tenant, state.get("path", "agent_state.json"))
+            config["state"] = state
+        return config
+
+
+    def add(self, tenant:str, service_config:Dict[str,Dict], videos_folder:str, daemon:bool=False) -> GoogleAgent:
+        with self.lock:
+            if tenant in self.agents:
+                raise ValueError(f"tenant {tenant} already exists")
+            self.agents[tenant] = None # reserved while the agent starts
+
+        try:
+            agent = GoogleAgent(service_config=self._tenant_config(tenant, service_config), api_key=self.api_key,
+                                model_name=self.model_name, videos_folder=videos_folder,
+                                model_factory=self.model_factory, pool=self.pool)
+        except BaseException:
+            with self.lock:
+                del self.agents[tenant]
+            raise
+
+        if daemon:
+            agent.run_deamon()
+        with self.lock:
+            self.agents[tenant] = agent
+        return agent
+
+
+    def get(self, tenant:str) -> GoogleAgent:
+        with self.lock:
+            agent = self.agents.get(tenant)
+        if agent is None:
+            raise KeyError(f"unknown tenant {tenant}")
+        return agent
+
+
+    def remove(self, tenant:str):
+        with self.lock:
+            agent = self.agents.pop(tenant, None)
+        if agent is None:
+            return
+        if agent.daemon:
+            agent.daemon.shutdown()
+        agent.service_handler.service_handler.close()
+
+
+    def tenants(self) -> List[str]:
+        with self.lock:
+            return [tenant for tenant, agent in self.agents.items() if agent is not None]
+
+
+    def process_user_query(self, tenant:str, query:str) -> str:
+        return self.get(tenant).process_user_query(query)
+
+
+    def stats(self) -> Dict[str,Any]:
+        tasks = self.pool.scheduler.stats()
+        return {
+                "tenants"          : len(self.tenants()),
+                "threads"          : threading.active_count(),
+                "scheduled_tasks"  : len(tasks),
+                "shared_resources" : len(self.pool.resources),
+                "task_errors"      : sum(task["errors"] for task in tasks.values()),
+                "tasks_deferred"   : self.pool.scheduler.deferred, # a tenant had its share of the workers
+                "model"            : self.pool.governor.stats(),
+                "parsing"          : self.pool.parse_pool.stats(),
+                "rss"              : rss_bytes(),
+               }
+
+
+    def memory_usage(self, top:int=0) -> Dict[str,Any]:
+        return {tenant : self.get(tenant).memory_usage(top=top) for tenant in self.tenants()}
+
+
+    def shutdown(self):
+        for tenant in self.tenants():
+            self.remove(tenant)
+        self.pool.shutdown()
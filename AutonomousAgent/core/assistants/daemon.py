@@ -0,0 +1,324 @@
+import math
+import re
+import time
+from collections import deque
+from queue import Queue, Empty
+from threading import Thread, Lock
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+
+MAIL_KEYWORDS:Dict[str,float]  = {"urgent" : 1.0, "asap" : 1.0, "important" : 0.7, "openiot" : 1.0, "alarm" : 1.0, "security" : 0.7, "meeting" : 0.4}
+VIDEO_KEYWORDS:Dict[str,float] = {"suspicious" : 1.0, "theft" : 1.0, "burglary" : 1.0, "intrusion" : 1.0, "weapon" : 1.0, "person" : 0.4, "human" : 0.4}
+
+
+def keyword_rules(weights:Dict[str,float]) -> Tuple[re.Pattern, Dict[str,float]]:
+    weights = {word.lower() : weight for word, weight in weights.items()}
+    pattern = re.compile(r"\b(" + "|".join(re.escape(word) for word in sorted(weights, key=len, reverse=True)) + r")\b", re.IGNORECASE) if weights else None
+    return pattern, weights
+
+
+class SensorHistory:
+    # rolling window of one numeric reading, mean and deviation kept incrementally
+    __slots__ = ("values", "total", "squares", "last", "streak")
+
+    def __init__(self, window:int):
+        self.values:deque = deque(maxlen=window)
+        self.total:float   = 0.0
+        self.squares:float = 0.0
+        self.last:Optional[float] = None
+        self.streak:int    = 0 # consecutive readings over the z threshold
+
+    def zscore(self, value:float, min_samples:int) -> Optional[float]:
+        count = len(self.values)
+        if count < min_samples:
+            return None
+        mean = self.total / count
+        variance = max(0.0, self.squares / count - mean * mean)
+        std = math.sqrt(variance)
+        if std < 1e-9:
+            return None if value == mean else math.inf
+        return abs(value - mean) / std
+
+    def add(self, value:float):
+        if len(self.values) == self.values.maxlen:
+            oldest = self.values[0]
+            self.total   -= oldest
+            self.squares -= oldest * oldest
+        self.values.append(value)
+        self.total   += value
+        self.squares += value * value
+        self.last = value
+
+
+class SignificanceScorer:
+    # a score of 1 or more opens an incident, lower scores only travel along as context
+    def __init__(self, z_threshold:float=3.5, persistence:int=2, window:int=120, min_samples:int=20,
+                 thresholds:Optional[Dict[str,Dict[str,float]]]=None, watch:Optional[List[str]]=None,
+                 mail_keywords:Optional[Dict[str,float]]=None, video_keywords:Optional[Dict[str,float]]=None,
+                 calendar_horizon:float=2 * 3600):
+        self.z_threshold:float = z_threshold
+        self.persistence:int   = persistence # a single noisy sample is not an incident
+        self.window:int        = window
+        self.min_samples:int   = min_samples
+        self.thresholds:Dict[str,Dict[str,float]] = thresholds or {} # topic -> {"above": x, "below": y}
+        self.watch = set(watch or []) # state topics whose every change matters
+        self.mail_pattern, self.mail_weights   = keyword_rules(MAIL_KEYWORDS if mail_keywords is None else mail_keywords)
+        self.video_pattern, self.video_weights = keyword_rules(VIDEO_KEYWORDS if video_keywords is None else video_keywords)
+        self.calendar_horizon:float = calendar_horizon
+
+        self.history:Dict[str,SensorHistory] = {}
+        self.states:Dict[str,Any]            = {}
+
+
+    def _keywords(self, text:str, pattern, weights) -> Tuple[float,List[str]]:
+        if not pattern or not text:
+            return 0.0, []
+        found = {match.lower() for match in pattern.findall(text)}
+        return sum(weights[word] for word in found), sorted(found)
+
+
+    def _outside(self, topic:str, value:float) -> Optional[str]:
+        bounds = self.thresholds.get(topic)
+        if not bounds:
+            return None
+        if "above" in bounds and value > bounds["above"]:
+            return f"above {bounds['above']}"
+        if "below" in bounds and value < bounds["below"]:
+            return f"below {bounds['below']}"
+        return None
+
+
+    def score_readings(self, thing:str, readings) -> List[Dict[str,Any]]:
+        events = []
+        for topic, value in readings.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                history = self.history.get(topic)
+                if history is None:
+                    history = self.history[topic] = SensorHistory(self.window)
+                previous = history.last
+                zscore = history.zscore(value, self.min_samples)
+                history.add(value)
+
+                history.streak = history.streak + 1 if zscore is not None and zscore >= self.z_threshold else 0
+
+                crossed = self._outside(topic, value)
+                if crossed and (previous is None or not self._outside(topic, previous)):
+                    events.append({"kind" : "iot", "key" : topic, "score" : 1.0, "reason" : f"crossed {crossed}", "value" : value})
+                elif history.streak == self.persistence:
+                    events.append({"kind" : "iot", "key" : topic, "score" : zscore / self.z_threshold,
+                                   "reason" : f"z-score {zscore:.1f} over the last {len(history.values)} readings", "value" : value})
+            else:
+                previous = self.states.get(topic)
+                self.states[topic] = value
+                if previous is not None and previous != value:
+                    events.append({"kind" : "iot", "key" : topic, "score" : 1.0 if topic in self.watch else 0.3,
+                                   "reason" : f"changed from {previous}", "value" : value})
+        return events
+
+
+    def score_mails(self, mails) -> List[Dict[str,Any]]:
+        events = []
+        for mail in (mails.values() if isinstance(mails, dict) else mails):
+            score, words = self._keywords(f"{mail.get('suject', '')} {mail.get('Body', '')}", self.mail_pattern, self.mail_weights)
+            events.append({"kind" : "mail", "key" : mail.get("Id"), "score" : max(0.3, score),
+                           "reason" : f"keywords {', '.join(words)}" if words else "new mail",
+                           "value" : {"From" : mail.get("From"), "suject" : mail.get("suject"), "Date" : mail.get("Date")}})
+        return events
+
+
+    def score_calendar(self, changes:List[Dict[str,Any]], now:Optional[float]=None) -> List[Dict[str,Any]]:
+        now = now or time.time()
+        events = []
+        for event in changes:
+            start = event.get("Start")
+            soon = False
+            try:
+                soon = 0 <= time.mktime(time.strptime(start[:19], "%Y-%m-%dT%H:%M:%S")) - now <= self.calendar_horizon
+            except (TypeError, ValueError):
+                pass
+            events.append({"kind" : "calendar", "key" : f"{event.get('Event')}@{start}", "score" : 1.0 if soon else 0.3,
+                           "reason" : "starts soon" if soon else "new or changed event", "value" : event})
+        return events
+
+
+    def score_video(self, path:str, description:Dict[str,Any]) -> List[Dict[str,Any]]:
+        score, words = self._keywords(description.get("Video Description", ""), self.video_pattern, self.video_weights)
+        return [{"kind" : "video", "key" : path, "score" : max(0.3, score),
+                 "reason" : f"keywords {', '.join(words)}" if words else "new analysis", "value" : description}]
+
+
+class AgentDaemon:
+    # scores updates as they arrive, holds them until something significant settles, then hands one incident to the model
+    def __init__(self, on_incident:Callable[[List[Dict[str,Any]]], Any], debounce:float=5, max_wait:float=30,
+                 min_interval:float=60, max_context_age:float=900, max_events:int=50, **scoring):
+        self.on_incident:Callable = on_incident
+        self.debounce:float        = debounce
+        self.max_wait:float        = max_wait
+        self.min_interval:float    = min_interval
+        self.max_context_age:float = max_context_age
+        self.max_events:int        = max_events
+        self.scorer:SignificanceScorer = SignificanceScorer(**scoring)
+
+        self.updates:Queue = Queue()
+        self.pending:Dict[Tuple[str,Any],Dict[str,Any]] = {} # coalesced by (kind, key), latest value wins
+        self.opened_at:Optional[float]   = None
+        self.last_significant:float      = 0.0
+        self.last_call:float             = 0.0
+        self.stop:bool                   = False
+        self.stats_lock:Lock             = Lock()
+        self.counters:Dict[str,int]      = {"updates" : 0, "events" : 0, "significant" : 0, "incidents" : 0, "model_calls" : 0, "errors" : 0}
+        self.started_at:float            = time.time()
+        self.scheduler                   = None
+        self.wake_lock:Lock              = Lock()
+        self.step_lock:Lock              = Lock()
+        self.wake_due:Optional[float]    = None
+
+
+    def start(self, scheduler=None):
+        # on a shared scheduler the daemon has no thread of its own, submit() and open incidents wake it up
+        if scheduler is None:
+            Thread(target=self._run, daemon=True).start()
+        else:
+            self.scheduler = scheduler
+
+
+    def shutdown(self):
+        self.stop = True
+        self.updates.put(None)
+        if self.scheduler:
+            self.scheduler.cancel("daemon")
+
+
+    def submit(self, kind:str, *payload):
+        # called from the MQTT and sync threads, scoring happens on the daemon thread
+        self.updates.put((kind, payload))
+        if self.scheduler:
+            self._wake(0)
+
+
+    def _wake(self, delay:float):
+        with self.wake_lock:
+            due = time.monotonic() + delay
+            if self.wake_due is not None and self.wake_due <= due:
+                return
+            self.wake_due = due
+            self.scheduler.once("daemon", self._pump, delay=delay)
+
+
+    def _pump(self):
+        with self.wake_lock:
+            self.wake_due = None
+        if self.stop:
+            return
+        with self.step_lock:
+            batch = []
+            while not self.updates.empty() and len(batch) < 1000:
+                batch.append(self.updates.get_nowait())
+            self._step([update for update in batch if update is not None], time.time())
+            wait = self._wait(time.time())
+        if not self.updates.empty():
+            self._wake(0)
+        elif wait is not None:
+            self._wake(wait)
+
+
+    def _score(self, kind:str, payload:tuple) -> List[Dict[str,Any]]:
+        if kind == "iot":
+            return self.scorer.score_readings(*payload)
+        if kind == "mail":
+            return self.scorer.score_mails(*payload)
+        if kind == "calendar":
+            return self.scorer.score_calendar(*payload)
+        if kind == "video":
+            return self.scorer.score_video(*payload)
+        return []
+
+
+    def _absorb(self, events:List[Dict[str,Any]], now:float):
+        for event in events:
+            event["at"] = now
+            key = (event["kind"], event["key"])
+            previous = self.pending.get(key)
+            if previous:
+                event["score"] = max(event["score"], previous["score"])
+                event["count"] = previous.get("count", 1) + 1
+            self.pending[key] = event
+            if event["score"] >= 1.0:
+                self.last_significant = now
+                if self.opened_at is None:
+                    self.opened_at = now
+                with self.stats_lock:
+                    self.counters["significant"] += 1
+
+
+    def _due(self, now:float) -> bool:
+        if self.opened_at is None or now - self.last_call < self.min_interval:
+            return False
+        return now - self.last_significant >= self.debounce or now - self.opened_at >= self.max_wait
+
+
+    def _flush(self, now:float):
+        events = sorted(self.pending.values(), key=lambda event: event["score"], reverse=True)[:self.max_events]
+        self.pending.clear()
+        self.opened_at = None
+        self.last_call = now
+        with self.stats_lock:
+            self.counters["incidents"] += 1
+            self.counters["model_calls"] += 1
+        try:
+            self.on_incident(events)
+        except Exception as e:
+            with self.stats_lock:
+                self.counters["errors"] += 1
+            print(f"Exception {e}")
+
+
+    def _wait(self, now:float) -> Optional[float]:
+        # seconds until the open incident is due; idle, the thread only wakes up for updates
+        if self.opened_at is None:
+            return None
+        due = max(self.last_call + self.min_interval, min(self.last_significant + self.debounce, self.opened_at + self.max_wait))
+        return max(0.0, due - now) + 0.01
+
+
+    def _run(self):
+        while not self.stop:
+            try:
+                update = self.updates.get(timeout=self._wait(time.time()))
+                batch = [update]
+                while not self.updates.empty() and len(batch) < 1000:
+                    batch.append(self.updates.get_nowait())
+            except Empty:
+                batch = []
+            if self.stop:
+                return
+            self._step([update for update in batch if update is not None], time.time())
+
+
+    def _step(self, batch:List[Tuple[str,tuple]], now:float):
+        for kind, payload in batch:
+            try:
+                events = self._score(kind, payload)
+            except Exception as e:
+                events = []
+                print(f"Exception {e}")
+            with self.stats_lock:
+                self.counters["updates"] += 1
+                self.counters["events"] += len(events)
+            self._absorb(events, now)
+
+        if self.opened_at is None:
+            # nothing significant yet, keep recent context only
+            for key in [key for key, event in self.pending.items() if now - event["at"] > self.max_context_age]:
+                del self.pending[key]
+        elif self._due(now):
+            self._flush(now)
+
+
+    def stats(self) -> Dict[str,Any]:
+        with self.stats_lock:
+            counters = dict(self.counters)
+        hours = max(time.time() - self.started_at, 1) / 3600
+        counters["model_calls_per_hour"] = round(counters["model_calls"] / hours, 2)
+        counters["pending"] = len(self.pending)
+        return counters
@@ -2,26 +2,55 @@ from ...interfaces import AssistantInterface
 import google.generativeai as genai
 from google.generativeai import protos
 import google.api_core.exceptions
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Callable, Iterator, Iterable, Union
 import time, json, os
 from pathlib import Path
 from datetime import date, datetime
 from threading import Thread, Lock
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 
 
 
 from ...core.services.handler import ServiceHandler
-from ...config.tool_config import IOT_TOOLS, GOOGLE_TOOLS, NEWS_TOOLS
-from tenacity import retry, wait_random_exponential, stop_after_attempt
+from ...core.services.service_pool import ServicePool
+from ...core.services.model_governor import ModelGovernor
+from ...config.tool_config import IOT_TOOLS, GOOGLE_TOOLS, NEWS_TOOLS, VIDEO_TOOLS, RESULT_TOOLS
+from ...core.services.result_encoder import dumps
+from ...core.services.telemetry import telemetry
+from ...core.services.memory import deep_size, rss_bytes, memory_tracer
+from .daemon import AgentDaemon
+from .json_stream import JsonStream, normalize
+from .response_cache import ResponseCache, tool_sources
+from .voice import SpeechSegmenter, SentenceChunker, read_wav, to_wav, merge_transcripts
 
 
 class GoogleAgent(AssistantInterface):
-    def __init__(self, service_config:Dict[str,Dict], api_key:str, model_name:str, videos_folder:str):
-        self.service_handler:ServiceHandler = ServiceHandler(service_config=service_config)
+    def __init__(self, service_config:Dict[str,Dict], api_key:str, model_name:str, videos_folder:str,
+                 model_factory:Optional[Callable[..., Any]] = None, pool:Optional[ServicePool] = None):
+        self.pool:ServicePool               = pool # set when the agent is one tenant of an AgentHost
+        self.service_handler:ServiceHandler = ServiceHandler(service_config=service_config, pool=pool)
+        self.daemon_config:Dict[str,Any]    = service_config.get("daemon", {})
+        # "segmenter" options of SpeechSegmenter, "chunker" options of SentenceChunker, "synthesizer" a text -> audio bytes callable
+        self.voice_config:Dict[str,Any]     = service_config.get("voice", {})
+        self.daemon:AgentDaemon             = None
+        self.model_factory:Callable[..., Any] = model_factory # (model_name, tools) -> GenerativeModel like object, None for Gemini
+        self.tool_executor:ThreadPoolExecutor = pool.tool_executor if pool else ThreadPoolExecutor(max_workers=4, thread_name_prefix="tools")
+        self.max_tool_rounds:int            = service_config.get("max_tool_rounds", 5) # model messages of one query that may call tools
+        # requests, tokens and concurrency of every model call, shared by the tenants of an AgentHost
+        self.governor:ModelGovernor         = pool.governor if pool else ModelGovernor(**service_config.get("governor", {}))
+        # repeated questions over unchanged state skip the model, off unless configured
+        self.response_cache:ResponseCache   = ResponseCache(**service_config["response_cache"]) if "response_cache" in service_config else None
+        # "chat_history_bytes" bounds the chat session, "trace" starts tracemalloc for memory_usage(top=...)
+        self.memory_config:Dict[str,Any]    = service_config.get("memory", {})
+        if self.memory_config.get("trace"):
+            memory_tracer.start(frames=self.memory_config.get("trace_frames", 1))
         self.video_analyser: genai.GenerativeModel = None
         self.llm:genai.GenerativeModel = self.config_llm(api_key=api_key, model_name=model_name)
         self.video_flux_description:List[Dict]= []
-        self.video_file_already_analyse:List[str] = []  
+        # the event log persists, videos analysed before a restart are not sent again; those it pruned are skipped by _retained
+        self.video_file_already_analyse:List[str] = [event["path"] for event in self.service_handler.service_handler.video_events.range()]
         self.videos_folder = videos_folder
         self.videos_path:List[str] = []
 
@@ -31,18 +60,64 @@ class GoogleAgent(AssistantInterface):
 
         self.iot_data:Dict          = {}
         self.workspace_data:Dict    = {}
-        self.video_flux_data:Dict   = {}
 
 
     def config_llm(self, api_key, model_name):
-        genai.configure(api_key=api_key)
         tools = self.generate_tools(self.service_handler)
-        model = genai.GenerativeModel(model_name=model_name, tools=tools)  
-        self.video_analyser = genai.GenerativeModel(model_name=model_name)  
-        model = model.start_chat(enable_automatic_function_calling=True)
-        context = self.service_handler.get_context()
-        model.send_message(context)
+        if self.model_factory:
+            model = self.model_factory(model_name=model_name, tools=tools)
+            create_analyser = lambda: self.model_factory(model_name=model_name, tools=None)
+        else:
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name=model_name, tools=tools)  
+            create_analyser = lambda: genai.GenerativeModel(model_name=model_name)
+        # the video model keeps no tenant state, hosted agents share one
+        self.video_analyser = self.pool.shared(("video_analyser", model_name), create_analyser) if self.pool else create_analyser()
+        # the tools are bare declarations dispatched by the agent itself, and automatic calling rules out streaming
+        history = self._restored_history(model_name)
+        if history is not None:
+            # same model and context as the previous run, its chat goes on without priming it again
+            model = model.start_chat(enable_automatic_function_calling=False, history=history)
+        else:
+            model = model.start_chat(enable_automatic_function_calling=False)
+            context = self.service_handler.get_context()
+            self.governor.call(model.send_message, context, priority="interactive")
+        store = self.service_handler.service_handler.state_store
+        if store:
+            store.register("chat", lambda: self._dump_chat(model_name))
         return model 
+
+
+    @staticmethod
+    def _history_record(entry) -> Dict[str,Any]:
+        # JSON form of a chat message, what start_chat(history=...) takes back
+        to_dict = getattr(type(entry), "to_dict", None)
+        if to_dict:
+            return to_dict(entry) # protos.Content
+        if isinstance(entry, dict):
+            return entry
+        if isinstance(entry, str):
+            return {"role" : "user", "parts" : [{"text" : entry}]}
+        parts = [{"function_call" : {"name" : part.function_call.name, "args" : dict(part.function_call.args or {})}}
+                 if part.function_call else {"text" : part.text} for part in entry.parts]
+        return {"role" : getattr(entry, "role", "user"), "parts" : parts}
+
+
+    def _dump_chat(self, model_name:str) -> Dict[str,Any]:
+        # bounded like the live history, the context upload and the latest messages
+        history = self._trimmed(list(getattr(self.llm, "history", None) or []), self.memory_config.get("chat_history_bytes", 256 * 1024))
+        return {"model" : model_name, "context" : self.service_handler.state_version("context"),
+                "history" : [self._history_record(entry) for entry in history]}
+
+
+    def _restored_history(self, model_name:str) -> Optional[List[Dict[str,Any]]]:
+        store = self.service_handler.service_handler.state_store
+        chat = store.get("chat") if store else None
+        if not chat or not chat.get("history") or chat.get("model") != model_name:
+            return None
+        if chat.get("context") != self.service_handler.state_version("context"):
+            return None # the context changed while the agent was down, the model has to see the new one
+        return chat["history"]
     
     def get_all_mp4_files(self,parent_folder):
         mp4_files = []
@@ -53,25 +128,72 @@ class GoogleAgent(AssistantInterface):
                     mp4_files.append(full_path)
         return mp4_files
     
-    def _update_process(self):
-        with self.iot_data_lock : 
+    def _refresh_state(self) -> bool:
+        # one pass over the services and the video folder, True when a new video was analysed
+        analysed = False
+        with telemetry.span("agent.update_iot"), self.iot_data_lock : 
             self.iot_data = self.service_handler.get_all_iot_data()
 
-        with self.workspace_lock : 
+        with telemetry.span("agent.update_workspace"), self.workspace_lock : 
             self.workspace_data = self.service_handler.get_all_workspace_data()
 
         with self.video_data_lock : 
-            videos = self.get_all_mp4_files(parent_folder=self.videos_folder)
+            with telemetry.span("video.scan"):
+                videos = self.get_all_mp4_files(parent_folder=self.videos_folder)
 
             for video in videos :
                 if not video in self.video_file_already_analyse: 
+                    if not self._retained(video):
+                        self.video_file_already_analyse.append(video) # its event would be pruned at once, or was before a restart
+                        continue
                     descript = self.analyse_video(path=video)
                     if descript:
-                        self.video_flux_data.update(descript)
+                        self.video_file_already_analyse.append(video)
+                        self.record_video(video, descript)
+                        if self.daemon:
+                            self.daemon.submit("video", video, descript)
+                        analysed = True
                         time.sleep(1) # being kind to the server 
+        return analysed
+
+
+    def _retained(self, path:str) -> bool:
+        try:
+            recorded_at = os.path.getmtime(path)
+        except OSError:
+            return True
+        return self.service_handler.service_handler.video_events.retained(recorded_at)
+
+
+    def camera_of(self, path:str) -> str:
+        # one sub folder of videos_folder per camera, clips directly in it belong to "default"
+        folder = os.path.relpath(os.path.dirname(path), self.videos_folder)
+        return "default" if folder in (".", "") or folder.startswith("..") else folder.replace(os.sep, "/")
+
+
+    def record_video(self, path:str, descript:Dict[str,Any]) -> Dict[str,Any]:
+        # stamped with the time of the clip, analyses finish out of order
+        try:
+            recorded_at = os.path.getmtime(path)
+        except OSError:
+            recorded_at = None
+        return self.service_handler.service_handler.add_video_event(camera=self.camera_of(path), path=path,
+                                                                    description=descript["Video Description"], at=recorded_at,
+                                                                    analysed_at=descript["Time"], duration=descript["Analysis Duration"])
+
+
+    def _update_process(self):
+        self._refresh_state()
         time.sleep(1)
 
 
+    def start_updates(self, interval:float=1, max_interval:float=10):
+        # runs _refresh_state on the shared scheduler, backing off while the video folder stays unchanged;
+        # a video analysis takes minutes, so on a thread of its own rather than one of the workers
+        self.service_handler.scheduler.every("agent.update", self._refresh_state, interval=interval,
+                                             min_interval=interval, max_interval=max_interval, dedicated=True)
+
+
     def analyse_video(self,path: str, timeout: int = 600):
             video_path = Path(path)
             if not video_path.exists():
@@ -88,24 +210,29 @@ class GoogleAgent(AssistantInterface):
                     """
             try:
                 
-                video_file = genai.upload_file(path=str(video_path))
+                with telemetry.span("video.upload"):
+                    video_file = genai.upload_file(path=str(video_path))
                 start_time = time.time()
-                while video_file.state.name == "PROCESSING":
-                    if time.time() - start_time > timeout:
-                        genai.delete_file(video_file.name)  
-                        raise TimeoutError("Video processing exceeded timeout limit")
-                        
-                    print('.', end='', flush=True)
-                    video_file = genai.get_file(video_file.name)
+                with telemetry.span("video.processing"):
+                    while video_file.state.name == "PROCESSING":
+                        if time.time() - start_time > timeout:
+                            genai.delete_file(video_file.name)  
+                            raise TimeoutError("Video processing exceeded timeout limit")
+                            
+                        print('.', end='', flush=True)
+                        time.sleep(2) # polling the file API in a tight loop only burns quota
+                        video_file = genai.get_file(video_file.name)
                 
                 if video_file.state.name == "FAILED":
                     raise ValueError(f"Video processing failed: {video_file.state.message}")
                 
                 
-                response = self.video_analyser.generate_content(
-                    [video_file, context],
-                    request_options={"timeout": timeout}
-                )
+                with telemetry.span("video.analyse"):
+                    response = self.governor.call(self.video_analyser.generate_content,
+                        [video_file, context],
+                        request_options={"timeout": timeout},
+                        priority="background"
+                    )
                 
 
                 try:
@@ -134,7 +261,23 @@ class GoogleAgent(AssistantInterface):
 
     
     def run_deamon(self): # background autononous agent
-        pass 
+        # the model is only asked when an update scores as significant, see daemon.AgentDaemon
+        if self.daemon is None:
+            self.daemon = AgentDaemon(on_incident=self.handle_incident, **self.daemon_config)
+            self.service_handler.subscribe_updates(self.daemon.submit)
+            self.daemon.start(scheduler=self.service_handler.scheduler if self.pool else None)
+            self.start_updates()
+        return self.daemon
+
+
+    def handle_incident(self, events:List[Dict[str,Any]]) -> str:
+        content = f"""
+                    Something changed in the systems you watch. Analyse these events and decide what to do. If there is an action to do, use the necessary tool to perform that action. If there is no necessary action to do, do not do anything.
+
+                    Events : {dumps([{key : value for key, value in event.items() if key != "at"} for event in events])}
+                    """
+        with telemetry.span("agent.incident", events=len(events)):
+            return self.process_user_query(query=content, priority="incident")
            
     def generate_tools(self, service_handler) -> list[protos.Tool]:
 
@@ -155,10 +298,14 @@ class GoogleAgent(AssistantInterface):
         if service_handler.service_handler.google_object:
             TOOLS = TOOLS + GOOGLE_TOOLS
 
-        if service_handler.service_handler.webscraper : 
+        if service_handler.service_handler.news_aggregator : 
             TOOLS = TOOLS + NEWS_TOOLS
 
+        if service_handler.service_handler.video_events is not None:
+            TOOLS = TOOLS + VIDEO_TOOLS
+
         if len(TOOLS) > 0:
+            TOOLS = TOOLS + RESULT_TOOLS
             for tool in TOOLS:
                 if not tool.parameters:
                     tools.append(protos.Tool(function_declarations=[
@@ -170,7 +317,20 @@ class GoogleAgent(AssistantInterface):
                     continue
                 properties = {}
                 for param in tool.parameters:
-                    if param.type == "array":
+                    if param.type == "array" and param.items.type == "object":
+                        properties[param.name] = protos.Schema(
+                            type=TYPE_MAP[param.type],
+                            description=param.description,
+                            items=protos.Schema(
+                                type=protos.Type.OBJECT,
+                                properties={
+                                    item.name : protos.Schema(type=TYPE_MAP[item.type], description=item.description)
+                                    for item in param.items.properties
+                                },
+                                required=param.items.required
+                            )
+                        )
+                    elif param.type == "array":
                         properties[param.name] = protos.Schema(
                             type=TYPE_MAP[param.type],
                             description=param.description,
@@ -203,79 +363,296 @@ class GoogleAgent(AssistantInterface):
     
 
     def get_systems_data(self):
-        {
+        return {
             "Iot" : self.iot_data,
             "Workspace" : self.workspace_data,
          }
-    @retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
     def text_to_speech(self, text):
-        return super().text_to_speech(text)
-    
-    @retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
+        return b"".join(self.stream_text_to_speech(text))
+
+
+    def stream_text_to_speech(self, text:Union[str, Iterable[str]], ahead:int=2) -> Iterator[bytes]:
+        # audio of one sentence at a time, the next ones synthesised while the first plays; text may be the
+        # "field" deltas of stream_user_query, speech then starts before the model has finished writing
+        synthesizer = self.voice_config.get("synthesizer")
+        if synthesizer is None:
+            raise ValueError("No speech synthesizer configured, set voice.synthesizer in the service config")
+        chunker = SentenceChunker(**self.voice_config.get("chunker", {}))
+        pending = deque()
+        for piece in ([text] if isinstance(text, str) else text):
+            for sentence in chunker.feed(piece):
+                pending.append(self.tool_executor.submit(copy_context().run, synthesizer, sentence))
+                while len(pending) > ahead or (pending and pending[0].done()):
+                    yield pending.popleft().result()
+        for sentence in chunker.flush():
+            pending.append(self.tool_executor.submit(copy_context().run, synthesizer, sentence))
+        while pending:
+            yield pending.popleft().result()
+
+
     def speech_to_text(self, audio_path):
-        return super().speech_to_text(audio_path)
+        text = ""
+        for event in self.stream_speech_to_text(audio_path):
+            text = f"{text} {event['text']}".strip() if event["text"] else text
+        return text
+
+
+    def stream_speech_to_text(self, audio, sample_rate:Optional[int]=None, priority:str="interactive") -> Iterator[Dict[str,Any]]:
+        # audio is a wav path or file, or int16 frames of a live source at sample_rate; only the speech the detector
+        # finds goes to the model, in overlapping segments transcribed while the rest is still being read
+        if sample_rate is None:
+            sample_rate, frames = read_wav(audio, frame_ms=self.voice_config.get("segmenter", {}).get("frame_ms", 30))
+        else:
+            frames = audio
+        segmenter = SpeechSegmenter(sample_rate, **self.voice_config.get("segmenter", {}))
+        pending = deque()
+        previous = ""
+
+        def events(segments, wait:bool):
+            nonlocal previous
+            for segment in segments:
+                pending.append((segment, self.tool_executor.submit(copy_context().run, self._transcribe, segment, sample_rate, priority)))
+            while pending and (wait or pending[0][1].done()):
+                segment, future = pending.popleft()
+                text = future.result()
+                text = merge_transcripts(previous, text) if previous else text
+                previous = "" if segment.final else f"{previous} {text}"
+                yield {"type" : "transcript", "text" : text, "start" : round(segment.start, 3), "end" : round(segment.end, 3),
+                       "utterance" : segment.utterance, "final" : segment.final}
+
+        with telemetry.span("voice.speech_to_text"):
+            for frame in frames:
+                yield from events(segmenter.feed(frame), wait=False)
+            yield from events(segmenter.flush(), wait=True)
+
+
+    def _transcribe(self, segment, sample_rate:int, priority:str) -> str:
+        content = ["Transcribe this speech exactly, output only the spoken words.", {"mime_type" : "audio/wav", "data" : to_wav(segment.samples, sample_rate)}]
+        seconds = segment.end - segment.start
+        # the tool-less model of the video analyses; audio is billed at 32 tokens a second, not by the size of the wav
+        with telemetry.span("voice.transcribe", seconds=round(seconds, 2)):
+            response = self.governor.call(self.video_analyser.generate_content, content, priority=priority, tokens=int(32 * seconds) + 16)
+        return response.text.strip()
     
-    @retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
     def chat_completion(self, query, relevant_context):
-        return super().chat_completion(query, relevant_context)
+        return self.governor.call(super().chat_completion, query, relevant_context)
     
     def handle_function_calling(self, function_name, params):
-        return super().handle_function_calling(function_name, params)
+        return self.service_handler.invoke_for_model(function_name=function_name, params=params)
     
 
-    def process_user_query(self, query: str) -> str:        
+    def _run_function_call(self, function_call) -> Any:
+        function_name = function_call.name
+        function_args = dict(function_call.args) if function_call.args else {}
+
+        print(f"Function name: {function_name}")
+        print(f"Function arguments: {function_args}")
+
         try:
-            start = time.time()
-            response = self.llm.send_message(query)
-            print(f"Request to Gemini: {time.time() - start}")
-            
-            if response.candidates:
-                candidate = response.candidates[0]
-                if candidate.content.parts:
-                    for part in candidate.content.parts:
-                        if part.function_call:
-                            function_name = part.function_call.name
-                    
-                            function_args = {}
-                            
-                            if part.function_call.args:
-                                function_args = dict(part.function_call.args)
-                            
-                            print(f"Function name: {function_name}")
-                            print(f"Function arguments: {function_args}")
-                            
-                            
-                            start = time.time()
-                            try:
-                                function_response =  True #self.handle_function_calling(function_name, function_args)
-                            except Exception as e:
-                                function_response = {"Error": f"Exception in function execution: {str(e)}"}
-                            
-                            print(f"Function running time: {time.time() - start}")
-                            
-                            start = time.time()
-                            try:
-                                final_response = self.llm.send_message(json.dumps(function_response))
-                                print(f"Second request to Gemini: {time.time() - start}")
-                                response_content = final_response.text
-                            except google.api_core.exceptions.GoogleAPIError as e:
-                                response_content = f"Error processing function result: {str(e)}"
-                        else:
-                            response_content = part.text
-                else:
-                    response_content = "No content in the response."
+            with telemetry.span(f"tool.{function_name}"):
+                return self.handle_function_calling(function_name, function_args)
+        except Exception as e:
+            return {"Error": f"Exception in function execution: {str(e)}"}
+
+
+    def dispatch_function_calls(self, function_calls) -> Any:
+        if len(function_calls) == 1:
+            return self._run_function_call(function_calls[0])
+
+        # independent calls of the same turn run side by side and go back in one message
+        # each call gets a copy of the caller context so its span stays under the current turn
+        contexts = [copy_context() for _ in function_calls]
+        results = list(self.tool_executor.map(lambda context, call: context.run(self._run_function_call, call), contexts, function_calls))
+        return [{"function": call.name, "response": result} for call, result in zip(function_calls, results)]
+
+
+    def process_user_query(self, query: str, priority: str = "interactive") -> str:
+        with telemetry.span("agent.turn"):
+            for event in self.stream_user_query(query, priority):
+                if event["type"] == "result":
+                    return event["text"] # a fast path confirmation may follow, it is not waited for
+            return None
+
+
+    def stream_user_query(self, query: str, priority: str = "interactive") -> Iterator[Dict[str,Any]]:
+        # {"type": "text"} chunks as the model writes them, {"type": "field", "key"} for the decoded top level strings of the JSON reply,
+        # {"type": "function_call"} and {"type": "function_result"} around tools, then one {"type": "result"} with what process_user_query returns;
+        # a fast path command answers once published, {"type": "confirmation"} follows when the device echoed it or timed out
+        try:
+            with telemetry.span("agent.fast_path"):
+                local = self.service_handler.run_local_intent(query)
+            if local is not None:
+                answer, commands = local
+                text = json.dumps(answer)
+                self._record_local_turn(query, text)
+                yield {"type" : "result", "text" : text}
+                if commands:
+                    yield {"type" : "confirmation", "topic" : commands[0].topic, **self.service_handler.confirm_commands(commands)}
+                return
+
+            key, context = None, None
+            if self.response_cache:
+                with telemetry.span("agent.response_cache"):
+                    context = self.service_handler.state_version("context")
+                    key = self.response_cache.key(query, context)
+                    cached = self.response_cache.get(key, self.service_handler.state_version)
+                if cached is not None:
+                    self._record_local_turn(query, cached) # the model would not know it already answered
+                    yield {"type" : "result", "text" : cached, "cached" : True}
+                    return
+
+            reply, start = JsonStream(), len(getattr(self.llm, "history", None) or [])
+            answered, dispatched = yield from self._stream_reply(query, priority, reply)
+            if dispatched:
+                try:
+                    # the model may call more tools once it read the results, each round goes back until one calls none
+                    calls, rounds = dispatched, 1
+                    while calls and rounds < self.max_tool_rounds:
+                        reply = JsonStream()
+                        _, calls = yield from self._stream_reply(dumps(self._function_response(calls)), priority, reply)
+                        dispatched, rounds = dispatched + calls, rounds + 1
+                    if calls:
+                        # the chat would end on calls nobody answered, the turn is kept as a plain exchange instead
+                        response_content, key = f"Stopped after {rounds} rounds of tool calls.", None
+                        self.llm.history = list(self.llm.history)[:start]
+                        self._record_local_turn(query, response_content)
+                    else:
+                        response_content = reply.text
+                except google.api_core.exceptions.GoogleAPIError as e:
+                    response_content, key = f"Error processing function result: {str(e)}", None
+            elif not answered:
+                response_content, key = "No response generated.", None
             else:
-                response_content = "No response generated."
+                response_content = reply.text or "No content in the response."
         
         except google.api_core.exceptions.GoogleAPIError as e:
-            response_content = f"An error occurred while processing your request: {str(e)}. Please try again later."
+            response_content, key = f"An error occurred while processing your request: {str(e)}. Please try again later.", None
         except Exception as e:
-            response_content = f"An unexpected error occurred: {str(e)}. Please try again later."
-        
-        try:
-            return json.dumps(json.loads(response_content.strip('`').lstrip('json\n')))
-        except json.JSONDecodeError:
-            return response_content
+            response_content, key = f"An unexpected error occurred: {str(e)}. Please try again later.", None
+
+        result = normalize(response_content)
+        if key is not None and reply.text:
+            self._cache_result(key, result, dispatched, context)
+        if self.memory_config.get("chat_history_bytes"):
+            self._trim_history(self.memory_config["chat_history_bytes"])
+        yield {"type" : "result", "text" : result}
+
+
+    def _record_local_turn(self, query:str, text:str):
+        # the model never saw a fast path exchange, without it "turn it back off" would be answered from a stale history
+        history = list(getattr(self.llm, "history", None) or [])
+        self.llm.history = history + [{"role" : "user", "parts" : [{"text" : query}]}, {"role" : "model", "parts" : [{"text" : text}]}]
+
+
+    @staticmethod
+    def _turn_start(entry) -> bool:
+        # a user text message, the query or the function results sent back as JSON, is a safe place to cut
+        if getattr(entry, "role", "user") != "user":
+            return False
+        return not any(getattr(part, "function_response", None) for part in getattr(entry, "parts", None) or [])
+
+
+    def _trimmed(self, history:List[Any], max_bytes:int) -> List[Any]:
+        # the first exchange uploads the context and stays, the oldest of the others go until the history fits,
+        # the last one is always kept
+        starts = [index for index, entry in enumerate(history) if self._turn_start(entry)]
+        if len(starts) < 3:
+            return history
+        sizes = [deep_size(entry) for entry in history]
+        total, turn = sum(sizes), 1
+        while total > max_bytes and turn < len(starts) - 1:
+            total -= sum(sizes[starts[turn]:starts[turn + 1]])
+            turn += 1
+        return history[:starts[1]] + history[starts[turn]:] if turn > 1 else history
+
+
+    def _trim_history(self, max_bytes:int):
+        # the chat session keeps every message, see _trimmed
+        history = list(getattr(self.llm, "history", None) or [])
+        trimmed = self._trimmed(history, max_bytes)
+        if len(trimmed) < len(history):
+            self.llm.history = trimmed
+
+
+    def memory_usage(self, top:int=0) -> Dict[str,Any]:
+        # estimated bytes of every store, iot_data and workspace_data are the handler snapshots and not counted twice
+        history = list(getattr(self.llm, "history", None) or [])
+        usage = self.service_handler.memory_usage()
+        usage["chat_history"] = {"messages" : len(history), "bytes" : deep_size(history), "max_bytes" : self.memory_config.get("chat_history_bytes")}
+        usage["analysed_videos"] = deep_size(self.video_file_already_analyse)
+        if self.response_cache:
+            cache = self.response_cache.stats()
+            usage["response_cache"] = {"entries" : cache["entries"], "bytes" : cache["bytes"], "max_bytes" : self.response_cache.max_bytes}
+        usage["process"] = {"rss" : rss_bytes(), **memory_tracer.stats()}
+        if top:
+            # allocation sites that grew the most since tracing started, empty unless it runs
+            usage["process"]["top"] = memory_tracer.top(top, since_start=True)
+        return usage
+
+
+    def _read_versions(self, function_calls) -> Optional[Dict[str,Any]]:
+        # versions of what the calls are about to read, None when one of them is not a plain read
+        versions = {}
+        for call in function_calls:
+            sources = tool_sources(call.name, dict(call.args) if call.args else {})
+            if sources is None:
+                return None
+            versions.update({source : self.service_handler.state_version(source) for source in sources})
+        return versions
+
+
+    def _cache_result(self, key:str, result:str, dispatched, context:str):
+        # only answers that read state: no action, no failed tool, and nothing the turn read moved while it ran;
+        # an answer without tools comes from the conversation, which the key does not cover
+        if not dispatched:
+            return
+        versions = {}
+        for calls, response, read in dispatched:
+            if read is None:
+                return
+            responses = [entry["response"] for entry in response] if len(calls) > 1 else [response]
+            if any(isinstance(response, dict) and ("Error" in response or "Raison" in response) for response in responses): # failures of the services
+                return
+            versions.update(read)
+        version = self.service_handler.state_version
+        if version("context") != context or any(version(source) != value for source, value in versions.items()):
+            return
+        self.response_cache.put(key, result, versions)
+
+
+    def _stream_reply(self, content: str, priority: str, reply: JsonStream):
+        # events of one model message; returns whether the model answered and the function calls it ran
+        answered, dispatched = False, []
+        for chunk in self.governor.stream(self.llm.send_message, content, stream=True, priority=priority):
+            if not chunk.candidates:
+                continue
+            answered = True
+            parts = chunk.candidates[0].content.parts
+            for part in parts:
+                if not part.function_call and part.text:
+                    yield {"type" : "text", "text" : part.text}
+                    for key, text in reply.feed(part.text):
+                        yield {"type" : "field", "key" : key, "text" : text}
+
+            # a function call never spans chunks, those of this chunk run before the rest of the reply is read
+            function_calls = [part.function_call for part in parts if part.function_call]
+            if function_calls:
+                for call in function_calls:
+                    yield {"type" : "function_call", "name" : call.name, "args" : dict(call.args) if call.args else {}}
+                read = self._read_versions(function_calls) if self.response_cache else None
+                with telemetry.span("agent.dispatch", calls=len(function_calls)):
+                    result = self.dispatch_function_calls(function_calls)
+                dispatched.append((function_calls, result, read))
+                yield {"type" : "function_result", "names" : [call.name for call in function_calls], "response" : result}
+        return answered, dispatched
+
+
+    def _function_response(self, dispatched) -> Any:
+        # one batch keeps the shape of dispatch_function_calls, calls spread over chunks go back as one list
+        if len(dispatched) == 1:
+            return dispatched[0][1]
+        return [entry for calls, result, _ in dispatched
+                for entry in (result if len(calls) > 1 else [{"function" : calls[0].name, "response" : result}])]
         
 
         
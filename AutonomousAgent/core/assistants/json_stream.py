@@ -0,0 +1,124 @@
+import json
+from typing import List, Tuple
+
+
+def normalize(text:str) -> str:
+    # compact JSON when the reply parses, with or without its ```json fence, the raw text otherwise
+    try:
+        return json.dumps(json.loads(text.strip('`').lstrip('json\n')))
+    except json.JSONDecodeError:
+        return text
+
+
+ESCAPES = {"n" : "\n", "t" : "\t", "r" : "\r", "b" : "\b", "f" : "\f", "/" : "/", "\\" : "\\", "\"" : "\""}
+
+
+class JsonStream:
+    # reads the model reply chunk by chunk: top level string fields come out as they are written, the whole value at the end
+    def __init__(self):
+        self.chunks:List[str] = []
+        self.depth:int        = 0
+        self.started:bool     = False # past the ```json fence, inside the first { or [
+        self.done:bool        = False
+        self.in_string:bool   = False
+        self.escape:bool      = False
+        self.unicode:str      = None  # hex digits of a \uXXXX escape being read
+        self.expect:str       = "key" # what comes next in the top level object: key, colon, value or comma
+        self.key:List[str]    = []
+        self.current:str      = None  # top level key whose string value is being streamed
+        self.role:str         = None  # "key", "value" or None for strings we only skip
+
+
+    def feed(self, text:str) -> List[Tuple[str,str]]:
+        # (key, decoded text) for every top level string value that grew with this chunk
+        self.chunks.append(text)
+        deltas:List[Tuple[str,str]] = []
+        output:List[str] = []
+        for char in text:
+            if self.done:
+                break
+            if not self.started:
+                if char in "{[":
+                    self.started, self.depth = True, 1
+                    self.expect = "key" if char == "{" else None
+                continue
+
+            if self.in_string:
+                decoded = self._string_char(char)
+                if decoded is None:
+                    continue
+                if decoded is False: # closing quote
+                    if self.role == "key":
+                        self.expect = "colon"
+                    elif self.role == "value":
+                        if output:
+                            deltas.append((self.current, "".join(output)))
+                            output = []
+                        self.current, self.expect = None, "comma"
+                    self.role = None
+                elif self.role == "key":
+                    self.key.append(decoded)
+                elif self.role == "value":
+                    output.append(decoded)
+                continue
+
+            if char == "\"":
+                self.in_string = True
+                if self.depth == 1 and self.expect == "key":
+                    self.role, self.key = "key", []
+                elif self.depth == 1 and self.expect == "value":
+                    self.role, self.current = "value", "".join(self.key)
+                else:
+                    self.role = None
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                elif self.depth == 1:
+                    self.expect = "comma"
+            elif self.depth == 1 and self.expect is not None:
+                if char == ":" and self.expect == "colon":
+                    self.expect = "value"
+                elif char == "," and self.expect in ("comma", "value"):
+                    self.expect = "key"
+
+        if output:
+            deltas.append((self.current, "".join(output)))
+        return deltas
+
+
+    def _string_char(self, char:str):
+        # the decoded character, None while an escape is incomplete, False for the closing quote
+        if self.unicode is not None:
+            self.unicode += char
+            if len(self.unicode) < 4:
+                return None
+            code, self.unicode = self.unicode, None
+            try:
+                return chr(int(code, 16))
+            except ValueError:
+                return ""
+        if self.escape:
+            self.escape = False
+            if char == "u":
+                self.unicode = ""
+                return None
+            return ESCAPES.get(char, char)
+        if char == "\\":
+            self.escape = True
+            return None
+        if char == "\"":
+            self.in_string = False
+            return False
+        return char
+
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+    def result(self) -> str:
+        return normalize(self.text)
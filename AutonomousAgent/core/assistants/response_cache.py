@@ -0,0 +1,160 @@
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from ..services.memory import deep_size
+
+
+# the state a read only tool result depends on, see Handler.state_version; a turn that ran any other tool is never cached
+TOOL_SOURCES:Dict[str,Callable[[Dict[str,Any]], List[str]]] = {
+    "iot_get_states"   : lambda args: [f"iot:{topic}" for topic in args.get("topics") or []] or ["iot"],
+    "get_mails"        : lambda args: ["workspace"],
+    "search_mails"     : lambda args: ["workspace"],
+    "get_events"       : lambda args: ["workspace"],
+    "get_news"         : lambda args: ["news"],
+    "get_video_events" : lambda args: ["video"],
+}
+
+
+def tool_sources(name:str, args:Dict[str,Any]) -> Optional[List[str]]:
+    sources = TOOL_SOURCES.get(name)
+    return sources(args) if sources else None
+
+
+def normalize_query(query:str) -> str:
+    # "What's the  temperature?" and "what's the temperature" are the same question
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+class ResponseCache:
+    # answers of past turns keyed by question and context, each one checked against the versions of the state it read
+    def __init__(self, max_entries:int=256, ttl:float=300, path:Optional[str]=None, max_disk_entries:int=10000,
+                 max_bytes:Optional[int]=None):
+        self.max_entries:int      = max_entries
+        self.max_bytes:Optional[int] = max_bytes # answers quoting mails or news are large, bounds the memory tier only
+        self.ttl:float            = ttl
+        self.max_disk_entries:int = max_disk_entries
+        self.entries:OrderedDict  = OrderedDict() # key -> (stored at, result, versions), least recently used first
+        self.sizes:Dict[str,int]  = {} # estimated bytes of each entry
+        self.bytes:int            = 0
+        self.lock:Lock            = Lock()
+        self.counters:Dict[str,int] = {"hits" : 0, "misses" : 0, "invalidated" : 0, "expired" : 0, "stored" : 0, "disk_hits" : 0}
+        # optional second tier, survives restarts; only entries free of per process counters validate after one
+        self.connection = sqlite3.connect(path, check_same_thread=False) if path else None
+        if self.connection:
+            with self.lock, self.connection:
+                self.connection.execute("""
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key       TEXT PRIMARY KEY,
+                        stored_at REAL,
+                        result    TEXT,
+                        versions  TEXT
+                    )
+                """)
+
+
+    def key(self, query:str, context:str) -> str:
+        return hashlib.sha256(f"{context}\0{normalize_query(query)}".encode()).hexdigest()
+
+
+    def _load(self, key:str) -> Optional[Tuple[float, str, Dict[str,Any]]]:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if not self.connection:
+            return None
+        row = self.connection.execute("SELECT stored_at, result, versions FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], row[1], json.loads(row[2]))
+        self._remember(key, entry)
+        self.counters["disk_hits"] += 1
+        return entry
+
+
+    def _remember(self, key:str, entry:Tuple[float, str, Dict[str,Any]]):
+        self._forget(key)
+        self.entries[key] = entry
+        self.sizes[key] = deep_size(key) + deep_size(entry)
+        self.bytes += self.sizes[key]
+        while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes and len(self.entries) > 1):
+            self._forget(next(iter(self.entries)))
+
+
+    def _forget(self, key:str):
+        if self.entries.pop(key, None) is not None:
+            self.bytes -= self.sizes.pop(key)
+
+
+    def _drop(self, key:str):
+        self._forget(key)
+        if self.connection:
+            with self.connection:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+
+    def get(self, key:str, version:Callable[[str], Any]) -> Optional[str]:
+        with self.lock:
+            entry = self._load(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            stored_at, result, versions = entry
+            if time.time() - stored_at > self.ttl:
+                self._drop(key)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+        # versions are read outside the lock, they may take the service locks
+        if any(version(source) != value for source, value in versions.items()):
+            with self.lock:
+                self._drop(key)
+                self.counters["invalidated"] += 1
+                self.counters["misses"] += 1
+            return None
+        with self.lock:
+            self.counters["hits"] += 1
+        return result
+
+
+    def put(self, key:str, result:str, versions:Dict[str,Any]):
+        entry = (time.time(), result, versions)
+        with self.lock:
+            self._remember(key, entry)
+            self.counters["stored"] += 1
+            if self.connection:
+                with self.connection:
+                    self.connection.execute("INSERT OR REPLACE INTO responses(key, stored_at, result, versions) VALUES (?, ?, ?, ?)",
+                                            (key, entry[0], result, json.dumps(versions)))
+                    # the oldest rows go first once the file holds more than max_disk_entries
+                    self.connection.execute("""
+                        DELETE FROM responses WHERE key IN (
+                            SELECT key FROM responses ORDER BY stored_at DESC LIMIT -1 OFFSET ?
+                        )
+                    """, (self.max_disk_entries,))
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.bytes = 0
+            if self.connection:
+                with self.connection:
+                    self.connection.execute("DELETE FROM responses")
+
+
+    def stats(self) -> Dict[str,Any]:
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                    "entries"  : len(self.entries),
+                    "bytes"    : self.bytes,
+                    "hit_rate" : round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+                    **self.counters,
+                   }
@@ -0,0 +1,191 @@
+import io
+import re
+import wave
+from collections import deque
+from typing import List, Iterator, Tuple, Union, BinaryIO
+
+import numpy as np
+
+
+def read_wav(audio:Union[str, BinaryIO], frame_ms:float=30) -> Tuple[int, Iterator[np.ndarray]]:
+    # sample rate and int16 mono frames of frame_ms, the file is read one frame at a time
+    source = wave.open(audio, "rb")
+    rate, channels, width = source.getframerate(), source.getnchannels(), source.getsampwidth()
+    if width != 2:
+        source.close()
+        raise ValueError(f"Only 16 bit PCM wav files are supported, got {8 * width} bit")
+    frame = max(1, int(rate * frame_ms / 1000))
+
+    def frames():
+        with source:
+            while True:
+                data = source.readframes(frame)
+                if not data:
+                    return
+                samples = np.frombuffer(data, dtype=np.int16)
+                if channels > 1:
+                    samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+                yield samples
+    return rate, frames()
+
+
+def to_wav(samples:np.ndarray, rate:int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as target:
+        target.setnchannels(1)
+        target.setsampwidth(2)
+        target.setframerate(rate)
+        target.writeframes(samples.astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+class VoiceActivityDetector:
+    # a frame is speech when it stands out of the noise floor and does not cross zero like hiss does
+    def __init__(self, margin_db:float=10, min_db:float=-50, max_zero_crossings:float=0.35, adaptation:float=0.05):
+        self.margin_db:float          = margin_db  # above the noise floor
+        self.min_db:float             = min_db     # never speech below this, whatever the floor
+        self.max_zero_crossings:float = max_zero_crossings # share of samples changing sign, white noise is around 0.5
+        self.adaptation:float         = adaptation
+        self.noise_db:float           = min_db - margin_db # a stream may start with speech, the floor learns the room from below
+
+
+    def measure(self, frame:np.ndarray) -> Tuple[float, float]:
+        samples = frame.astype(np.float32) / 32768.0
+        energy = float(np.mean(samples * samples)) if samples.size else 0.0
+        crossings = float(np.mean(np.signbit(samples[1:]) != np.signbit(samples[:-1]))) if samples.size > 1 else 0.0
+        return 10 * np.log10(energy + 1e-10), crossings
+
+
+    def is_speech(self, frame:np.ndarray) -> bool:
+        level, crossings = self.measure(frame)
+        speech = level > max(self.noise_db + self.margin_db, self.min_db) and crossings < self.max_zero_crossings
+        if not speech:
+            # the floor follows the background, and drops at once when the room gets quieter
+            self.noise_db = min(level, self.noise_db + self.adaptation * (level - self.noise_db))
+        else:
+            # a steady hum taken for speech is slowly absorbed, a sentence is over long before
+            self.noise_db += self.adaptation * 0.02 * (level - self.noise_db)
+        return speech
+
+
+class Segment:
+    def __init__(self, samples:np.ndarray, start:float, end:float, utterance:int, final:bool):
+        self.samples:np.ndarray = samples
+        self.start:float        = start # seconds from the beginning of the stream
+        self.end:float          = end
+        self.utterance:int      = utterance
+        self.final:bool         = final # last segment of the utterance
+
+
+class SpeechSegmenter:
+    # cuts a frame stream into speech segments; long utterances go out every max_segment seconds with some overlap,
+    # so the first words are transcribed while the speaker is still talking
+    def __init__(self, sample_rate:int, frame_ms:float=30, max_segment:float=4.0, overlap:float=0.5, padding:float=0.2,
+                 hangover:float=0.3, min_speech:float=0.15, **detector):
+        self.sample_rate:int     = sample_rate
+        self.frame:float         = frame_ms / 1000
+        self.detector:VoiceActivityDetector = VoiceActivityDetector(**detector)
+        self.max_frames:int      = max(1, int(max_segment / self.frame))
+        self.overlap_frames:int  = min(int(overlap / self.frame), self.max_frames - 1)
+        self.hangover_frames:int = max(1, int(hangover / self.frame)) # silence that ends an utterance
+        self.min_frames:int      = max(1, int(min_speech / self.frame)) # shorter bursts are clicks, not words
+        self.preroll:deque       = deque(maxlen=int(padding / self.frame)) # kept before the onset, soft first syllables
+        self.active:List[np.ndarray] = None
+        self.start:float         = 0.0
+        self.position:float      = 0.0
+        self.speech_frames:int   = 0
+        self.silence:int         = 0
+        self.sent:bool           = False # part of the current utterance already went out
+        self.utterance:int       = 0
+
+
+    def feed(self, frame:np.ndarray) -> List[Segment]:
+        speech = self.detector.is_speech(frame)
+        self.position += len(frame) / self.sample_rate
+        if self.active is None:
+            if not speech:
+                self.preroll.append(frame)
+                return []
+            self.active = list(self.preroll) + [frame]
+            self.start = self.position - sum(len(chunk) for chunk in self.active) / self.sample_rate
+            self.preroll.clear()
+            self.speech_frames, self.silence, self.sent = 1, 0, False
+            return []
+
+        self.active.append(frame)
+        if speech:
+            self.speech_frames, self.silence = self.speech_frames + 1, 0
+        else:
+            self.silence += 1
+        if self.silence >= self.hangover_frames:
+            return self._close()
+        if len(self.active) >= self.max_frames:
+            segment = self._segment(final=False)
+            self.active = self.active[len(self.active) - self.overlap_frames:] if self.overlap_frames else []
+            self.start = self.position - sum(len(chunk) for chunk in self.active) / self.sample_rate
+            self.sent = True
+            return [segment]
+        return []
+
+
+    def flush(self) -> List[Segment]:
+        # end of the stream, whatever is still open is the end of an utterance
+        return self._close() if self.active is not None else []
+
+
+    def _segment(self, final:bool) -> Segment:
+        return Segment(np.concatenate(self.active), self.start, self.position, self.utterance, final)
+
+
+    def _close(self) -> List[Segment]:
+        keep = self.sent or self.speech_frames >= self.min_frames
+        segments = [self._segment(final=True)] if keep and self.active else []
+        if keep:
+            self.utterance += 1
+        self.active = None
+        return segments
+
+
+def merge_transcripts(previous:str, text:str, max_words:int=8) -> str:
+    # overlapping segments repeat a few words at the seam, drop them from the start of text
+    def words(value:str) -> List[str]:
+        return [re.sub(r"[^\w']", "", word.lower()) for word in value.split()]
+    tail, head = words(previous)[-max_words:], words(text)
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            return " ".join(text.split()[size:])
+    return text
+
+
+class SentenceChunker:
+    # cuts streamed text at sentence ends, each piece is spoken while the model is still writing the next one
+    SENTENCE_END = re.compile(r"[.!?;:\n]+[\"')\]]*(?=\s)") # "3.5" is not an end, the piece after the last one waits for flush
+
+    def __init__(self, min_chars:int=40, max_chars:int=200):
+        self.min_chars:int = min_chars # short sentences are joined, one synthesis call per few words costs more than it saves
+        self.max_chars:int = max_chars
+        self.buffer:str    = ""
+
+
+    def feed(self, text:str) -> List[str]:
+        self.buffer += text
+        pieces = []
+        while True:
+            cut = None
+            for match in self.SENTENCE_END.finditer(self.buffer):
+                if match.end() >= self.min_chars:
+                    cut = match.end()
+                    break
+            if cut is None and len(self.buffer) > self.max_chars:
+                space = self.buffer.rfind(" ", 0, self.max_chars)
+                cut = space if space > 0 else self.max_chars
+            if cut is None:
+                return pieces
+            piece, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:].lstrip()
+            if piece:
+                pieces.append(piece)
+
+
+    def flush(self) -> List[str]:
+        piece, self.buffer = self.buffer.strip(), ""
+        return [piece] if piece else []
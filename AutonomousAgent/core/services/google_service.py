@@ -9,14 +9,19 @@ from google_auth_oauthlib.flow import Flow, InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 from google.auth.transport.requests import Request
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+from .telemetry import traced
+from .parse_pool import ParsePool
+from .parsers import parse_message, parse_messages, mail_from_row
 
 class Google: 
-    def __init__(self, client_credentials_file_path) -> None:
+    def __init__(self, client_credentials_file_path, parser:Optional[ParsePool]=None) -> None:
           self.mail_service:Any       = None 
           self.calendar_service:Any   = None
           self.client_secret_file:str = client_credentials_file_path
           self.context:Dict[str:str]  = {"function" : "send mail, read mail and check upcoming events"}
+          self.parser:ParsePool       = parser # decodes the mail bodies out of process, inline when None
 
     def _Create_Service(self, api_name, api_version, *scopes, prefix=''):
         CLIENT_SECRET_FILE = self.client_secret_file
@@ -58,25 +63,52 @@ class Google:
             return None
 
 
+    def _raw_message(self, to, subject, body) -> str:
+        mimeMessage = MIMEMultipart()
+        mimeMessage['to'] = to
+        mimeMessage['subject'] = subject
+        mimeMessage.attach(MIMEText(body, 'plain'))
+        return base64.urlsafe_b64encode(mimeMessage.as_bytes()).decode()
+
+
+    @traced("gmail.send")
     def send_email(self,to, subject, body):
         try : 
             if self.mail_service is None :
                 self.mail_service = self._Create_Service('gmail',"v1",['https://mail.google.com/'])
 
-            emailMsg = body
-            mimeMessage = MIMEMultipart()
-            mimeMessage['to'] = to
-            mimeMessage['subject'] = subject
-            mimeMessage.attach(MIMEText(emailMsg, 'plain'))
-            raw_string = base64.urlsafe_b64encode(mimeMessage.as_bytes()).decode()
+            raw_string = self._raw_message(to=to, subject=subject, body=body)
             self.mail_service.users().messages().send(userId="me", body={'raw': raw_string}).execute()
             return True 
         except Exception as e: 
             return False 
 
 
+    @traced("gmail.send_batch")
+    def send_emails(self, messages:list, batch_size:int=100) -> Dict[str, Any]:
+        # unlike send_email, errors are reported per message so the caller can retry them;
+        # the exception itself, its HTTP status tells a full quota from a bad recipient
+        if self.mail_service is None :
+            self.mail_service = self._Create_Service('gmail',"v1",['https://mail.google.com/'])
+
+        errors = {}
+
+        def callback(request_id, response, exception):
+            errors[request_id] = exception
+
+        for start in range(0, len(messages), batch_size):
+            batch = self.mail_service.new_batch_http_request(callback=callback)
+            for message in messages[start:start + batch_size]:
+                raw_string = self._raw_message(to=message["to"], subject=message["subject"], body=message["body"])
+                batch.add(self.mail_service.users().messages().send(userId="me", body={'raw': raw_string}), request_id=message["id"])
+            batch.execute()
+
+        return errors
+
+
     
 
+    @traced("gmail.list")
     def get_emails(self,max_results=10000) -> dict:
         if self.mail_service is None :
             self.mail_service = self._Create_Service('gmail',"v1", ['https://mail.google.com/'])
@@ -89,35 +121,54 @@ class Google:
             
         else:
 
-            for message in messages:
-                msg = self.mail_service.users().messages().get(userId='me', id=message['id']).execute()
-                
-                # Get headers
-                headers = msg['payload']['headers']
-                subject = next((header['value'] for header in headers if header['name'].lower() == 'subject'), '(No subject)')
-                sender = next((header['value'] for header in headers if header['name'].lower() == 'from'), '(No sender)')
-                
-                # Get body
-                if 'parts' in msg['payload']:
-                    parts = msg['payload']['parts']
-                    body = ''
-                    for part in parts:
-                        if part['mimeType'] == 'text/plain':
-                            body = part['body'].get('data', '')
-                            break
-                else:
-                    body = msg['payload']['body'].get('data', '')
-                
-                if body:
-                    body = base64.urlsafe_b64decode(body).decode('utf-8')
-                else:
-                    body = '(No body)'
-                
-                msgs[messages.index(message)] = {"From" : sender, "suject" : subject, "Body" : body}
+            raw = [self.mail_service.users().messages().get(userId='me', id=message['id']).execute() for message in messages]
+            for index, parsed in enumerate(self._parse_messages(raw)):
+                msgs[index] = {"From" : parsed["From"], "suject" : parsed["suject"], "Body" : parsed["Body"]}
 
         return msgs 
 
+
+    def _parse_message(self, msg) -> dict:
+        return mail_from_row(parse_message(msg))
+
+
+    def _parse_messages(self, messages:List[dict]) -> List[dict]:
+        # base64 and utf-8 decoding of a whole sync, in batches on the parse workers
+        rows = self.parser.map_batches(parse_messages, messages) if self.parser else parse_messages(messages)
+        return [mail_from_row(row) for row in rows]
+
+
+    @traced("gmail.sync")
+    def sync_emails(self, store, max_results=1000, batch_size=100) -> int:
+        if self.mail_service is None :
+            self.mail_service = self._Create_Service('gmail',"v1", ['https://mail.google.com/'])
+
+        new_ids = []
+        listed = 0
+        page_token = None
+        while listed < max_results:
+            results = self.mail_service.users().messages().list(userId='me', maxResults=min(500, max_results - listed), pageToken=page_token).execute()
+            ids = [message['id'] for message in results.get('messages', [])]
+            if not ids:
+                break
+
+            listed += len(ids)
+            known = store.known_ids(ids)
+            new_ids.extend(message_id for message_id in ids if message_id not in known)
+
+            page_token = results.get('nextPageToken')
+            if known or not page_token: # newest first, so everything after a known page is already stored
+                break
+
+        # fetched, decoded and stored batch_size at a time, a first sync never holds every mail in memory at once
+        added = 0
+        for start in range(0, len(new_ids), batch_size):
+            raw = [self.mail_service.users().messages().get(userId='me', id=message_id).execute() for message_id in new_ids[start:start + batch_size]]
+            added += store.add(self._parse_messages(raw))
+        return added
+
     
+    @traced("calendar.list")
     def get_events(self, max_results=10000):
         comingEvents = {}
         if self.calendar_service is None :
@@ -139,10 +190,17 @@ class Google:
         return comingEvents
     
     
+    @traced("calendar.insert")
     def set_event(self, summary:str, location:str = None, description:str= None, start_time:datetime = None, end_time:datetime=None, attendees:list=None):
         if self.calendar_service is None:
             self.calendar_service = self._Create_Service('calendar', "v3", ['https://www.googleapis.com/auth/calendar'])
 
+        event = self._event_body(summary=summary, location=location, description=description, start_time=start_time, end_time=end_time, attendees=attendees)
+        event = self.calendar_service.events().insert(calendarId='primary', body=event).execute()
+        return event.get('htmlLink')
+
+
+    def _event_body(self, summary:str, location:str = None, description:str= None, start_time:datetime = None, end_time:datetime=None, attendees:list=None) -> dict:
         event = {
             'summary': summary,
             'location': location,
@@ -159,6 +217,29 @@ class Google:
 
         if attendees:
             event['attendees'] = [{'email': attendee} for attendee in attendees]
+        return event
 
-        event = self.calendar_service.events().insert(calendarId='primary', body=event).execute()
-        return event.get('htmlLink')
\ No newline at end of file
+
+    @traced("calendar.insert_batch")
+    def set_events(self, events:list, batch_size:int=50) -> list:
+        if self.calendar_service is None:
+            self.calendar_service = self._Create_Service('calendar', "v3", ['https://www.googleapis.com/auth/calendar'])
+
+        results = [None] * len(events)
+
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                results[index] = {"event": "failed", "error": str(exception)}
+            else:
+                results[index] = {"event": "created", "link": response.get('htmlLink')}
+
+        # the Calendar API accepts at most 50 calls per batch request
+        for start in range(0, len(events), batch_size):
+            batch = self.calendar_service.new_batch_http_request(callback=callback)
+            for index in range(start, min(start + batch_size, len(events))):
+                body = self._event_body(**events[index])
+                batch.add(self.calendar_service.events().insert(calendarId='primary', body=body), request_id=str(index))
+            batch.execute()
+
+        return results
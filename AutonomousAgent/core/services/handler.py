@@ -1,32 +1,55 @@
 from ...interfaces import ServiceInterface
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from itertools import islice 
 from datetime import datetime
 
 from .service_handler import Handler
+from .result_encoder import ResultEncoder
+from .intent_matcher import IntentMatcher
+from .iot_commands import state_keys, PendingCommand
+from .telemetry import telemetry
+from .scheduler import Scheduler
+from .service_pool import ServicePool
 
 
 class ServiceHandler(ServiceInterface):
-    def __init__(self, service_config:Dict[str,Dict[str,str]]):
+    def __init__(self, service_config:Dict[str,Dict[str,str]], pool:Optional[ServicePool]=None):
         super().__init__()
-        self.service_handler:Handler = Handler(config=service_config)
+        self.service_handler:Handler = Handler(config=service_config, pool=pool)
+        self.scheduler:Scheduler     = self.service_handler.scheduler
+        self.result_encoder:ResultEncoder = ResultEncoder(**service_config.get("results", {}))
+        if "telemetry" in service_config:
+            telemetry.configure(**service_config["telemetry"])
+
+        # simple device commands answered without the model, off unless configured
+        self.intent_matcher:IntentMatcher = None
+        if "fast_path" in service_config and self.service_handler.iot_object:
+            self.intent_matcher = IntentMatcher(**service_config["fast_path"])
 
         self.FUNCTION_MAP:Dict[str,Callable] = {
                                                     "iot_get_states" : self.iot_get_states, 
                                                     "iot_set_states": self.iot_set_states,
                                                     "get_mails": self.get_mails, 
+                                                    "search_mails": self.search_mails,
                                                     "send_mail": self.send_mail, 
+                                                    "get_mail_status": self.get_mail_status,
                                                     "get_events": self.get_events, 
                                                     "set_event": self.set_event, 
-                                                    "get_news": self.get_news
+                                                    "set_events": self.set_events,
+                                                    "get_news": self.get_news,
+                                                    "get_video_events": self.get_video_events,
+                                                    "get_more_result": self.get_more_result
                                                 }
         
     def iot_set_states(self, topics:List[str], states:List[str]) -> Dict[str,str]:
        
-        response: Dict[str, str] = {}
-        if self.service_handler.iot_object.get_iot_status():
-            for topic in topics:
-                response[topic] = self.service_handler.iot_object.set_state(topic=topic, state=states[topics.index(topic)])
+        response: Dict[str, Any] = {}
+        iot_object = self.service_handler.iot_object
+        if iot_object.get_iot_status():
+            # publish everything first, then wait for the state echoes together
+            commands = {topic : iot_object.send_command(topic=topic, state=state) for topic, state in zip(topics, states)}
+            for topic, pending in commands.items():
+                response[topic] = iot_object.wait_command(pending, timeout=self.service_handler.iot_command_timeout)
             return response
 
         return {"Operation" : "Failed", "Raison" : "Iot System is disconnected"}
@@ -42,31 +65,75 @@ class ServiceHandler(ServiceInterface):
         return {"states" : "Unvalable", "Raison" : "IoT System is disconnected"}
 
 
-    def get_news(self) -> str:
-        return {"Source" : self.service_handler.get_news_source(), "News" :self.service_handler.get_news()}
+    def get_news(self, since:Optional[int]=None, number_of_articles:Optional[int]=None) -> Dict[str,Any]:
+        since = int(since) if since is not None else None
+        limit = int(number_of_articles) if number_of_articles else None
+        cursor = self.service_handler.get_news_cursor()
+        news = self.service_handler.get_news(since=since, limit=limit)
+        if since is not None and limit and len(news) == limit:
+            cursor = max(article["id"] for article in news) # more are waiting, the next page starts after the last one returned
+        return {
+                "Source" : self.service_handler.get_news_source(),
+                "Cursor" : cursor,
+                "News"   : news
+               }
+
+    def get_video_events(self, since:Optional[str]=None, until:Optional[str]=None, camera:Optional[str]=None, limit:Optional[int]=None) -> Dict[str,Any]:
+        try:
+            events = self.service_handler.get_video_events(since=since, until=until, camera=camera, limit=int(limit) if limit else 20)
+        except ValueError as e:
+            return {"Error" : str(e)}
+        return {
+                "Since"   : since,
+                "Until"   : until,
+                "Cameras" : self.service_handler.get_video_cameras(),
+                "Results" : len(events),
+                "Videos"  : [{
+                              "Date"        : datetime.fromtimestamp(event["at"]).isoformat(sep=' ', timespec='seconds'),
+                              "Camera"      : event["camera"],
+                              "Description" : event["description"]
+                             } for event in events]
+               }
+
+
+    def get_news_health(self) -> List[Dict[str,Any]]:
+        return self.service_handler.get_news_health()
     
 
     def get_mails(self,id:Optional[int]=None, number_of_mail:Optional[int]=None) -> Dict[str,Any]:
-        emails = self.service_handler.get_mails()
-        response: Dict[str, Any] = {"Total Mails": len(emails)}
+        total = self.service_handler.count_mails()
+        response: Dict[str, Any] = {"Total Mails": total}
 
-        if not emails:
+        if not total:
             response["Emails"] = {"content": "empty (No Mail)"}
             return response
 
         if number_of_mail : 
-                response["Emails"] = dict(islice(emails.items(), min(len(emails), number_of_mail)))
+                response["Emails"] = self.service_handler.get_mails(limit=int(number_of_mail))
         elif id:
-            response["Emails"] = self.service_handler.get_mails()[int(id)]
+            response["Emails"] = self.service_handler.get_mails(limit=1, offset=int(id)).get(int(id), {"content": "No mail with this id"})
         else : 
-            response["Emails"] = dict(islice(emails.items(), min(len(emails), 5)))
+            response["Emails"] = self.service_handler.get_mails(limit=5)
 
         return response    
 
 
+    def search_mails(self, query:Optional[str]=None, since:Optional[str]=None, limit:Optional[int]=None) -> Dict[str,Any]:
+        try:
+            mails = self.service_handler.search_mails(query=query, since=since, limit=int(limit) if limit else 10)
+        except ValueError as e:
+            return {"Error" : str(e)}
+        return {"Query" : query, "Since" : since, "Results" : len(mails), "Emails" : mails}
+
+
     def send_mail(self, to:str, subject:str, body:str) -> Dict[str,Any] :
-        action = self.service_handler.google_object.send_email(to=to, subject=subject, body=body)
-        return {"mail status": "sent"} if action else {"mail status": "failed"}
+        mail_id = self.service_handler.queue_mail(to=to, subject=subject, body=body)
+        return {"mail status": "queued", "id": mail_id}
+
+
+    def get_mail_status(self, id:str) -> Dict[str,Any]:
+        status = self.service_handler.get_mail_status(mail_id=id)
+        return {"mail status": status["status"], **status} if status else {"Error": f"No queued mail with id {id}"}
     
 
     def get_events(self) -> Dict[int, Dict[str, str]]:
@@ -84,6 +151,109 @@ class ServiceHandler(ServiceInterface):
         )
         return {"event": "created", "link": link} if link else {"event": "failed"}
     
+    def _validate_event(self, event:Dict[str,Any]) -> Dict[str,Any]:
+        for key in ("summary", "start_time", "end_time"):
+            if not event.get(key):
+                raise ValueError(f"missing {key}")
+        for key in ("start_time", "end_time"):
+            if not isinstance(event[key], str): # the model sometimes sends a number or a nested object
+                raise ValueError(f"{key} must be a 'YYYY-MM-DD HH:MM:SS' string")
+
+        start_time = datetime.strptime(event["start_time"], '%Y-%m-%d %H:%M:%S')
+        end_time   = datetime.strptime(event["end_time"], '%Y-%m-%d %H:%M:%S')
+        if end_time <= start_time:
+            raise ValueError("end_time must be after start_time")
+
+        return {
+                "summary"     : event["summary"],
+                "location"    : event.get("location"),
+                "description" : event.get("description"),
+                "start_time"  : start_time,
+                "end_time"    : end_time
+               }
+
+
+    def set_events(self, events:List[Dict[str,Any]]) -> Dict[str,Any]:
+        validated, errors = [], []
+        for index, event in enumerate(events):
+            try:
+                validated.append(self._validate_event(dict(event)))
+            except (TypeError, ValueError) as e:
+                errors.append({"index": index, "error": str(e)})
+
+        if errors: # all or nothing, nothing is created when one entry is wrong
+            return {"events": "rejected", "errors": errors}
+
+        results = self.service_handler.google_object.set_events(validated)
+        for index, result in enumerate(results):
+            result["index"] = index
+            result["summary"] = validated[index]["summary"]
+        return {"created": sum(result["event"] == "created" for result in results), "results": results}
+    
+    def match_intent(self, query:str) -> Optional[tuple]:
+        iot_object = self.service_handler.iot_object
+        if not self.intent_matcher:
+            return None
+        if self.intent_matcher.version != iot_object.ingest.topics_version:
+            self.intent_matcher.build(iot_object.iot_thing_topics.snapshot().data, version=iot_object.ingest.topics_version)
+        return self.intent_matcher.match(query)
+
+
+    def run_local_intent(self, query:str) -> Optional[Tuple[Dict[str,Any], List[PendingCommand]]]:
+        # the answer and the commands it published; the answer does not wait for the devices, see confirm_commands
+        intent = self.match_intent(query)
+        if intent is None:
+            return None
+
+        function_name, params = intent
+        iot_object = self.service_handler.iot_object
+        if function_name == "iot_get_states":
+            # a command topic has no reading of its own, ask for the state it echoes
+            topic = params["topics"][0]
+            key = next((key for key in state_keys(topic) if iot_object.get_state(key) is not None), topic)
+            result = self.iot_get_states(topics=[key])
+            value = result.get(key, result)
+            return {"response" : f"{key} is {value}", "function" : function_name, "result" : result}, []
+
+        topic, state = params["topics"][0], params["states"][0]
+        if not iot_object.get_iot_status():
+            result = {"Operation" : "Failed", "Raison" : "Iot System is disconnected"}
+            return {"response" : f"Could not set {topic} to {state}, the IoT system is disconnected", "function" : function_name, "result" : result}, []
+
+        commands = iot_object.send_command(topic=topic, state=state)
+        iot_object.expire_commands(commands, timeout=self.service_handler.iot_command_timeout)
+        text = f"{topic} set to {state}" if commands else f"Could not send {state} to {topic}"
+        result = {topic : {"state" : state, "status" : "sent" if commands else "Failed"}}
+        return {"response" : text, "function" : function_name, "result" : result}, commands
+
+
+    def confirm_commands(self, commands:List[PendingCommand]) -> Dict[str,Any]:
+        # blocks until a device echoes the new state, or for the command timeout
+        return self.service_handler.iot_object.wait_command(commands, timeout=self.service_handler.iot_command_timeout)
+
+
+    def subscribe_updates(self, listener:Callable[..., None]):
+        # listener("iot", thing, readings), listener("mail", mails), listener("calendar", changes)
+        if self.service_handler.iot_object:
+            self.service_handler.iot_object.add_state_listener(lambda thing, readings: listener("iot", thing, readings))
+        self.service_handler.add_listener(listener)
+
+
+    def state_version(self, source:str) -> Any:
+        return self.service_handler.state_version(source)
+
+
+    def memory_usage(self) -> Dict[str,Any]:
+        return self.service_handler.memory_usage()
+
+
+    def get_scheduler_stats(self) -> Dict[str,Dict[str,Any]]:
+        return self.scheduler.stats()
+
+
+    def get_iot_command_latency(self) -> Dict[str,Dict[str,Any]]:
+        return self.service_handler.iot_object.get_command_latency()
+
     def get_all_iot_data(self):
         return self.service_handler.iot_object.get_all_data()
     
@@ -102,3 +272,11 @@ class ServiceHandler(ServiceInterface):
         return {"Error" : f" {function_name} does't not find"}
 
 
+    def invoke_for_model(self,function_name:str, params:Dict[str,Any])-> Any:
+        return self.result_encoder.encode(function_name, self.invoke(function_name=function_name, params=params))
+
+
+    def get_more_result(self, cursor:str) -> Any:
+        return self.result_encoder.get_more(cursor)
+
+
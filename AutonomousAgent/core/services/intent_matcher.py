@@ -0,0 +1,143 @@
+import re
+from difflib import SequenceMatcher, get_close_matches
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+
+SET_PATTERN = re.compile(
+    r"^(?:please\s+|can you\s+|could you\s+)?"
+    r"(?:(?P<verb>turn|switch|put|set)\s+(?P<before>on|off)?\s*(?P<device>.+?)\s*(?P<after>on|off)?"
+    r"|(?P<fr_verb>allume|allumer|[ée]teins|[ée]teindre)\s+(?P<fr_device>.+?))"
+    r"(?:\s+please)?\s*[.!]*$"
+)
+STATUS_PATTERN = re.compile(
+    r"^(?:what(?:'s|\s+is|\s+are)|is|are|check|get|show(?:\s+me)?|give\s+me|quel(?:le)?\s+est)\s+"
+    r"(?:the\s+|le\s+|la\s+|l')?(?:current\s+)?(?:status|state|value|reading|[ée]tat|valeur)?\s*(?:of\s+|de\s+)?(?P<device>.+?)"
+    r"\s*(?:on|off|status|state)?\s*\??$"
+)
+# anything chained, conditional or scheduled goes to the model
+COMPLEX_PATTERN = re.compile(r"\b(?:and|then|if|when|after|before|until|every|unless|et|puis|si|quand)\b|,|;|\d+\s*(?:min|h|sec|hour|minute)")
+TOKEN_PATTERN = re.compile(r"[a-zà-ÿ]+\d*|\d+")
+CAMEL_PATTERN = re.compile(r"(?<=[a-z])(?=[A-Z])")
+NUMBER_PATTERN = re.compile(r"\b([a-zà-ÿ]+)[ _-](\d+)\b") # "valve 1" and valve_1 are the valve1 topic
+DIGITS_PATTERN = re.compile(r"\d+")
+
+STOPWORDS = frozenset(("the", "my", "a", "an", "in", "of", "at", "please", "room", "device", "le", "la", "les", "de", "du", "des", "l", "d"))
+SYNONYMS = {"lamp" : "light", "bulb" : "light", "lights" : "light", "lumiere" : "light", "lumière" : "light", "lampe" : "light"}
+
+
+def tokenize(text:str) -> List[str]:
+    tokens = TOKEN_PATTERN.findall(NUMBER_PATTERN.sub(r"\1\2", CAMEL_PATTERN.sub(" ", text).lower()))
+    words = []
+    for token in tokens:
+        token = SYNONYMS.get(token, token)
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and token.isalpha():
+            token = SYNONYMS.get(token[:-1], token[:-1]) # lamps is a light too
+        if token not in STOPWORDS:
+            words.append(token)
+    return words
+
+
+class IntentEntry:
+    __slots__ = ("topic", "thing", "device", "everything", "settable")
+
+    def __init__(self, topic:str, thing:str):
+        segments = topic.split("/")
+        self.topic      = topic
+        self.thing      = thing
+        self.settable   = segments[-1] == "command"
+        device_segments = segments[1:-1] if self.settable else segments[1:]
+        self.device     = tokenize(" ".join(device_segments)) or tokenize(thing)
+        self.everything = set(self.device) | set(tokenize(thing))
+
+
+class IntentMatcher:
+    # maps "turn off the kitchen light" / "is the pump on?" to one known topic, or returns None when unsure
+    def __init__(self, min_score:float=0.8, margin:float=0.15, token_cutoff:float=0.8):
+        self.min_score:float    = min_score
+        self.margin:float       = margin
+        self.token_cutoff:float = token_cutoff
+        self.entries:List[IntentEntry]     = []
+        self.vocabulary:List[str]          = []
+        self.postings:Dict[str,List[int]]  = {}
+        self.expansions:Dict[str,Dict[str,float]] = {}
+        self.version:Any                   = None
+
+
+    def build(self, thing_topics:Dict[str,Iterable[str]], version:Any=None):
+        self.entries = [IntentEntry(topic, thing) for thing, topics in thing_topics.items() for topic in topics]
+        self.postings = {}
+        for index, entry in enumerate(self.entries):
+            for token in entry.everything:
+                self.postings.setdefault(token, []).append(index)
+        self.vocabulary = sorted(self.postings)
+        self.expansions = {}
+        self.version = version
+
+
+    def _expand(self, token:str) -> Dict[str,float]:
+        # vocabulary words close enough to a query word, with their similarity; cached per word
+        expansion = self.expansions.get(token)
+        if expansion is None:
+            if token in self.postings:
+                expansion = {token : 1.0}
+            else:
+                # valve1 is never a typo of valve2
+                digits = DIGITS_PATTERN.findall(token)
+                expansion = {candidate : SequenceMatcher(None, token, candidate).ratio()
+                             for candidate in get_close_matches(token, self.vocabulary, n=5, cutoff=self.token_cutoff)
+                             if not digits or DIGITS_PATTERN.findall(candidate) == digits}
+            if len(self.expansions) < 4096:
+                self.expansions[token] = expansion
+        return expansion
+
+
+    def _score(self, expansions:List[Dict[str,float]], entry:IntentEntry) -> float:
+        covered = sum(max((expansion.get(token, 0.0) for token in entry.everything), default=0.0) for expansion in expansions) / len(expansions)
+        device  = sum(max(expansion.get(token, 0.0) for expansion in expansions) for token in entry.device) / len(entry.device)
+        return (covered + device) / 2
+
+
+    def _lookup(self, phrase:str, settable:bool) -> Optional[IntentEntry]:
+        query = tokenize(phrase)
+        if not query or not self.entries:
+            return None
+
+        expansions = [self._expand(token) for token in query]
+        # words that are nowhere close to the vocabulary mean the phrase is about something we do not know
+        if not all(expansions):
+            return None
+
+        candidates = {index for expansion in expansions for token in expansion for index in self.postings[token]}
+        scored = sorted(((self._score(expansions, self.entries[index]), self.entries[index]) for index in candidates
+                         if self.entries[index].settable or not settable), key=lambda item: item[0], reverse=True)
+        if not scored or scored[0][0] < self.min_score:
+            return None
+        if len(scored) > 1 and scored[0][0] - scored[1][0] < self.margin and scored[1][1].topic != scored[0][1].topic:
+            return None
+        return scored[0][1]
+
+
+    def match(self, query:str) -> Optional[Tuple[str,Dict[str,Any]]]:
+        text = " ".join(query.strip().lower().split())
+        if not text or COMPLEX_PATTERN.search(text):
+            return None
+
+        command = SET_PATTERN.match(text)
+        if command:
+            if command.group("fr_verb"):
+                state = "ON" if command.group("fr_verb").startswith("allume") else "OFF"
+                phrase = command.group("fr_device")
+            else:
+                states = {group for group in (command.group("before"), command.group("after")) if group}
+                if len(states) != 1:
+                    return None
+                state, phrase = states.pop().upper(), command.group("device")
+            entry = self._lookup(phrase, settable=True)
+            return ("iot_set_states", {"topics" : [entry.topic], "states" : [state]}) if entry else None
+
+        status = STATUS_PATTERN.match(text)
+        if status:
+            entry = self._lookup(status.group("device"), settable=False)
+            return ("iot_get_states", {"topics" : [entry.topic]}) if entry else None
+
+        return None
@@ -0,0 +1,144 @@
+import time
+from bisect import bisect_left
+from collections.abc import Mapping
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class LatencyHistogram:
+    BUCKETS:Tuple[float,...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.counts:List[int] = [0] * (len(self.BUCKETS) + 1) # last slot is +Inf
+        self.count:int        = 0
+        self.total:float      = 0.0
+        self.timeouts:int     = 0
+
+
+    def observe(self, seconds:float):
+        self.counts[bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+
+    def quantile(self, q:float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.BUCKETS[index] if index < len(self.BUCKETS) else float("inf")
+        return float("inf")
+
+
+    def snapshot(self) -> Dict[str,Any]:
+        return {
+                "count"    : self.count,
+                "timeouts" : self.timeouts,
+                "mean"     : self.total / self.count if self.count else None,
+                "p50"      : self.quantile(0.5),
+                "p99"      : self.quantile(0.99),
+                "buckets"  : {str(bound) : count for bound, count in zip(self.BUCKETS + ("+Inf",), self.counts)},
+               }
+
+
+class PendingCommand:
+    __slots__ = ("thing", "topic", "state", "keys", "published_at", "reported", "future")
+
+    def __init__(self, thing:str, topic:str, state:str):
+        self.thing        = thing
+        self.topic        = topic
+        self.state        = state
+        self.keys         = state_keys(topic)
+        self.published_at = time.monotonic()
+        self.reported     = None
+        self.future       = Future()
+
+
+def state_keys(topic:str) -> Tuple[str,...]:
+    # caytu/light/command is echoed as caytu/light/command, caytu/light/state or caytu/light
+    base = topic[:-len("/command")] if topic.endswith("/command") else topic
+    return (topic, f"{base}/state", f"{base}/status", base)
+
+
+class CommandTracker:
+    def __init__(self, max_age:float=60):
+        self.pending:Dict[str,List[PendingCommand]]   = {}
+        self.histograms:Dict[str,LatencyHistogram]    = {}
+        self.max_age:float                            = max_age # a command nobody waits for any more, e.g. to an offline device
+        self.lock:Lock                                = Lock()
+
+
+    def track(self, thing:str, topic:str, state:str) -> PendingCommand:
+        command = PendingCommand(thing=thing, topic=topic, state=state)
+        with self.lock:
+            commands = self.pending.get(thing, [])
+            if commands and command.published_at - commands[0].published_at > self.max_age:
+                commands = [pending for pending in commands if command.published_at - pending.published_at <= self.max_age]
+            commands.append(command)
+            self.pending[thing] = commands
+        return command
+
+
+    def discard(self, command:PendingCommand):
+        with self.lock:
+            commands = self.pending.get(command.thing, [])
+            if command in commands:
+                commands.remove(command)
+
+
+    def on_state(self, thing:str, payload:Any):
+        if not isinstance(payload, Mapping) or not self.pending.get(thing):
+            return
+
+        now = time.monotonic()
+        resolved = []
+        with self.lock:
+            remaining = []
+            for command in self.pending.get(thing, []):
+                key = next((key for key in command.keys if key in payload), None)
+                if key is not None:
+                    command.reported = payload[key]
+                # an echo still carrying the old state means the device has not applied it yet
+                if key is None or str(command.reported).upper() != str(command.state).upper():
+                    remaining.append(command)
+                    continue
+                resolved.append(command)
+            self.pending[thing] = remaining
+
+            histogram = self.histograms.setdefault(thing, LatencyHistogram())
+            for command in resolved:
+                histogram.observe(now - command.published_at)
+
+        for command in resolved:
+            command.future.set_result({
+                                        "state"      : command.reported,
+                                        "confirmed"  : True,
+                                        "latency_ms" : round((now - command.published_at) * 1000, 1)
+                                      })
+
+
+    def expire(self, command:PendingCommand) -> bool:
+        # gives up on an unconfirmed command, counted once as a timeout however many waited for it
+        with self.lock:
+            commands = self.pending.get(command.thing, [])
+            if command not in commands or command.future.done():
+                return False
+            commands.remove(command)
+            self.histograms.setdefault(command.thing, LatencyHistogram()).timeouts += 1
+            return True
+
+
+    def wait(self, command:PendingCommand, timeout:float) -> Dict[str,Any]:
+        try:
+            return command.future.result(timeout=timeout)
+        except FutureTimeout:
+            self.expire(command)
+            return {"state" : command.reported, "confirmed" : False, "status" : f"no confirmation after {timeout}s"}
+
+
+    def latency_stats(self) -> Dict[str,Dict[str,Any]]:
+        with self.lock:
+            return {thing : histogram.snapshot() for thing, histogram in self.histograms.items()}
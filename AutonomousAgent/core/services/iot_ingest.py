@@ -0,0 +1,179 @@
+import json
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from .snapshot import SnapshotMap, ShardedSnapshotMap
+from .memory import deep_size
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+
+DATA   = "data/all"
+TOPICS = "topics"
+SUFFIXES = {DATA : DATA, TOPICS : TOPICS}
+
+
+class SensorReadings(Mapping):
+    # one decoded /data/all payload; the key tuple is shared by every payload with the same keys
+    __slots__ = ("keys_", "values_")
+
+    def __init__(self, keys_:Tuple[str,...], values_):
+        self.keys_   = keys_
+        self.values_ = values_
+
+    def __getitem__(self, key):
+        try:
+            return self.values_[self.keys_.index(key)]
+        except ValueError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.keys_
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+    def __len__(self):
+        return len(self.keys_)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class KeySchemas:
+    def __init__(self):
+        self.schemas:Dict[Tuple[str,...],list] = {} # keys -> [shared keys, all values floats so far]
+
+    def pack(self, payload:Dict[str,Any]) -> SensorReadings:
+        keys_ = tuple(payload)
+        schema = self.schemas.get(keys_)
+        if schema is None:
+            schema = self.schemas[keys_] = [keys_, True]
+
+        values = payload.values()
+        if schema[1]:
+            # only real floats, array("d") would turn true into 1.0 and 3 into 3.0 and the model and the command
+            # echoes would see other values than the device sent
+            if all(type(value) is float for value in values):
+                return SensorReadings(schema[0], array("d", values)) # 8 bytes each instead of a boxed float
+            schema[1] = False # ints, booleans or strings in this payload shape, stop trying
+        return SensorReadings(schema[0], tuple(values))
+
+
+def _changed(previous, readings) -> bool:
+    if isinstance(previous, SensorReadings) and isinstance(readings, SensorReadings):
+        return previous.keys_ is not readings.keys_ or previous.values_ != readings.values_
+    return previous != readings
+
+
+class MessageIngest:
+    def __init__(self, thing_names:List[str], on_state:Optional[Callable[[str, SensorReadings], None]]=None, shards:int=1):
+        # written by the MQTT thread only, the other threads read them through snapshot(); large fleets partition them
+        state = (lambda: ShardedSnapshotMap(shards)) if shards > 1 else SnapshotMap
+        self.sensors_data:SnapshotMap     = state() # thing -> SensorReadings
+        self.feature_topics:SnapshotMap   = state() # thing -> announced topics
+        self.iot_thing_topics:SnapshotMap = state() # thing -> flat list of its topics
+        self.owners:Dict[str,Tuple[str,...]] = {} # topic -> things announcing it, a command finds its things without a scan
+        self.things:set         = set()
+
+        self.topics_version:int = 0 # bumped whenever a thing announces its topics
+        self.state_version:int  = 0 # bumped whenever a reading of any thing changes value
+        self.on_state = on_state
+        self.schemas:KeySchemas = KeySchemas()
+        self.routes:Dict[str,Optional[Tuple[str,str]]] = {}
+        for thing in thing_names:
+            self.add_thing(thing)
+
+
+    def add_thing(self, thing:str):
+        self.things.add(thing)
+        self.routes[f"{thing}/{DATA}"]   = (thing, DATA)
+        self.routes[f"{thing}/{TOPICS}"] = (thing, TOPICS)
+
+
+    def _resolve(self, topic:str) -> Optional[Tuple[str,str]]:
+        thing, _, suffix = topic.partition("/")
+        if thing not in self.things:
+            return None # a wildcard subscription also delivers things of other agents, they must not grow the table
+        kind = SUFFIXES.get(suffix)
+        route = (thing, kind) if kind else None
+        self.routes[topic] = route # cache misses too, a topic is only split once
+        return route
+
+
+    def ingest(self, topic:str, payload) -> bool:
+        route = self.routes[topic] if topic in self.routes else self._resolve(topic)
+        if route is None:
+            return False
+
+        thing, kind = route
+        msg = loads(payload)
+        if kind == DATA:
+            readings = self.schemas.pack(msg) if isinstance(msg, dict) else msg
+            if _changed(self.sensors_data.get(thing), readings):
+                self.state_version += 1
+            self.sensors_data[thing] = readings
+            if self.on_state:
+                self.on_state(thing, readings)
+        else:
+            self._announce(thing, msg)
+        return True
+
+
+    def _announce(self, thing:str, topics:Dict[str,List[str]]):
+        previous = self.iot_thing_topics.get(thing, [])
+        flat = [topic for subtopics in topics.values() for topic in subtopics]
+        self.feature_topics[thing]   = topics
+        self.iot_thing_topics[thing] = flat
+        for topic in set(previous) - set(flat):
+            self.owners[topic] = tuple(owner for owner in self.owners.get(topic, ()) if owner != thing)
+            if not self.owners[topic]:
+                del self.owners[topic]
+        for topic in flat:
+            owners = self.owners.get(topic, ())
+            if thing not in owners:
+                self.owners[topic] = owners + (thing,) # replaced, never modified, readers need no lock
+        self.topics_version += 1
+
+
+    def owners_of(self, topic:str) -> Tuple[str,...]:
+        return self.owners.get(topic, ())
+
+
+    def dump(self) -> Dict[str,Any]:
+        sensors = self.sensors_data.snapshot().data
+        return {
+                "topics"  : self.feature_topics.snapshot().data,
+                "sensors" : {thing : dict(readings) if isinstance(readings, Mapping) else readings for thing, readings in sensors.items()},
+               }
+
+
+    def restore(self, state:Dict[str,Any]) -> int:
+        # topics and last readings of the previous run, for the things still configured; a thing that already
+        # reported live keeps its live state, the others are replaced by their first message
+        restored = 0
+        for thing, topics in state.get("topics", {}).items():
+            if thing in self.things and thing not in self.feature_topics:
+                self._announce(thing, topics)
+                restored += 1
+        for thing, readings in state.get("sensors", {}).items():
+            if thing in self.things and thing not in self.sensors_data:
+                self.sensors_data[thing] = self.schemas.pack(readings) if isinstance(readings, dict) else readings
+        return restored
+
+
+    def memory_usage(self) -> Dict[str,Any]:
+        # measured on the snapshots, the MQTT thread keeps writing meanwhile
+        sensors = self.sensors_data.snapshot().data
+        return {
+                "things"        : len(sensors),
+                "sensors_bytes" : deep_size(sensors),
+                "topics_bytes"  : deep_size(self.feature_topics.snapshot().data) + deep_size(self.iot_thing_topics.snapshot().data),
+                "routes"        : len(self.routes),
+                "schemas"       : len(self.schemas.schemas),
+               }
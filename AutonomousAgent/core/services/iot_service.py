@@ -1,9 +1,17 @@
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 import json 
-import subprocess 
 import time 
-from threading import Thread, Lock
-from typing import Dict, Any,List
+import hashlib
+import os
+from threading import Lock
+from typing import Dict, Any,List, Optional, Callable
+
+from .iot_commands import CommandTracker, PendingCommand
+from .iot_ingest import MessageIngest
+from .snapshot import SnapshotMap
+from .iot_transport import AWSTransport
+from .scheduler import Scheduler
+from .telemetry import telemetry
+from ...interfaces.transport_interface import TransportInterface
 
 
 class IoT:
@@ -13,6 +21,11 @@ class IoT:
                   iot_root_cacert_path:str,
                   iot_device_cert_path:str,
                   iot_private_key_path:str,
+                  transport_factory:Optional[Callable[[str], TransportInterface]] = None,
+                  scheduler:Optional[Scheduler] = None,
+                  subscription:str = "per_thing",
+                  shards:int = 1,
+                  subscribe_batch:int = 8,
                ):
         
         self._iot_endpoint:str         = iot_endpoint
@@ -20,44 +33,80 @@ class IoT:
         self._aws_root_ca_path:str     = iot_root_cacert_path
         self._aws_device_cert_path:str = iot_device_cert_path
         self._aws_private_key_path:str = iot_private_key_path 
+        self._transport_factory:Callable[[str], TransportInterface] = transport_factory or self._aws_transport
+        self.aws_client:TransportInterface = None
+        self.scheduler:Scheduler           = scheduler or Scheduler(workers=2)
+        # "wildcard" subscribes +/data/all and +/topics once for the whole fleet instead of two topics per thing;
+        # AWS IoT Core caps subscriptions per connection, large fleets need it, and the policy has to allow the wildcards
+        if subscription not in ("per_thing", "wildcard"):
+            raise ValueError(f"subscription must be 'per_thing' or 'wildcard', got {subscription}")
+        self.subscription:str              = subscription
+        self.subscribe_batch:int           = max(1, subscribe_batch) # topics per request, AWS IoT Core takes 8 at most
         
-        self.sensors_data:Dict[str:Any]     = {}
-        self.feature_topics:Dict[str:Any]   = {}
-        self.iot_thing_topics:Dict[str:Any] = {}   
+        self.command_tracker:CommandTracker = CommandTracker()
+        self.state_listeners:List[Callable] = [self.command_tracker.on_state]
+        self.ingest:MessageIngest           = MessageIngest(thing_names=iot_thing_names, on_state=self._on_state, shards=shards)
+        self.sensors_data:SnapshotMap       = self.ingest.sensors_data
+        self.feature_topics:SnapshotMap     = self.ingest.feature_topics
+        self.iot_thing_topics:SnapshotMap   = self.ingest.iot_thing_topics   
 
         self.iot_status:bool                = False
         self.aws_client_status:bool         = False 
         self.stop:bool                      = False 
         self.timer:float                    = time.time()
         self.timer_lock = Lock()
+        self.setup_delay:float              = 3.0 # seconds before the next connection attempt, doubles up to max_setup_delay
+        self.max_setup_delay:float          = 60.0
            
         self.context:Dict[str:Any] = {"function" : "control IoT devices, check their status, do recommendation,"}
 
-        Thread(target=self._setup).start()           
-        Thread(target=self._update_system_status).start()  
+        self.scheduler.once("iot.setup", self._setup, dedicated=True)
+        self.scheduler.every("iot.status", self._update_system_status, interval=4)
+
+
+    def _aws_transport(self, client_id:str) -> TransportInterface:
+        return AWSTransport(client_id        = client_id,
+                            endpoint         = self._iot_endpoint,
+                            root_ca_path     = self._aws_root_ca_path,
+                            private_key_path = self._aws_private_key_path,
+                            device_cert_path = self._aws_device_cert_path
+                            )
+
+
+    def _client_id(self) -> str:
+        # the same on every reconnect of the process so the broker resumes its persistent session, and short whatever
+        # the fleet size, MQTT brokers cap client ids (128 bytes on AWS IoT); the pid keeps two processes apart
+        fleet = hashlib.sha256("\0".join(sorted(self._iot_thing_names)).encode()).hexdigest()[:16]
+        return f"Iot_Action_client_{fleet}_{os.getpid()}"
 
 
-    def _check_internet(self):
+    def _topics(self) -> List[str]:
+        if self.subscription == "wildcard":
+            return ["+/data/all", "+/topics"]
+        return [topic for iot_thing_name in self._iot_thing_names for topic in (f"{iot_thing_name}/data/all", f"{iot_thing_name}/topics")]
+
+
+    def _subscribe_all(self) -> bool:
+        # batch_size topics per request, on setup and after every reconnect
+        topics = self._topics()
         try:
-            subprocess.check_output(["ping", "-c", "1", "8.8.8.8"])   
+            for start in range(0, len(topics), self.subscribe_batch):
+                if not self.aws_client_status:
+                    return False
+                self.aws_client.subscribe_many(topics[start:start + self.subscribe_batch], 1, self._aws_call_back)
             return True
-        except : 
+        except Exception as e:
             return False
 
 
     def _setup_aws_client(self):
 
-        while (not self._check_internet()):
-            time.sleep(3)
-
         try : 
-            self.aws_client = AWSIoTMQTTClient(f"Iot_Action_client{'_'.join(self._iot_thing_names)}_{time.time()}") 
-            self.aws_client.configureEndpoint(self._iot_endpoint, 8883)
-            self.aws_client.configureCredentials(self._aws_root_ca_path, self._aws_private_key_path, self._aws_device_cert_path)
-            self.aws_client.configureOfflinePublishQueueing(-1)  
-            self.aws_client.configureDrainingFrequency(2)  
-            self.aws_client.configureConnectDisconnectTimeout(10)  
-            self.aws_client.configureMQTTOperationTimeout(5)  
+            self.aws_client = self._transport_factory(self._client_id()) 
+
+            if not self.aws_client.network_available():
+                return
+
             self.aws_client.onOffline = self._aws_on_offline
             self.aws_client.onOnline  = self._aws_online
             self.aws_client.connect() 
@@ -74,13 +123,10 @@ class IoT:
 
     def _clean_aws_client(self):
         try: 
-            while not self._check_internet():
-                time.sleep(3)
-
             if self.aws_client_status :
-                for iot_thing_name in self._iot_thing_names:
-                    self.aws_client.unsubscribe(f"{iot_thing_name}/topics")
-                    self.aws_client.unsubscribe(f"{iot_thing_name}/all/data")
+                topics = self._topics()
+                for start in range(0, len(topics), self.subscribe_batch):
+                    self.aws_client.unsubscribe_many(topics[start:start + self.subscribe_batch])
                 self.aws_client.disconnect()
 
         except Exception as e:
@@ -92,6 +138,7 @@ class IoT:
 
     def _stop_controller(self):
         self.stop = True 
+        self.scheduler.cancel("iot.status")
         try: 
             self._clean_aws_client()
             quit()
@@ -99,14 +146,10 @@ class IoT:
             pass 
          
 
-    def _reconnect_to_aws(self):
+    def _reconnect_to_aws(self, delay:float=0):
+        # never loops on the caller's thread, the transport's callbacks and the scheduler's workers have other work
         self._clean_aws_client()
-        while not self.aws_client_status:
-            self._setup_aws_client()
-        
-        for iot_thing_name in self._iot_thing_names:
-            self._subscribe_on_aws(self.aws_client,f"{iot_thing_name}/data/all")
-            self._subscribe_on_aws(self.aws_client,f"{iot_thing_name}/topics")
+        self.scheduler.once("iot.setup", self._setup, delay=delay, dedicated=True)
 
 
     def _aws_online(self):
@@ -128,75 +171,107 @@ class IoT:
         if (self.aws_client_status):
             try:
                 client.publish(topic = topic, payload = payload, QoS = QoS)
+                return True
             except Exception as e : 
                 pass 
+        return False
 
 
     def _aws_call_back(self, client, userdata,message):
-
-        with self.timer_lock: 
-            self.timer = time.time()
+        # runs on the MQTT network thread, keep it short: one lookup, one parse
+        self.timer = time.time()
 
         try:
-        
-            if message.topic.split(("/"))[-1] == "topics":
-                topics = list(json.loads(message.payload).values())
-                self.iot_thing_topics[message.topic.split("/")[0]] = [topic for subtopics in topics for topic in subtopics ] 
-
-            self._update_states(msg=json.loads(message.payload) , topic=message.topic) 
-
+            with telemetry.span("mqtt.ingest"):
+                self.ingest.ingest(message.topic, message.payload)
         except Exception as e :
             print(f"Exception {e}")
-            
 
-    def _update_states(self,msg, topic):
-        if (topic == f"{topic.split('/')[0]}/data/all"): 
-            self.sensors_data[topic.split('/')[0]] = msg
-  
-        elif (topic == f"{topic.split('/')[0]}/topics"):
-            self.feature_topics[topic.split('/')[0]] = msg
-    
-        else:
-            pass 
+
+    def _on_state(self, thing:str, readings):
+        for listener in self.state_listeners:
+            listener(thing, readings)
+
+
+    def add_state_listener(self, listener:Callable[[str, Any], None]):
+        self.state_listeners.append(listener)
 
 
     def get_state(self, topic):
+       # topics start with their thing name, the scan is only for the ones that do not
+       thing = topic.split("/", 1)[0]
+       if thing in self.ingest.things:
+            readings = self.sensors_data.get(thing)
+            return readings[topic] if readings is not None and topic in readings else None
+
        for thing in self._iot_thing_names : 
-            if topic in self.sensors_data[thing] : 
-                return self.sensors_data[thing][topic] 
+            readings = self.sensors_data.get(thing) # a thing that never reported has no readings yet
+            if readings is not None and topic in readings : 
+                return readings[topic] 
  
        return None 
 
 
+    def send_command(self, topic:str, state:str, track:bool=True) -> List[PendingCommand]:
+        # track: the commands wait for the state echo, whoever sends one must wait_command or discard it
+        msg = {
+                "type" : "CMD", 
+                "topic_names" : [topic],
+                "states" : [state]
+              }
+        msg = json.dumps(msg)
+        commands = []
+        for iot_thing_name in self.ingest.owners_of(topic): # the things that announced the topic, no scan of the fleet
+            if track:
+                command = self.command_tracker.track(thing=iot_thing_name, topic=topic, state=state)
+            else:
+                command = PendingCommand(thing=iot_thing_name, topic=topic, state=state)
+            published = self._publish_on_aws(client  = self.aws_client,
+                                              topic   = f"{iot_thing_name}/sub", 
+                                              payload = msg, 
+                                              QoS     = 0
+                                              )
+            if published:
+                commands.append(command)
+            elif track:
+                self.command_tracker.discard(command)
+        return commands
+
+
+    def wait_command(self, commands:List[PendingCommand], timeout:float) -> Dict[str,Any]:
+        if not commands:
+            return {"state" : None, "confirmed" : False, "status" : "Failed"}
+
+        deadline = time.monotonic() + timeout
+        results = [self.command_tracker.wait(command, max(0.0, deadline - time.monotonic())) for command in commands]
+        return next((result for result in results if result["confirmed"]), results[0])
+
+
+    def expire_commands(self, commands:List[PendingCommand], timeout:float):
+        # for commands nobody blocks on: the echo still confirms them, those without one are dropped after timeout
+        if commands:
+            self.scheduler.once(f"iot.expire.{id(commands[0])}", lambda: [self.command_tracker.expire(command) for command in commands],
+                                delay=timeout)
+
+
     def set_state(self,topic:str, state:str):
         try :
-            msg = {
-                    "type" : "CMD", 
-                    "topic_names" : [topic],
-                    "states" : [state]
-                  }
-            msg = json.dumps(msg)
-            check = False 
-            for iot_thing_name in self._iot_thing_names: 
-                if topic in self.iot_thing_topics[iot_thing_name] :
-                    self._publish_on_aws(client  = self.aws_client,
-                                        topic   = f"{iot_thing_name}/sub", 
-                                        payload = msg, 
-                                        QoS     = 0
-                                        )
-                    check=True 
-            return "Done" if  check else "Failed"
+            return "Done" if self.send_command(topic=topic, state=state, track=False) else "Failed" # fire and forget, nothing waits for the echo
         except Exception as e:
             return "Failed"
+
+
+    def get_command_latency(self) -> Dict[str,Dict[str,Any]]:
+        return self.command_tracker.latency_stats()
         
 
     def _update_system_status(self):
-        while True : 
+        if self.stop :
+            self.scheduler.cancel("iot.status")
+            return
 
-            with self.timer_lock : 
-                self.iot_status = True if ((time.time() - self.timer) <= 5 ) else False
-
-            time.sleep(4)
+        with self.timer_lock : 
+            self.iot_status = True if ((time.time() - self.timer) <= 5 ) else False
 
 
     def get_iot_status(self):
@@ -207,13 +282,36 @@ class IoT:
         return status
     
     def get_all_data(self):
-        return self.sensors_data
+        # consistent across things and never modified afterwards, safe to iterate or serialise from any thread
+        return self.sensors_data.snapshot().data
+
+
+    def get_feature_topics(self):
+        return self.feature_topics.snapshot().data
+
+
+    def memory_usage(self) -> Dict[str,Any]:
+        return self.ingest.memory_usage()
+
+
+    def wait_topics(self, timeout:float) -> bool:
+        # until every thing announced its topics, restored ones included
+        deadline = time.time() + timeout
+        while len(self.feature_topics) < len(self._iot_thing_names):
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
 
 
     def _setup(self): 
+        # one attempt, an unreachable broker is tried again later as a new one-shot task
+        if self.stop:
+            return
         self._setup_aws_client() 
-
-        for iot_thing_name in self._iot_thing_names:
-            self._subscribe_on_aws(self.aws_client,f"{iot_thing_name}/data/all")
-            self._subscribe_on_aws(self.aws_client,f"{iot_thing_name}/topics")   
+        if self.aws_client_status and self._subscribe_all():
+            self.setup_delay = 3.0
+        else:
+            self._reconnect_to_aws(delay=self.setup_delay)
+            self.setup_delay = min(self.max_setup_delay, self.setup_delay * 2)   
 
@@ -0,0 +1,205 @@
+import subprocess
+import time
+from queue import Queue
+from threading import Thread, Lock, Event
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from ...interfaces.transport_interface import TransportInterface
+
+
+class AWSTransport(TransportInterface):
+    def __init__(self, client_id:str, endpoint:str, root_ca_path:str, private_key_path:str, device_cert_path:str):
+        from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+
+        self.client = AWSIoTMQTTClient(client_id)
+        self.client.configureEndpoint(endpoint, 8883)
+        self.client.configureCredentials(root_ca_path, private_key_path, device_cert_path)
+        self.client.configureOfflinePublishQueueing(-1)
+        self.client.configureDrainingFrequency(2)
+        self.client.configureConnectDisconnectTimeout(10)
+        self.client.configureMQTTOperationTimeout(5)
+        self.client.onOffline = lambda: self.onOffline and self.onOffline()
+        self.client.onOnline  = lambda: self.onOnline and self.onOnline()
+
+
+    def network_available(self) -> bool:
+        try:
+            subprocess.check_output(["ping", "-c", "1", "8.8.8.8"])
+            return True
+        except :
+            return False
+
+    def connect(self) -> bool:
+        return self.client.connect()
+
+    def disconnect(self) -> bool:
+        return self.client.disconnect()
+
+    def subscribe(self, topic:str, QoS:int, callback:Callable) -> bool:
+        return self.client.subscribe(topic, QoS, callback)
+
+    def subscribe_many(self, topics:List[str], QoS:int, callback:Callable, timeout:float=10) -> bool:
+        # the SDK has no multi topic SUBSCRIBE, the requests are pipelined instead: all sent, then the acks awaited together
+        if not topics:
+            return True
+        done, lock, remaining = Event(), Lock(), [len(topics)]
+        def acked(mid, data):
+            with lock:
+                remaining[0] -= 1
+                if not remaining[0]:
+                    done.set()
+        for topic in topics:
+            self.client.subscribeAsync(topic, QoS, ackCallback=acked, messageCallback=callback)
+        return done.wait(timeout)
+
+    def unsubscribe(self, topic:str) -> bool:
+        return self.client.unsubscribe(topic)
+
+    def publish(self, topic:str, payload, QoS:int) -> bool:
+        return self.client.publish(topic=topic, payload=payload, QoS=QoS)
+
+
+class BrokerMessage:
+    __slots__ = ("topic", "payload", "qos")
+
+    def __init__(self, topic:str, payload, qos:int=0):
+        self.topic   = topic
+        self.payload = payload
+        self.qos     = qos
+
+
+def topic_matches(topic_filter:str, topic:str) -> bool:
+    filter_levels, topic_levels = topic_filter.split("/"), topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels) or (level != "+" and level != topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class FakeBroker:
+    # in-process stand-in for AWS IoT Core; one dispatcher thread plays the MQTT network thread
+    def __init__(self, round_trip:float=0):
+        self.round_trip:float = round_trip # seconds per SUBSCRIBE/UNSUBSCRIBE request, the network of a real broker
+        self.exact:Dict[str,List[Tuple["InProcessTransport",Callable]]]    = {}
+        self.wildcard:Dict[str,List[Tuple["InProcessTransport",Callable]]] = {}
+        self.lock:Lock    = Lock()
+        self.queue:Queue  = Queue()
+        self.published:int = 0
+        self.delivered:int = 0
+        self.online:bool   = True
+        Thread(target=self._dispatch, daemon=True).start()
+
+
+    def client(self, client_id:str) -> "InProcessTransport":
+        return InProcessTransport(broker=self, client_id=client_id)
+
+
+    def _subscribe(self, transport:"InProcessTransport", topic_filters:List[str], callback:Callable):
+        if self.round_trip:
+            time.sleep(self.round_trip) # one request, however many topics it carries
+        with self.lock:
+            for topic_filter in topic_filters:
+                table = self.wildcard if ("+" in topic_filter or "#" in topic_filter) else self.exact
+                subscribers = [entry for entry in table.get(topic_filter, []) if entry[0] is not transport]
+                table[topic_filter] = subscribers + [(transport, callback)]
+
+
+    def _unsubscribe(self, transport:"InProcessTransport", topic_filters:Optional[List[str]]=None):
+        # every subscription of the transport when topic_filters is None, a disconnect
+        with self.lock:
+            for table in (self.exact, self.wildcard):
+                for key in list(table) if topic_filters is None else topic_filters:
+                    if key in table:
+                        table[key] = [entry for entry in table[key] if entry[0] is not transport]
+                        if not table[key]:
+                            del table[key]
+
+
+    def subscriber_count(self) -> int:
+        with self.lock:
+            return sum(len(entries) for entries in self.exact.values()) + sum(len(entries) for entries in self.wildcard.values())
+
+
+    def publish(self, topic:str, payload, qos:int=0):
+        self.published += 1
+        self.queue.put(BrokerMessage(topic, payload, qos))
+
+
+    def _dispatch(self):
+        while True:
+            message = self.queue.get()
+            with self.lock:
+                targets = list(self.exact.get(message.topic, ()))
+                for topic_filter, entries in self.wildcard.items():
+                    if topic_matches(topic_filter, message.topic):
+                        targets.extend(entries)
+
+            for transport, callback in targets:
+                if transport.connected:
+                    try:
+                        callback(transport, None, message)
+                    except Exception as e:
+                        print(f"Exception {e}")
+            self.delivered += 1
+            self.queue.task_done()
+
+
+    def flush(self):
+        self.queue.join()
+
+
+    def drop(self, transport:"InProcessTransport"):
+        # simulate a network failure for one client
+        transport.connected = False
+        self._unsubscribe(transport)
+        if transport.onOffline:
+            transport.onOffline()
+
+
+class InProcessTransport(TransportInterface):
+    def __init__(self, broker:FakeBroker, client_id:str):
+        self.broker:FakeBroker = broker
+        self.client_id:str     = client_id
+        self.connected:bool    = False
+
+    def network_available(self) -> bool:
+        return self.broker.online
+
+    def connect(self) -> bool:
+        if not self.broker.online:
+            raise ConnectionError("broker offline")
+        self.connected = True
+        if self.onOnline:
+            self.onOnline()
+        return True
+
+    def disconnect(self) -> bool:
+        self.connected = False
+        self.broker._unsubscribe(self)
+        return True
+
+    def subscribe(self, topic:str, QoS:int, callback:Callable) -> bool:
+        return self.subscribe_many([topic], QoS, callback)
+
+    def subscribe_many(self, topics:List[str], QoS:int, callback:Callable) -> bool:
+        if not self.connected:
+            raise ConnectionError("not connected")
+        self.broker._subscribe(self, topics, callback)
+        return True
+
+    def unsubscribe(self, topic:str) -> bool:
+        return self.unsubscribe_many([topic])
+
+    def unsubscribe_many(self, topics:List[str]) -> bool:
+        if self.broker.round_trip:
+            time.sleep(self.broker.round_trip)
+        self.broker._unsubscribe(self, topics)
+        return True
+
+    def publish(self, topic:str, payload, QoS:int) -> bool:
+        if not self.connected:
+            raise ConnectionError("not connected")
+        self.broker.publish(topic, payload, QoS)
+        return True
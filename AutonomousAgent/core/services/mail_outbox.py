@@ -0,0 +1,171 @@
+import random
+import sqlite3
+import time
+import uuid
+from threading import Thread, Lock, Event
+from typing import Dict, Any, List, Optional, Callable
+
+
+class MailOutbox:
+    def __init__(self, sender:Callable[[List[Dict[str,str]]], Dict[str,Any]], path:str="mail_outbox.db",
+                 batch_size:int=20, max_attempts:int=5, base_backoff:float=5, max_backoff:float=600):
+
+        self.sender:Callable       = sender
+        self.path:str              = path
+        self.batch_size:int        = batch_size
+        self.max_attempts:int      = max_attempts
+        self.base_backoff:float    = base_backoff
+        self.max_backoff:float     = max_backoff
+
+        self.lock:Lock             = Lock()
+        self.wakeup:Event          = Event()
+        self.stop:bool             = False
+        self.scheduler             = None
+        self.connection            = sqlite3.connect(path, check_same_thread=False)
+        self._create_schema()
+
+
+    def _create_schema(self):
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id           TEXT PRIMARY KEY,
+                    to_address   TEXT,
+                    subject      TEXT,
+                    body         TEXT,
+                    status       TEXT,
+                    attempts     INTEGER DEFAULT 0,
+                    next_attempt REAL,
+                    last_error   TEXT,
+                    created_at   REAL,
+                    sent_at      REAL
+                );
+                CREATE INDEX IF NOT EXISTS outbox_due ON outbox(status, next_attempt);
+            """)
+            # a send interrupted by a crash or restart goes back to the queue
+            self.connection.execute("UPDATE outbox SET status = 'queued' WHERE status = 'sending'")
+
+
+    def start(self, scheduler=None):
+        # on a shared scheduler the outbox is a task woken up by enqueue instead of its own thread
+        if scheduler is None:
+            Thread(target=self._worker, daemon=True).start()
+            return
+        self.scheduler = scheduler
+        scheduler.every("mail.outbox", self._drain_all, interval=5, min_interval=5, max_interval=60)
+
+
+    def enqueue(self, to:str, subject:str, body:str) -> str:
+        mail_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO outbox(id, to_address, subject, body, status, next_attempt, created_at) VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (mail_id, to, subject, body, now, now)
+            )
+        self.wakeup.set()
+        if self.scheduler:
+            self.scheduler.trigger("mail.outbox")
+        return mail_id
+
+
+    def status(self, mail_id:str) -> Optional[Dict[str,Any]]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT id, to_address, subject, status, attempts, last_error, created_at, sent_at FROM outbox WHERE id = ?", (mail_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        keys = ("id", "to", "subject", "status", "attempts", "last_error", "created_at", "sent_at")
+        return dict(zip(keys, row))
+
+
+    def pending(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('queued', 'sending')").fetchone()[0]
+
+
+    def _claim_due(self) -> List[Dict[str,str]]:
+        with self.lock, self.connection:
+            rows = self.connection.execute(
+                "SELECT id, to_address, subject, body, attempts FROM outbox WHERE status = 'queued' AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                (time.time(), self.batch_size)
+            ).fetchall()
+            self.connection.executemany("UPDATE outbox SET status = 'sending' WHERE id = ?", [(row[0],) for row in rows])
+        return [{"id" : row[0], "to" : row[1], "subject" : row[2], "body" : row[3], "attempts" : row[4]} for row in rows]
+
+
+    def _next_wait(self) -> float:
+        with self.lock:
+            row = self.connection.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'queued'").fetchone()
+        if row[0] is None:
+            return 60
+        return max(0.0, row[0] - time.time())
+
+
+    def _transient(self, error:Any) -> bool:
+        # throttling (429, the rateLimitExceeded 403s), server errors and anything without a status (network) are worth
+        # another try; any other HTTP error (bad recipient, 400, 403) fails the same way again
+        status = getattr(error, "status_code", None) or getattr(getattr(error, "resp", None), "status", None)
+        if status is None:
+            return True
+        status = int(status)
+        return status == 429 or status >= 500 or (status == 403 and "ratelimitexceeded" in str(error).lower())
+
+
+    def _record(self, batch:List[Dict[str,Any]], errors:Dict[str,Any]):
+        # errors: mail id -> None when sent, the exception or a message otherwise
+        now = time.time()
+        updates_sent, updates_retry, updates_failed = [], [], []
+        for mail in batch:
+            error = errors.get(mail["id"], "no result from sender")
+            if error is None:
+                updates_sent.append((now, mail["id"]))
+                continue
+
+            attempts = mail["attempts"] + 1
+            if attempts >= self.max_attempts or not self._transient(error):
+                updates_failed.append((attempts, str(error), mail["id"]))
+            else:
+                delay = min(self.base_backoff * 2 ** attempts, self.max_backoff) * random.uniform(0.5, 1.0)
+                updates_retry.append((attempts, now + delay, str(error), mail["id"]))
+
+        with self.lock, self.connection:
+            self.connection.executemany("UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?", updates_sent)
+            self.connection.executemany("UPDATE outbox SET status = 'queued', attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?", updates_retry)
+            self.connection.executemany("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?", updates_failed)
+
+
+    def drain(self) -> int:
+        batch = self._claim_due()
+        if not batch:
+            return 0
+
+        try:
+            errors = self.sender([{"id" : mail["id"], "to" : mail["to"], "subject" : mail["subject"], "body" : mail["body"]} for mail in batch])
+        except Exception as e:
+            errors = {mail["id"] : e for mail in batch}
+
+        self._record(batch, errors)
+        return len(batch)
+
+
+    def _drain_all(self) -> bool:
+        # a scheduler task: True when mails went out, False otherwise
+        if self.stop:
+            return False
+        sent = 0
+        while True:
+            count = self.drain()
+            if not count:
+                return sent > 0
+            sent += count
+
+
+    def _worker(self):
+        while not self.stop:
+            self.wakeup.clear()
+            if self.drain():
+                continue
+            self.wakeup.wait(timeout=self._next_wait())
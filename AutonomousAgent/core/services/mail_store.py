@@ -0,0 +1,138 @@
+import os
+import sqlite3
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Any, List, Optional, Iterable
+
+
+class MailStore:
+    def __init__(self, path:str="mail_store.db", cache_kib:Optional[int]=None):
+        self.path:str  = path
+        self.lock:Lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        if cache_kib is not None:
+            # the page cache is the only memory the store holds, the mails themselves stay on disk
+            self.connection.execute(f"PRAGMA cache_size = -{int(cache_kib)}")
+        self._create_schema()
+
+
+    def _create_schema(self):
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS mails (
+                    id          TEXT PRIMARY KEY,
+                    thread_id   TEXT,
+                    sender      TEXT,
+                    subject     TEXT,
+                    body        TEXT,
+                    received_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS mails_received_at ON mails(received_at);
+
+                CREATE VIRTUAL TABLE IF NOT EXISTS mails_fts USING fts5(
+                    sender, subject, body, content='mails', content_rowid='rowid'
+                );
+
+                CREATE TRIGGER IF NOT EXISTS mails_ai AFTER INSERT ON mails BEGIN
+                    INSERT INTO mails_fts(rowid, sender, subject, body) VALUES (new.rowid, new.sender, new.subject, new.body);
+                END;
+                CREATE TRIGGER IF NOT EXISTS mails_ad AFTER DELETE ON mails BEGIN
+                    INSERT INTO mails_fts(mails_fts, rowid, sender, subject, body) VALUES ('delete', old.rowid, old.sender, old.subject, old.body);
+                END;
+            """)
+
+
+    def known_ids(self, ids:Iterable[str]) -> set:
+        ids = list(ids)
+        known = set()
+        with self.lock:
+            for start in range(0, len(ids), 500): # stay under the sqlite variable limit
+                chunk = ids[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT id FROM mails WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                known.update(row[0] for row in rows)
+        return known
+
+
+    def add(self, mails:List[Dict[str,Any]]) -> int:
+        rows = [(mail["id"], mail.get("thread_id"), mail["From"], mail["suject"], mail["Body"], mail.get("received_at")) for mail in mails]
+        with self.lock, self.connection:
+            cursor = self.connection.executemany(
+                "INSERT OR IGNORE INTO mails(id, thread_id, sender, subject, body, received_at) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            return cursor.rowcount
+
+
+    def count(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM mails").fetchone()[0]
+
+
+    def _to_mail(self, row) -> Dict[str,Any]:
+        mail_id, sender, subject, body, received_at = row
+        return {
+                "Id"     : mail_id,
+                "Date"   : datetime.fromtimestamp(received_at).isoformat(sep=' ', timespec='seconds') if received_at else None,
+                "From"   : sender,
+                "suject" : subject,
+                "Body"   : body
+               }
+
+
+    def recent(self, limit:int=5, offset:int=0) -> Dict[int,Dict[str,Any]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, sender, subject, body, received_at FROM mails ORDER BY received_at DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return {offset + index : self._to_mail(row) for index, row in enumerate(rows)}
+
+
+    def _parse_since(self, since:Optional[str]) -> Optional[float]:
+        if not since:
+            return None
+        for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+            try:
+                return datetime.strptime(since, fmt).timestamp()
+            except ValueError:
+                continue
+        raise ValueError(f"Invalid since date '{since}', expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+
+    def _match_expression(self, query:str) -> str:
+        # quote every term so user text can not inject FTS5 operators
+        return " ".join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+
+    def search(self, query:Optional[str]=None, since:Optional[str]=None, limit:int=10) -> List[Dict[str,Any]]:
+        received_after = self._parse_since(since)
+        with self.lock:
+            if query and query.strip():
+                sql = """SELECT m.id, m.sender, m.subject, m.body, m.received_at
+                         FROM mails_fts JOIN mails m ON m.rowid = mails_fts.rowid
+                         WHERE mails_fts MATCH ? AND (? IS NULL OR m.received_at >= ?)
+                         ORDER BY bm25(mails_fts) LIMIT ?"""
+                rows = self.connection.execute(sql, (self._match_expression(query), received_after, received_after, limit)).fetchall()
+            else:
+                sql = """SELECT id, sender, subject, body, received_at FROM mails
+                         WHERE (? IS NULL OR received_at >= ?)
+                         ORDER BY received_at DESC LIMIT ?"""
+                rows = self.connection.execute(sql, (received_after, received_after, limit)).fetchall()
+        return [self._to_mail(row) for row in rows]
+
+
+    def memory_usage(self) -> Dict[str,Any]:
+        with self.lock:
+            mails = self.connection.execute("SELECT COUNT(*) FROM mails").fetchone()[0]
+            cache = self.connection.execute("PRAGMA cache_size").fetchone()[0]
+            page_size = self.connection.execute("PRAGMA page_size").fetchone()[0]
+        return {
+                "mails"           : mails,
+                "cache_max_bytes" : -cache * 1024 if cache < 0 else cache * page_size,
+                "disk_bytes"      : os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+               }
+
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,99 @@
+import os
+import sys
+import tracemalloc
+from collections import deque
+from threading import Lock
+from typing import Dict, Any, List, Optional
+
+
+# estimates of what the in memory stores hold, and the tracemalloc view taken on demand; see Handler.memory_usage
+
+
+_LEAVES = (str, bytes, bytearray, int, float, bool, complex, type(None))
+
+
+def deep_size(value:Any) -> int:
+    # bytes held by a value and everything it references, each object counted once; good for plain data
+    # (dicts, lists, tuples, strings, slotted records), a service object should report its stores itself
+    seen, pending, total = set(), [value], 0
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        pb = getattr(item, "_pb", None) # proto-plus messages, the chat history of the Gemini SDK
+        if pb is not None and hasattr(pb, "ByteSize"):
+            total += pb.ByteSize()
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, _LEAVES):
+            continue
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            pending.extend(item)
+        else:
+            slots = getattr(type(item), "__slots__", ())
+            pending.extend(getattr(item, slot) for slot in slots if hasattr(item, slot))
+            if hasattr(item, "__dict__") and not isinstance(item, type):
+                pending.append(vars(item))
+    return total
+
+
+def rss_bytes() -> int:
+    # resident set size of the process, 0 where /proc is not available
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MemoryTracer:
+    # tracemalloc costs every allocation, so it only runs between start() and stop()
+    def __init__(self):
+        self.lock:Lock = Lock()
+        self.baseline:Optional[tracemalloc.Snapshot] = None
+
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+
+    def start(self, frames:int=1):
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self.baseline = tracemalloc.take_snapshot()
+
+
+    def stop(self):
+        with self.lock:
+            self.baseline = None
+            tracemalloc.stop()
+
+
+    def top(self, limit:int=10, group_by:str="lineno", since_start:bool=False) -> List[Dict[str,Any]]:
+        # largest allocation sites, or the ones that grew the most since start() with since_start
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                return []
+            snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+            if since_start and self.baseline is not None:
+                stats = snapshot.compare_to(self.baseline, group_by)
+                return [{"where" : str(stat.traceback), "size" : stat.size, "growth" : stat.size_diff, "count" : stat.count}
+                        for stat in stats[:limit]]
+            return [{"where" : str(stat.traceback), "size" : stat.size, "count" : stat.count}
+                    for stat in snapshot.statistics(group_by)[:limit]]
+
+
+    def stats(self) -> Dict[str,Any]:
+        if not tracemalloc.is_tracing():
+            return {"tracing" : False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing" : True, "traced" : current, "peak" : peak}
+
+
+memory_tracer = MemoryTracer()
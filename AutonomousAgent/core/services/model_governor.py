@@ -0,0 +1,259 @@
+import itertools
+import random
+import time
+from threading import Condition
+from typing import Dict, Any, List, Optional, Callable, Tuple, Iterator
+
+import google.api_core.exceptions
+
+from .iot_commands import LatencyHistogram
+from .telemetry import telemetry
+
+
+# lower runs first: a user waiting on an answer goes before an incident, an incident before video analysis
+PRIORITIES:Dict[str,int] = {"interactive" : 0, "incident" : 1, "background" : 2}
+RETRYABLE = (google.api_core.exceptions.ResourceExhausted, google.api_core.exceptions.TooManyRequests,
+             google.api_core.exceptions.ServiceUnavailable)
+
+
+class QueueHistogram(LatencyHistogram):
+    BUCKETS:Tuple[float,...] = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class TokenBucket:
+    # burst plus one minute of refill is exactly rate_per_minute, so no sliding minute of the server ever sees more
+    def __init__(self, rate_per_minute:float, burst:Optional[float]=None):
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate_per_minute must be positive, got {rate_per_minute}")
+        self.capacity:float = burst or max(1.0, rate_per_minute / 20)
+        if not burst and self.capacity >= rate_per_minute:
+            self.capacity = rate_per_minute / 2 # a call a minute or less, half of it as burst and half as refill
+        if self.capacity >= rate_per_minute:
+            raise ValueError(f"burst must be below rate_per_minute, got {burst} for {rate_per_minute} a minute")
+        self.rate:float     = (rate_per_minute - self.capacity) / 60
+        self.tokens:float   = self.capacity
+        self.updated:float  = time.monotonic()
+
+
+    def _refill(self, now:float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def wait_time(self, amount:float, now:float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+
+    def take(self, amount:float, now:float):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+
+    def adjust(self, amount:float):
+        # corrects an estimate once the real usage is known, may go negative to delay the next calls
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class ModelGovernor:
+    # every model call of the process goes through one governor: quota buckets, an AIMD concurrency limit and priority queues
+    def __init__(self, requests_per_minute:Optional[float]=None, tokens_per_minute:Optional[float]=None, initial_concurrency:float=4,
+                 min_concurrency:float=1, max_concurrency:float=16, increase:float=0.25, decrease:float=0.7, target_latency:Optional[float]=None,
+                 max_attempts:int=5, base_backoff:float=0.25, max_backoff:float=60, aging:float=10, chars_per_token:float=4):
+        # the quota of the API key, unset means only 429s limit the calls
+        self.requests:Optional[TokenBucket] = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens:Optional[TokenBucket]   = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.limit:float            = initial_concurrency
+        self.min_concurrency:float  = min_concurrency
+        self.max_concurrency:float  = max_concurrency
+        self.increase:float         = increase # added to the limit per round trip of successes, a slow probe keeps 429s rare
+        self.decrease:float         = decrease
+        self.target_latency:float   = target_latency # slower answers count as congestion, None to only react to 429s
+        self.max_attempts:int       = max_attempts
+        self.base_backoff:float     = base_backoff
+        self.max_backoff:float      = max_backoff
+        self.aging:float            = aging # seconds of waiting worth one priority level, background work is never starved
+        self.chars_per_token:float  = chars_per_token
+
+        self.condition:Condition    = Condition()
+        self.waiting:List[list]     = [] # [priority, sequence, queued at], only the head is allowed in
+        self.counter                = itertools.count()
+        self.in_flight:int          = 0
+        self.paused_until:float     = 0.0 # after a 429 nobody goes until the backoff is over, no retry storm
+        self.throttle_streak:int    = 0   # 429s since the last success, the backoff doubles with it
+        self.last_decrease:float    = 0.0
+        self.queue_time:Dict[str,QueueHistogram] = {name : QueueHistogram() for name in PRIORITIES}
+        self.counters:Dict[str,int] = {"calls" : 0, "attempts" : 0, "throttled" : 0, "errors" : 0, "decreases" : 0, "tokens" : 0}
+
+
+    def estimate_tokens(self, content:Any) -> int:
+        return max(1, int(len(str(content)) / self.chars_per_token))
+
+
+    def _head(self, now:float) -> list:
+        return min(self.waiting, key=lambda entry: (entry[0] - (now - entry[2]) / self.aging, entry[1]))
+
+
+    def _admit_delay(self, entry:list, tokens:int, now:float) -> Optional[float]:
+        # 0 to go now, a number of seconds to sleep, None to sleep until a call finishes
+        if self.in_flight >= int(self.limit):
+            return None
+        if self._head(now) is not entry:
+            return self.aging / 2 # aging can change the head without any call finishing
+        if now < self.paused_until:
+            return self.paused_until - now
+        return max(self.requests.wait_time(1, now) if self.requests else 0.0, self.tokens.wait_time(tokens, now) if self.tokens else 0.0)
+
+
+    def _acquire(self, priority:str, tokens:int, entry:list):
+        with self.condition:
+            self.waiting.append(entry)
+            while True:
+                now = time.monotonic()
+                delay = self._admit_delay(entry, tokens, now)
+                if delay == 0:
+                    self.waiting.remove(entry)
+                    self.in_flight += 1
+                    if self.requests:
+                        self.requests.take(1, now)
+                    if self.tokens:
+                        self.tokens.take(tokens, now)
+                    self.condition.notify_all() # the next head may fit as well
+                    return
+                self.condition.wait(timeout=delay)
+
+
+    def _release(self, latency:float, throttled:bool, retry_after:Optional[float], failed:bool=False):
+        with self.condition:
+            saturated = self.in_flight >= int(self.limit) # the limit only grows when calls were actually waiting on it
+            self.in_flight -= 1
+            now = time.monotonic()
+            congested = throttled or (self.target_latency is not None and latency > self.target_latency)
+            if congested:
+                # one decrease per round trip, a burst of 429s from the same window is one signal
+                if now - self.last_decrease > max(latency, 1.0):
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease)
+                    self.last_decrease = now
+                    self.counters["decreases"] += 1
+            elif saturated and not failed:
+                self.limit = min(self.max_concurrency, self.limit + self.increase / max(self.limit, 1))
+            if throttled:
+                # a lone 429 from probing the concurrency costs a short pause, a quota window that stays closed an exponential one
+                self.throttle_streak += 1
+                backoff = retry_after or min(self.max_backoff, self.base_backoff * 2 ** (self.throttle_streak - 1)) * random.uniform(0.5, 1.0)
+                self.paused_until = max(self.paused_until, now + backoff)
+            else:
+                self.throttle_streak = 0
+            self.condition.notify_all()
+
+
+    def _retry_after(self, error:Exception) -> Optional[float]:
+        # Gemini puts a RetryInfo detail on its 429s
+        for detail in getattr(error, "details", None) or []:
+            delay = getattr(detail, "retry_delay", None)
+            if delay is not None and hasattr(delay, "total_seconds"):
+                return delay.total_seconds()
+        return None
+
+
+    def _usage(self, response:Any) -> Optional[int]:
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "total_token_count", None) if usage is not None else None
+
+
+    def call(self, function:Callable[..., Any], *args, priority:str="interactive", tokens:Optional[int]=None, **kwargs) -> Any:
+        response, finish = self._invoke(function, args, kwargs, priority, tokens)
+        finish(response)
+        return response
+
+
+    def stream(self, function:Callable[..., Any], *args, priority:str="interactive", tokens:Optional[int]=None, **kwargs) -> Iterator[Any]:
+        # the slot is held until the last chunk; errors of a streamed call come with the first chunk, so that one is retried like call()
+        def start(*args, **kwargs):
+            chunks = iter(function(*args, **kwargs))
+            return chunks, next(chunks, None)
+
+        (chunks, first), finish = self._invoke(start, args, kwargs, priority, tokens)
+        last, failed = first, None
+        try:
+            if first is not None:
+                yield first
+                for last in chunks:
+                    yield last
+        except Exception as e:
+            failed = e # a stream that breaks off is an error, not a success that raises the limit
+            raise
+        finally:
+            finish(last, failed) # usage_metadata is on the last chunk
+
+
+    def _invoke(self, function:Callable[..., Any], args:tuple, kwargs:Dict[str,Any], priority:str, tokens:Optional[int]) -> Tuple[Any, Callable[..., None]]:
+        # runs function with retries, returns its result and the callback that gives the slot back
+        tokens = tokens or self.estimate_tokens(args)
+        entry = [PRIORITIES[priority], next(self.counter), time.monotonic()] # keeps its place in line across retries
+        queued = time.monotonic()
+        attempt = 0
+        while True:
+            with telemetry.span(f"model.queue.{priority}"):
+                self._acquire(priority, tokens, entry)
+            if attempt == 0:
+                self.queue_time[priority].observe(time.monotonic() - queued)
+
+            start = time.monotonic()
+            try:
+                response = function(*args, **kwargs)
+            except RETRYABLE as e:
+                attempt += 1
+                self._release(time.monotonic() - start, True, self._retry_after(e))
+                with self.condition:
+                    self.counters["attempts"] += 1
+                    self.counters["throttled"] += 1
+                if attempt >= self.max_attempts:
+                    with self.condition:
+                        self.counters["errors"] += 1
+                    raise
+                continue
+            except Exception:
+                self._release(time.monotonic() - start, False, None, failed=True)
+                with self.condition:
+                    self.counters["attempts"] += 1
+                    self.counters["errors"] += 1
+                raise
+
+            return response, lambda last, error=None, start=start: self._finish(last, time.monotonic() - start, tokens, error)
+
+
+    def _finish(self, response:Any, latency:float, tokens:int, error:Optional[Exception]=None):
+        if error is not None:
+            throttled = isinstance(error, RETRYABLE)
+            self._release(latency, throttled, self._retry_after(error) if throttled else None, failed=True)
+            with self.condition:
+                self.counters["attempts"] += 1
+                self.counters["throttled"] += throttled
+                self.counters["errors"] += 1
+            return
+        self._release(latency, False, None)
+        used = self._usage(response)
+        with self.condition:
+            if used is not None and self.tokens:
+                self.tokens.adjust(used - tokens)
+            self.counters["attempts"] += 1
+            self.counters["calls"] += 1
+            self.counters["tokens"] += used if used is not None else tokens
+
+
+    def stats(self) -> Dict[str,Any]:
+        with self.condition:
+            waiting = {name : 0 for name in PRIORITIES}
+            names = {level : name for name, level in PRIORITIES.items()}
+            for entry in self.waiting:
+                waiting[names[entry[0]]] += 1
+            return {
+                    "limit"      : round(self.limit, 2),
+                    "in_flight"  : self.in_flight,
+                    "waiting"    : waiting,
+                    "paused_for" : round(max(0.0, self.paused_until - time.monotonic()), 3),
+                    "queue_time" : {name : histogram.snapshot() for name, histogram in self.queue_time.items()},
+                    **self.counters,
+                   }
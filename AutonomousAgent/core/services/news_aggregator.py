@@ -0,0 +1,252 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock
+from typing import Dict, Any, List, Optional
+
+from .news_service import WebScraper, FeedReader, ArticleStore
+from .parse_pool import ParsePool
+from .telemetry import telemetry
+
+
+class NewsSource:
+    def __init__(self, url:str, kind:str="html", interval:float=600, timeout:float=10, weight:float=1.0, name:Optional[str]=None,
+                 parser:Optional[ParsePool]=None):
+        self.url:str        = url
+        self.name:str       = name or url
+        self.kind:str       = kind
+        self.interval:float = interval
+        self.timeout:float  = timeout
+        self.weight:float   = weight
+        self.next_run:float = 0.0
+        self.running:bool   = False
+
+        if kind in ("rss", "atom"):
+            self.reader = FeedReader(feed_url=url, parser=parser)
+        else:
+            self.reader = WebScraper(reference_website=url, load_links=False, parser=parser)
+
+        self.fetches:int              = 0
+        self.failures:int             = 0
+        self.consecutive_failures:int = 0
+        self.not_modified:int         = 0
+        self.articles_added:int       = 0
+        self.last_success:Optional[float] = None
+        self.last_error:Optional[str]     = None
+        self.last_latency:Optional[float] = None
+        self.avg_latency:Optional[float]  = None
+
+
+    def record(self, latency:float, added:Optional[int]=None, error:Optional[str]=None):
+        self.fetches += 1
+        self.last_latency = latency
+        self.avg_latency  = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+        if error:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            return
+
+        self.consecutive_failures = 0
+        self.last_success = time.time()
+        if added is None:
+            self.not_modified += 1
+        else:
+            self.articles_added += added
+
+
+    def schedule_next(self, jitter:float, max_backoff:float):
+        delay = self.interval * min(2 ** self.consecutive_failures, max_backoff) # back off on failing sources
+        self.next_run = time.time() + delay * (1 + random.uniform(-jitter, jitter))
+
+
+    def health(self) -> Dict[str,Any]:
+        return {
+                "name"                 : self.name,
+                "url"                  : self.url,
+                "kind"                 : self.kind,
+                "fetches"              : self.fetches,
+                "failures"             : self.failures,
+                "consecutive_failures" : self.consecutive_failures,
+                "not_modified"         : self.not_modified,
+                "articles_added"       : self.articles_added,
+                "last_success"         : self.last_success,
+                "last_error"           : self.last_error,
+                "last_latency"         : self.last_latency,
+                "avg_latency"          : self.avg_latency,
+                "next_run"             : self.next_run,
+               }
+
+
+class NewsAggregator:
+    def __init__(self, sources:List[Dict[str,Any]], max_concurrency:int=8, max_articles:int=500,
+                 jitter:float=0.1, max_backoff:float=8, half_life:float=6 * 3600, startup_spread:float=5, parser:Optional[ParsePool]=None,
+                 max_bytes:Optional[int]=None):
+
+        self.parser:ParsePool         = parser # shared by the readers, page parsing leaves the fetch threads
+        self.sources:List[NewsSource] = [NewsSource(parser=parser, **source) for source in sources]
+        self.store:ArticleStore       = ArticleStore(max_articles=max_articles, max_bytes=max_bytes)
+        self.max_concurrency:int      = max_concurrency
+        self.jitter:float             = jitter
+        self.max_backoff:float        = max_backoff
+        self.half_life:float          = half_life
+        self.sources_lock:Lock        = Lock()
+
+        self.context = {
+                        "function" : "provide news",
+                      }
+
+        self._executor:ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="news")
+        self._loop:Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup:Optional[asyncio.Event]           = None
+
+        for source in self.sources: # spread the first fetches instead of hitting every site at once
+            source.next_run = time.time() + random.uniform(0, min(startup_spread, self.jitter * source.interval))
+
+
+    @classmethod
+    def from_config(cls, config:Dict[str,Any], parser:Optional[ParsePool]=None) -> "NewsAggregator":
+        sources = list(config.get("sources", []))
+        if "reference" in config:
+            sources.append({"url" : config["reference"], "kind" : config.get("kind", "html")})
+
+        options = {key : config[key] for key in ("max_concurrency", "max_articles", "jitter", "max_backoff", "half_life", "startup_spread", "max_bytes") if key in config}
+        return cls(sources=sources, parser=parser, **options)
+
+
+    def start(self):
+        Thread(target=self._run_loop, daemon=True).start()
+
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._schedule())
+
+
+    async def _schedule(self):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._wakeup = asyncio.Event()
+
+        while True:
+            now = time.time()
+            with self.sources_lock:
+                sources = list(self.sources)
+
+            for source in sources:
+                if not source.running and source.next_run <= now:
+                    source.running = True
+                    asyncio.ensure_future(self._refresh_source(source, semaphore))
+
+            pending = [source.next_run for source in sources if not source.running]
+            delay = max(0.05, min(pending) - time.time()) if pending else 1.0
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+    async def _refresh_source(self, source:NewsSource, semaphore:asyncio.Semaphore):
+        async with semaphore:
+            with telemetry.span("news.fetch", source=source.name) as span: # spans are synchronous context managers
+                start = time.time()
+                fetch = self._loop.run_in_executor(self._executor, source.reader.fetch_articles, source.timeout)
+                try:
+                    # shielded, a timeout stops the wait but the thread goes on and fetch still completes when it returns
+                    articles = await asyncio.wait_for(asyncio.shield(fetch), timeout=source.timeout)
+                    added = self.store.add(articles, source=source.name) if articles is not None else None
+                    source.record(latency=time.time() - start, added=added)
+                    span.set(added=added)
+                except asyncio.TimeoutError:
+                    source.record(latency=time.time() - start, error=f"Timeout after {source.timeout}s")
+                except Exception as e:
+                    source.record(latency=time.time() - start, error=str(e))
+                finally:
+                    if fetch.done():
+                        self._release(source, fetch)
+                    else:
+                        # the reader is still busy with its etag and last modified, the source stays running until it returns
+                        fetch.add_done_callback(lambda done: self._release(source, done, late=True))
+
+
+    def _release(self, source:NewsSource, fetch:asyncio.Future, late:bool=False):
+        if late and not fetch.cancelled() and fetch.exception() is None and fetch.result() is not None:
+            # the reader already moved its validators, dropping these articles would lose them to the next 304
+            self.store.add(fetch.result(), source=source.name)
+        elif not fetch.cancelled():
+            fetch.exception() # a late failure was already recorded as a timeout
+        source.schedule_next(jitter=self.jitter, max_backoff=self.max_backoff)
+        source.running = False
+        self._wakeup.set()
+
+
+    def add_source(self, url:str, **options):
+        source = NewsSource(url=url, parser=self.parser, **options)
+        with self.sources_lock:
+            self.sources.append(source)
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return source
+
+
+    def _score(self, article:Dict[str,Any], weights:Dict[str,float], now:float) -> float:
+        age = max(0.0, now - article.get("published", article["fetched_at"]))
+        return weights.get(article.get("source"), 1.0) * 0.5 ** (age / self.half_life)
+
+
+    def get_news(self, since:Optional[int]=None, limit:Optional[int]=None) -> List[Dict[str,Any]]:
+        now = time.time()
+        weights = {source.name : source.weight for source in self.sources}
+        articles = self.store.get(since=since)
+        if since is not None and limit:
+            # paging: the oldest unseen articles first, ranked among themselves, so the next cursor skips none of them
+            articles = articles[:limit]
+        articles = sorted(articles, key=lambda article: self._score(article, weights, now), reverse=True)
+        return articles[:limit] if limit else articles
+
+
+    @property
+    def cursor(self) -> int:
+        return self.store.cursor
+
+
+    @property
+    def source(self) -> List[str]:
+        return [source.url for source in self.sources]
+
+
+    def get_health(self) -> List[Dict[str,Any]]:
+        return [source.health() for source in self.sources]
+
+
+    def dump_state(self) -> Dict[str,Any]:
+        # the articles and, per source, what a conditional request needs to get a 304 instead of the page
+        sources = {source.url : {"etag" : source.reader.etag, "last_modified" : source.reader.last_modified, "last_success" : source.last_success}
+                   for source in self.sources}
+        return {"store" : self.store.dump(), "sources" : sources}
+
+
+    def restore_state(self, state:Dict[str,Any]) -> int:
+        # before start(): a source fetched recently waits for its next turn instead of being scraped again at startup
+        restored = self.store.restore(state.get("store", {}))
+        if not restored:
+            return 0
+        now = time.time()
+        for source in self.sources:
+            saved = state.get("sources", {}).get(source.url)
+            if not saved:
+                continue
+            source.reader.etag          = saved.get("etag")
+            source.reader.last_modified = saved.get("last_modified")
+            source.last_success         = saved.get("last_success")
+            if source.last_success and source.last_success + source.interval > now:
+                source.next_run = source.last_success + source.interval
+        return restored
+
+
+    def memory_usage(self) -> Dict[str,Any]:
+        return {**self.store.memory_usage(), "sources" : len(self.sources)}
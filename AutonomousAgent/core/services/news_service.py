@@ -1,51 +1,181 @@
 import requests
+import time
 from bs4 import BeautifulSoup
 from requests.exceptions import RequestException
+from threading import Lock
+from typing import Dict, Any, List, Optional
 
-class WebScraper: 
+from ...utils.text_hashing import content_hash, simhash, hamming_distance
+from .parse_pool import ParsePool
+from .memory import deep_size
+from .parsers import extract_html_articles, extract_feed_articles
 
-    def __init__(self,reference_website):
 
-        self.links:list           = self._extract_links_from_url(reference_website)
+class ArticleStore:
+    def __init__(self, max_articles:int=200, near_duplicate_distance:int=3, max_bytes:Optional[int]=None):
+        self.max_articles:int            = max_articles
+        self.near_duplicate_distance:int = near_duplicate_distance
+        self.max_bytes:Optional[int]     = max_bytes # whole page articles vary a lot in size, a count alone does not bound memory
+
+        self.articles:List[Dict[str,Any]] = []
+        self.sizes:List[int]              = [] # estimated bytes of each article, same order
+        self.bytes:int                    = 0
+        self.evicted:int                  = 0
+        self.cursor:int                   = 0
+        self._seen_hashes:set             = set()
+        self._fingerprints:List[int]      = []
+        self.articles_lock:Lock           = Lock()
+
+
+    def _is_duplicate(self, digest:str, fingerprint:int) -> bool:
+        if digest in self._seen_hashes:
+            return True
+        for known in self._fingerprints:
+            if hamming_distance(known, fingerprint) <= self.near_duplicate_distance:
+                return True
+        return False
+
+
+    def add(self, articles:List[Dict[str,Any]], source:Optional[str]=None) -> int:
+        added = 0
+        with self.articles_lock:
+            for article in articles:
+                digest      = content_hash(article["text"])
+                fingerprint = simhash(article["text"])
+                if self._is_duplicate(digest, fingerprint):
+                    continue
+
+                self.cursor += 1
+                now = time.time()
+                article.update({"id" : self.cursor, "hash" : digest, "fetched_at" : now})
+                article.setdefault("published", now)
+                if source:
+                    article["source"] = source
+                self.articles.append(article)
+                self.sizes.append(deep_size(article))
+                self.bytes += self.sizes[-1]
+                self._seen_hashes.add(digest)
+                self._fingerprints.append(fingerprint)
+                added += 1
+            self._evict()
+        return added
+
+
+    def _evict(self):
+        # under articles_lock
+        overflow = max(0, len(self.articles) - self.max_articles)
+        if self.max_bytes is not None:
+            # oldest first until the rest fits, the newest article is always kept
+            kept = self.bytes - sum(self.sizes[:overflow])
+            while kept > self.max_bytes and overflow < len(self.articles) - 1:
+                kept -= self.sizes[overflow]
+                overflow += 1
+        if overflow > 0:
+            for article in self.articles[:overflow]:
+                self._seen_hashes.discard(article["hash"])
+            self.bytes -= sum(self.sizes[:overflow])
+            self.evicted += overflow
+            del self.articles[:overflow]
+            del self.sizes[:overflow]
+            del self._fingerprints[:overflow]
+
+
+    def dump(self) -> Dict[str,Any]:
+        with self.articles_lock:
+            return {"cursor" : self.cursor, "articles" : list(self.articles), "fingerprints" : list(self._fingerprints)}
+
+
+    def restore(self, state:Dict[str,Any]) -> int:
+        # articles of the previous run with their ids, so a since cursor held by a client stays valid;
+        # fingerprints are saved with them, recomputing the simhash of every article would cost the restart
+        with self.articles_lock:
+            if self.articles:
+                return 0 # a live fetch came first, it is newer
+            articles, fingerprints = state.get("articles", []), state.get("fingerprints", [])
+            if len(articles) != len(fingerprints):
+                return 0
+            self.articles      = list(articles)
+            self._fingerprints = list(fingerprints)
+            self._seen_hashes  = {article["hash"] for article in articles}
+            self.sizes         = [deep_size(article) for article in articles]
+            self.bytes         = sum(self.sizes)
+            self.cursor        = max(self.cursor, state.get("cursor", 0))
+            self._evict()
+            return len(self.articles)
+
+
+    def memory_usage(self) -> Dict[str,Any]:
+        with self.articles_lock:
+            return {"articles" : len(self.articles), "bytes" : self.bytes, "max_bytes" : self.max_bytes, "evicted" : self.evicted}
+
+
+    def get(self, since:Optional[int]=None) -> List[Dict[str,Any]]:
+        with self.articles_lock:
+            if since is None:
+                return list(self.articles)
+            return [article for article in self.articles if article["id"] > since]
+
+
+HEADERS:Dict[str,str] = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+class ConditionalReader:
+    # a source fetched with If-None-Match / If-Modified-Since, subclasses set source, etag and last_modified
+    # and parse the response's BODY attribute in _extract_articles
+    BODY:str = "text"
+
+    def fetch_articles(self, timeout:float=10) -> Optional[List[Dict[str,Any]]]:
+        response = self._conditional_get(timeout=timeout)
+        if response is None:
+            return None
+        articles = self._extract_articles(getattr(response, self.BODY))
+        self._accept(response)
+        return articles
+
+
+    def _conditional_get(self, timeout:float=10) -> Optional[requests.Response]: # None when the source did not change (304)
+        headers = dict(HEADERS)
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        response = requests.get(self.source, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return response
+
+
+    def _accept(self, response:requests.Response):
+        # only once the body is parsed, a body that failed to parse is asked for in full again
+        self.etag          = response.headers.get('ETag', self.etag)
+        self.last_modified = response.headers.get('Last-Modified', self.last_modified)
+
+
+class WebScraper(ConditionalReader): 
+
+    def __init__(self,reference_website, max_articles:int=200, near_duplicate_distance:int=3, load_links:bool=True,
+                 parser:Optional[ParsePool]=None):
+
+        self.links:list           = self._extract_links_from_url(reference_website) if load_links else []
         self.source = reference_website
 
         self.context = {
                         "function" : "provide news", 
                       }
-        
 
-    def _extract_text_from_url(self,url):
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            
-    
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            text = soup.get_text(separator=' ', strip=True)
-            
-            return text
-        
-        except requests.HTTPError as http_err:
-            return f"HTTP error occurred: {http_err}"
-        except RequestException as req_err:
-            return f"An error occurred while making the request: {req_err}"
-        except Exception as err:
-            return f"An unexpected error occurred: {err}"
+        self.etag:Optional[str]          = None
+        self.last_modified:Optional[str] = None
+        self.store:ArticleStore          = ArticleStore(max_articles=max_articles, near_duplicate_distance=near_duplicate_distance)
+        self.parser:ParsePool            = parser
         
 
     def _extract_links_from_url(self,url):
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = requests.get(url, headers=HEADERS, timeout=10)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -73,5 +203,42 @@ class WebScraper:
             return f"An unexpected error occurred: {err}"
         
 
-    def get_news(self):
-        return self._extract_text_from_url(self.source)
\ No newline at end of file
+    def _extract_articles(self, html:str) -> List[Dict[str,str]]:
+        # BeautifulSoup over a whole page is the costly part of a refresh, it runs on the parse workers when there are some
+        return self.parser.run(extract_html_articles, html, self.source) if self.parser else extract_html_articles(html, self.source)
+
+
+    @property
+    def cursor(self) -> int:
+        return self.store.cursor
+
+
+    def refresh(self) -> int: # number of new articles
+        try:
+            articles = self.fetch_articles()
+        except RequestException as req_err:
+            print(f"An error occurred while making the request: {req_err}")
+            return 0
+
+        if articles is None:
+            return 0
+
+        return self.store.add(articles)
+
+
+    def get_news(self, since:Optional[int]=None) -> List[Dict[str,Any]]:
+        return self.store.get(since=since)
+
+
+class FeedReader(ConditionalReader):
+    BODY:str = "content" # bytes, the XML declaration names the encoding
+
+    def __init__(self, feed_url:str, parser:Optional[ParsePool]=None):
+        self.source:str                  = feed_url
+        self.parser:ParsePool            = parser
+        self.etag:Optional[str]          = None
+        self.last_modified:Optional[str] = None
+
+
+    def _extract_articles(self, content:bytes) -> List[Dict[str,Any]]:
+        return self.parser.run(extract_feed_articles, content) if self.parser else extract_feed_articles(content)
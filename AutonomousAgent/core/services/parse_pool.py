@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Dict, Any, List, Optional, Callable, Sequence
+
+from .telemetry import telemetry
+
+
+def _ready(_) -> int:
+    return os.getpid()
+
+
+class ParsePool:
+    # CPU bound parsing (mail bodies, whole news pages) in worker processes: a thread doing it holds the GIL
+    # away from the MQTT callbacks and the model dispatch, a process does not; workers=0 parses inline
+    def __init__(self, workers:int=2, batch_size:int=50, start_method:Optional[str]=None):
+        self.workers:int    = workers
+        self.batch_size:int = batch_size # items per task, enough to amortise the pickling round trip
+        # no fork: the parent runs MQTT and scheduler threads whose locks a forked child would inherit held
+        self.start_method:str = start_method or ("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+        self.executor:Optional[ProcessPoolExecutor] = None
+        self.lock:Lock      = Lock()
+        self.counters:Dict[str,int] = {"tasks" : 0, "items" : 0, "inline" : 0, "errors" : 0, "restarts" : 0}
+
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # started on first use, an agent without mail or news never pays for the processes
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method))
+            return self.executor
+
+
+    def warm(self):
+        # starts the workers and imports the parsers in them, so the first refresh does not pay for it
+        if self.workers:
+            list(self._executor().map(_ready, range(self.workers)))
+
+
+    def run(self, function:Callable[..., Any], *args) -> Any:
+        with telemetry.span("parse.run", function=function.__name__):
+            if not self.workers:
+                self._count(1, inline=True)
+                return function(*args)
+            executor = self._executor()
+            try:
+                result = self._result(executor.submit(function, *args))
+            except BrokenProcessPool:
+                self._broken(executor)
+                self._count(1, inline=True)
+                return function(*args)
+            self._count(1)
+            return result
+
+
+    def map_batches(self, function:Callable[[List[Any]], List[Any]], items:Sequence[Any], batch_size:Optional[int]=None) -> List[Any]:
+        # function takes a list and returns one result per item; the batches run on every worker, results keep the order
+        if not items:
+            return []
+        with telemetry.span("parse.batches", function=function.__name__, items=len(items)):
+            if not self.workers:
+                self._count(len(items), inline=True)
+                return function(list(items))
+            size = batch_size or self.batch_size
+            executor = self._executor()
+            try:
+                futures = [executor.submit(function, list(items[start:start + size])) for start in range(0, len(items), size)]
+                results = [result for future in futures for result in self._result(future)]
+            except BrokenProcessPool:
+                self._broken(executor)
+                self._count(len(items), inline=True)
+                return function(list(items))
+            self._count(len(items), tasks=len(futures))
+            return results
+
+
+    def _result(self, future:Future) -> Any:
+        try:
+            return future.result()
+        except Exception:
+            with self.lock:
+                self.counters["errors"] += 1
+            raise
+
+
+    def _broken(self, executor:ProcessPoolExecutor):
+        # a worker died (killed for its memory, crashed in a parser): the pool refuses every task from then on,
+        # the next call starts a new one and this one is parsed inline
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+                self.counters["restarts"] += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+    def _count(self, items:int, tasks:int=1, inline:bool=False):
+        with self.lock:
+            self.counters["inline" if inline else "tasks"] += tasks
+            self.counters["items"] += items
+
+
+    def stats(self) -> Dict[str,Any]:
+        with self.lock:
+            return {"workers" : self.workers, "start_method" : self.start_method, **self.counters}
+
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,125 @@
+import base64
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+
+# pure functions of the CPU heavy parsing steps: module level so a ParsePool worker process can run them,
+# plain tuples and lists in and out so what crosses the process boundary pickles small and fast
+
+# (id, thread_id, received_at, From, suject, Body), the Gmail message fields MailStore keeps
+MailRow = Tuple[str, Optional[str], Optional[float], str, str, str]
+
+
+def parse_message(msg:Dict[str,Any]) -> MailRow:
+    headers = msg['payload']['headers']
+    subject = next((header['value'] for header in headers if header['name'].lower() == 'subject'), '(No subject)')
+    sender = next((header['value'] for header in headers if header['name'].lower() == 'from'), '(No sender)')
+
+    if 'parts' in msg['payload']:
+        body = ''
+        for part in msg['payload']['parts']:
+            if part['mimeType'] == 'text/plain':
+                body = part['body'].get('data', '')
+                break
+    else:
+        body = msg['payload']['body'].get('data', '')
+
+    body = base64.urlsafe_b64decode(body).decode('utf-8') if body else '(No body)'
+    received_at = int(msg['internalDate']) / 1000 if 'internalDate' in msg else None
+    return (msg['id'], msg.get('threadId'), received_at, sender, subject, body)
+
+
+def parse_messages(messages:List[Dict[str,Any]]) -> List[MailRow]:
+    return [parse_message(msg) for msg in messages]
+
+
+def mail_from_row(row:MailRow) -> Dict[str,Any]:
+    mail_id, thread_id, received_at, sender, subject, body = row
+    return {"id" : mail_id, "thread_id" : thread_id, "received_at" : received_at, "From" : sender, "suject" : subject, "Body" : body}
+
+
+def page_text(html:str) -> str:
+    return BeautifulSoup(html, 'html.parser').get_text(separator=' ', strip=True)
+
+
+def extract_html_articles(html:str, source:str) -> List[Dict[str,str]]:
+    soup = BeautifulSoup(html, 'html.parser')
+    articles = []
+
+    blocks = soup.find_all('article')
+    if not blocks:
+        blocks = [heading.parent for heading in soup.find_all(['h1', 'h2', 'h3']) if heading.find('a')]
+
+    for block in blocks:
+        heading = block.find(['h1', 'h2', 'h3', 'h4']) or block.find('a')
+        link = block.find('a')
+        href = link.get('href') if link else None
+        if href and href.startswith('/'):
+            href = source.rstrip('/') + href
+
+        text = block.get_text(separator=' ', strip=True)
+        if text:
+            articles.append({
+                            "title" : heading.get_text(separator=' ', strip=True) if heading else text[:120],
+                            "link"  : href,
+                            "text"  : text
+                            })
+
+    if not articles:
+        text = soup.get_text(separator=' ', strip=True)
+        if text:
+            articles.append({"title" : text[:120], "link" : source, "text" : text})
+
+    return articles
+
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+
+
+def parse_date(value:Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()    # RSS, RFC 822
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()  # Atom, RFC 3339
+    except ValueError:
+        return None
+
+
+def clean_markup(markup:Optional[str]) -> str:
+    if not markup:
+        return ""
+    return BeautifulSoup(markup, 'html.parser').get_text(separator=' ', strip=True)
+
+
+def extract_feed_articles(content:bytes) -> List[Dict[str,Any]]:
+    root = ET.fromstring(content)
+    articles = []
+
+    for item in root.iter("item"):
+        title = item.findtext("title") or ""
+        text  = clean_markup(item.findtext("description")) or title
+        article = {"title" : title.strip(), "link" : item.findtext("link"), "text" : text}
+        published = parse_date(item.findtext("pubDate"))
+        if published:
+            article["published"] = published
+        articles.append(article)
+
+    for entry in root.iter(f"{ATOM}entry"):
+        title = entry.findtext(f"{ATOM}title") or ""
+        link  = entry.find(f"{ATOM}link")
+        text  = clean_markup(entry.findtext(f"{ATOM}summary") or entry.findtext(f"{ATOM}content")) or title
+        article = {"title" : title.strip(), "link" : link.get("href") if link is not None else None, "text" : text}
+        published = parse_date(entry.findtext(f"{ATOM}published") or entry.findtext(f"{ATOM}updated"))
+        if published:
+            article["published"] = published
+        articles.append(article)
+
+    return [article for article in articles if article["text"]]
@@ -0,0 +1,147 @@
+import copy
+import json
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple
+
+
+TOOL_PROJECTIONS:Dict[str,Tuple[str,...]] = {
+    "get_mails"    : ("Id", "Date", "From", "suject", "Body"),
+    "search_mails" : ("Id", "Date", "From", "suject", "Body"),
+    "get_news"     : ("id", "title", "link", "text", "source"),
+    "get_events"   : ("Event", "Start"),
+}
+
+
+def dumps(value:Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class ResultEncoder:
+    def __init__(self, max_text:int=400, max_bytes:int=8000, max_stash:int=256, projections:Optional[Dict[str,List[str]]]=None):
+        self.max_text:int   = max_text
+        self.max_bytes:int  = max_bytes
+        self.max_stash:int  = max_stash
+        self.projections:Dict[str,Tuple[str,...]] = dict(TOOL_PROJECTIONS)
+        self.projections.update({name : tuple(fields) for name, fields in (projections or {}).items()})
+
+        self._stash:OrderedDict = OrderedDict() # least recently used first, a cursor being paged stays at the end
+        self._stash_lock:Lock   = Lock()
+        self._next_cursor:int   = 0
+
+
+    def _store(self, value:Any) -> str:
+        with self._stash_lock:
+            self._next_cursor += 1
+            cursor = f"c{self._next_cursor}"
+            self._stash[cursor] = value
+            while len(self._stash) > self.max_stash:
+                self._stash.popitem(last=False)
+        return cursor
+
+
+    def _truncate(self, text:str, limit:int) -> str:
+        if len(text) <= limit:
+            return text
+        return f"{text[:limit]}… [more: {self._store(text[limit:])}]"
+
+
+    def _records(self, value:Any) -> Optional[List[Tuple[Any,Dict]]]:
+        # {0: {...}, 1: {...}} and [{...}, {...}] are both lists of records
+        if isinstance(value, dict) and len(value) > 1 and all(isinstance(key, int) or (isinstance(key, str) and key.isdigit()) for key in value) \
+                and all(isinstance(item, dict) for item in value.values()):
+            return list(value.items())
+        if isinstance(value, list) and len(value) > 1 and all(isinstance(item, dict) for item in value):
+            return [(None, item) for item in value]
+        return None
+
+
+    def _table(self, records:List[Tuple[Any,Dict]], fields:Optional[Tuple[str,...]], limit:int) -> Dict[str,Any]:
+        columns = [] if records[0][0] is None else ["#"]
+        for _, record in records:
+            for key in record:
+                if key not in columns and (fields is None or key in fields):
+                    columns.append(key)
+
+        rows = []
+        for index, record in records:
+            row = [] if index is None else [index]
+            row += [self._encode(record.get(column), fields, limit) for column in columns if column != "#"]
+            rows.append(row)
+        return {"columns" : columns, "rows" : rows}
+
+
+    def _encode(self, value:Any, fields:Optional[Tuple[str,...]], limit:int) -> Any:
+        if isinstance(value, str):
+            return self._truncate(value, limit)
+
+        if isinstance(value, Mapping) and not isinstance(value, dict):
+            value = dict(value) # e.g. SensorReadings
+
+        records = self._records(value)
+        if records:
+            return self._table(records, fields, limit)
+
+        if isinstance(value, dict):
+            if fields and value and all(isinstance(key, str) for key in value) and any(key in fields for key in value):
+                value = {key : item for key, item in value.items() if key in fields}
+            return {key : self._encode(item, fields, limit) for key, item in value.items()}
+
+        if isinstance(value, (list, tuple, array)):
+            return [self._encode(item, fields, limit) for item in value]
+
+        return value
+
+
+    def _largest_table(self, value:Any) -> Optional[Dict[str,Any]]:
+        tables = []
+        def walk(node):
+            if isinstance(node, dict):
+                if "columns" in node and "rows" in node and node["rows"]:
+                    tables.append(node)
+                for item in node.values():
+                    walk(item)
+            elif isinstance(node, list):
+                for item in node:
+                    walk(item)
+        walk(value)
+        return max(tables, key=lambda table: len(table["rows"]), default=None)
+
+
+    def _enforce_cap(self, encoded:Any) -> Any:
+        table = self._largest_table(encoded)
+        while table and len(dumps(encoded).encode("utf-8")) > self.max_bytes and len(table["rows"]) > 1:
+            keep = max(1, len(table["rows"]) // 2)
+            dropped = table["rows"][keep:]
+            del table["rows"][keep:]
+            previous = table.pop("more_rows", None)
+            table["more_rows"] = self._store({"columns" : table["columns"], "rows" : dropped, **({"more_rows" : previous} if previous else {})})
+
+        payload = dumps(encoded)
+        if len(payload.encode("utf-8")) <= self.max_bytes:
+            return encoded
+
+        # still too large: hand back a prefix of the serialised result and keep the rest behind a cursor
+        cut = self.max_bytes // 2
+        return {"partial" : payload[:cut], "more" : self._store(payload[cut:])}
+
+
+    def encode(self, function_name:str, result:Any) -> Any:
+        return self._enforce_cap(self._encode(result, self.projections.get(function_name), self.max_text))
+
+
+    def get_more(self, cursor:str) -> Any:
+        with self._stash_lock:
+            value = self._stash.get(cursor)
+            if value is not None:
+                self._stash.move_to_end(cursor) # kept, the model may ask again when a follow up call failed
+
+        if value is None:
+            return {"Error" : f"Cursor {cursor} is unknown or expired"}
+
+        if isinstance(value, str):
+            return {"content" : self._truncate(value, self.max_bytes // 2)}
+
+        return self._enforce_cap(copy.deepcopy(value)) # cut a copy, the stashed value stays whole for the next read
@@ -0,0 +1,240 @@
+import heapq
+import itertools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Condition
+from typing import Dict, Any, List, Optional, Callable
+
+from .telemetry import telemetry
+
+
+class ScheduledTask:
+    __slots__ = ("name", "span", "function", "interval", "min_interval", "max_interval", "backoff", "speedup", "jitter", "budget",
+                 "dedicated", "scope", "periodic", "next_run", "running", "cancelled", "runs", "errors", "overruns", "total_runtime",
+                 "max_runtime", "last_runtime", "max_lag", "last_error")
+
+    def __init__(self, name:str, function:Callable[[], Any], interval:float, periodic:bool, min_interval:Optional[float]=None,
+                 max_interval:Optional[float]=None, backoff:float=1.5, speedup:float=0.5, jitter:float=0.1, budget:Optional[float]=None,
+                 span:Optional[str]=None, dedicated:bool=False, scope:Optional[str]=None):
+        self.name          = name
+        self.span          = f"task.{span or name}"
+        self.function      = function
+        self.interval      = interval
+        self.min_interval  = interval if min_interval is None else min_interval
+        self.max_interval  = interval if max_interval is None else max_interval
+        self.backoff       = backoff
+        self.speedup       = speedup
+        self.jitter        = jitter
+        self.budget        = budget or interval # a run longer than this is an overrun
+        self.dedicated     = dedicated # blocks for long stretches, runs on a thread of its own instead of a pool worker
+        self.scope         = scope
+        self.periodic      = periodic
+        self.next_run      = 0.0
+        self.running       = False
+        self.cancelled     = False
+        self.runs          = 0
+        self.errors        = 0
+        self.overruns      = 0
+        self.total_runtime = 0.0
+        self.max_runtime   = 0.0
+        self.last_runtime  = 0.0
+        self.max_lag       = 0.0
+        self.last_error:Optional[str] = None
+
+
+    def adapt(self, result:Any):
+        # True: something changed, come back sooner; False: nothing new, back off; None: keep the interval
+        if result is True:
+            self.interval = max(self.min_interval, self.interval * self.speedup)
+        elif result is False:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+
+
+    def delay(self) -> float:
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+    def stats(self) -> Dict[str,Any]:
+        return {
+                "interval"       : round(self.interval, 3),
+                "dedicated"      : self.dedicated,
+                "runs"           : self.runs,
+                "errors"         : self.errors,
+                "overruns"       : self.overruns,
+                "mean_runtime_ms": round(self.total_runtime / self.runs * 1000, 3) if self.runs else None,
+                "max_runtime_ms" : round(self.max_runtime * 1000, 3),
+                "max_lag_ms"     : round(self.max_lag * 1000, 3),
+                "last_error"     : self.last_error,
+               }
+
+
+class Scheduler:
+    # one timer thread and a fixed pool run every periodic and one-shot background task
+    def __init__(self, workers:int=4, scope_workers:Optional[int]=None):
+        self.condition:Condition   = Condition()
+        self.queue:List[tuple]     = []
+        self.tasks:Dict[str,ScheduledTask] = {}
+        self.counter               = itertools.count()
+        self.executor:ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler")
+        self.wakeups:int           = 0
+        self.scope_workers:Optional[int] = scope_workers # workers one scope may hold at once, the others keep the rest
+        self.busy:Dict[str,int]    = {}
+        self.deferred:int          = 0
+        self.stopped:bool          = False
+        Thread(target=self._run, daemon=True).start()
+
+
+    def _push(self, task:ScheduledTask, delay:float):
+        task.next_run = time.monotonic() + delay
+        with self.condition:
+            heapq.heappush(self.queue, (task.next_run, next(self.counter), task))
+            self.condition.notify()
+
+
+    def every(self, name:str, function:Callable[[], Any], interval:float, delay:float=0, **options) -> ScheduledTask:
+        self.cancel(name)
+        task = ScheduledTask(name=name, function=function, interval=interval, periodic=True, **options)
+        self.tasks[name] = task
+        self._push(task, delay)
+        return task
+
+
+    def once(self, name:str, function:Callable[[], Any], delay:float=0, span:Optional[str]=None, dedicated:bool=False,
+             scope:Optional[str]=None) -> ScheduledTask:
+        self.cancel(name)
+        task = ScheduledTask(name=name, function=function, interval=0, periodic=False, budget=float("inf"), span=span,
+                             dedicated=dedicated, scope=scope)
+        self.tasks[name] = task
+        self._push(task, delay)
+        return task
+
+
+    def cancel(self, name:str):
+        task = self.tasks.pop(name, None)
+        if task:
+            task.cancelled = True # dropped when it reaches the top of the heap
+
+
+    def trigger(self, name:str):
+        # run a periodic task now instead of waiting for its interval
+        task = self.tasks.get(name)
+        if task and not task.running:
+            self._push(task, 0)
+
+
+    def _run(self):
+        while not self.stopped:
+            with self.condition:
+                while not self.stopped and (not self.queue or self.queue[0][0] > time.monotonic()):
+                    self.condition.wait(timeout=self.queue[0][0] - time.monotonic() if self.queue else None)
+                    self.wakeups += 1
+                if self.stopped:
+                    return
+                due, _, task = heapq.heappop(self.queue)
+
+            # stale heap entries: cancelled tasks, or a trigger() that was overtaken by the regular run
+            if task.cancelled or task.running or due != task.next_run:
+                continue
+            if self._hold(task):
+                self.deferred += 1
+                self._push(task, 0.05) # its scope has its share of the workers, the other scopes go first
+                continue
+            task.running = True
+            task.max_lag = max(task.max_lag, time.monotonic() - due)
+            if task.dedicated:
+                # a task that waits on a broker or a long upload would hold a pool worker and starve the periodic ones
+                Thread(target=self._execute, args=(task,), name=f"scheduler-{task.name}", daemon=True).start()
+            else:
+                self.executor.submit(self._execute, task)
+
+
+    def _execute(self, task:ScheduledTask):
+        start = time.perf_counter()
+        result = None
+        try:
+            with telemetry.span(task.span):
+                result = task.function()
+        except Exception as e:
+            task.errors += 1
+            task.last_error = repr(e)
+        runtime = time.perf_counter() - start
+
+        task.runs += 1
+        task.total_runtime += runtime
+        task.last_runtime = runtime
+        task.max_runtime = max(task.max_runtime, runtime)
+        if runtime > task.budget:
+            task.overruns += 1
+        task.running = False
+        if task.scope is not None and not task.dedicated:
+            with self.condition:
+                self.busy[task.scope] -= 1
+
+        if task.periodic and not task.cancelled:
+            task.adapt(result)
+            self._push(task, task.delay())
+        elif not task.periodic and self.tasks.get(task.name) is task:
+            del self.tasks[task.name]
+
+
+    def _hold(self, task:ScheduledTask) -> bool:
+        # counts the worker the task is about to take, unless its scope already holds its share
+        if task.dedicated or task.scope is None:
+            return False
+        with self.condition:
+            if self.scope_workers is not None and self.busy.get(task.scope, 0) >= self.scope_workers:
+                return True
+            self.busy[task.scope] = self.busy.get(task.scope, 0) + 1
+        return False
+
+
+    def stats(self) -> Dict[str,Dict[str,Any]]:
+        return {name : task.stats() for name, task in list(self.tasks.items())}
+
+
+    def scope(self, name:str) -> "ScopedScheduler":
+        return ScopedScheduler(self, name)
+
+
+    def shutdown(self):
+        self.stopped = True
+        for name in list(self.tasks):
+            self.cancel(name)
+        with self.condition:
+            self.condition.notify()
+        self.executor.shutdown(wait=False)
+
+
+class ScopedScheduler:
+    # one tenant's view of a shared Scheduler: task names get a prefix, spans keep the plain name
+    def __init__(self, scheduler:Scheduler, scope:str):
+        self.scheduler:Scheduler = scheduler
+        self.name:str            = scope
+        self.prefix:str          = f"{scope}/"
+
+
+    def every(self, name:str, function:Callable[[], Any], interval:float, delay:float=0, **options) -> ScheduledTask:
+        return self.scheduler.every(self.prefix + name, function, interval, delay, span=name, scope=self.name, **options)
+
+
+    def once(self, name:str, function:Callable[[], Any], delay:float=0, dedicated:bool=False) -> ScheduledTask:
+        return self.scheduler.once(self.prefix + name, function, delay, span=name, dedicated=dedicated, scope=self.name)
+
+
+    def cancel(self, name:str):
+        self.scheduler.cancel(self.prefix + name)
+
+
+    def trigger(self, name:str):
+        self.scheduler.trigger(self.prefix + name)
+
+
+    def stats(self) -> Dict[str,Dict[str,Any]]:
+        return {name[len(self.prefix):] : task.stats() for name, task in list(self.scheduler.tasks.items()) if name.startswith(self.prefix)}
+
+
+    def shutdown(self):
+        # only this scope's tasks, the shared timer and workers keep running
+        for name in [name for name in list(self.scheduler.tasks) if name.startswith(self.prefix)]:
+            self.scheduler.cancel(name)
@@ -1,10 +1,17 @@
 from .iot_service import IoT 
 from .google_service import Google
-from .news_service import WebScraper
-from threading import Thread, Lock
-from queue import Queue
+from .mail_store import MailStore
+from .mail_outbox import MailOutbox
+from .news_aggregator import NewsAggregator
+from .scheduler import Scheduler, ScopedScheduler
+from .service_pool import ServicePool
+from .video_events import VideoEventLog, parse_time
+from .snapshot import Published
+from .parse_pool import ParsePool
+from .memory import deep_size
+from .state_store import StateStore
 from  typing import Any 
-import json, time
+import json, time, hashlib, uuid
 
 from ...interfaces.service_interface import ServiceInterface
 from typing import Dict, Any, List, Optional, Callable
@@ -12,33 +19,64 @@ from itertools import islice
 from datetime import datetime
 
 class Handler:
-    def __init__(self, config: dict) -> None:
+    def __init__(self, config: dict, pool:Optional[ServicePool] = None) -> None:
         self.iot_object: IoT            = None 
         self.google_object: Google      = None
-        self.webscraper:WebScraper      = None 
-        self.context: dict              = None 
-        self.news:str                   = None 
-        self.google_data:dict[str:Any]  = None
+        self.mail_store: MailStore      = None
+        self.mail_outbox: MailOutbox    = None
+        self.recent_mails:int           = 20
+        self.iot_command_timeout:float  = 5
+        self.mail_sync_limit:int        = 1000
+        self.news_aggregator:NewsAggregator = None 
+        self.video_events:VideoEventLog = None
+        self.parse_pool:ParsePool       = None
+        self.state_store:StateStore     = None
+        # copy on write, readers take the current snapshot without a lock, see snapshot.Published
+        self.context:Published          = Published()
+        self.workspace:Published        = Published() # {"mail": recent mails, "calendar": events}
+        self.listeners:List[Callable]   = [] # (kind, payload) for new mails and calendar changes
+        self.iot_topics_version:int     = -1
+        # what the model saw, so a cached reply is only reused while it still holds; see ResponseCache
+        self.epoch:str                  = uuid.uuid4().hex[:8] # counters restart with the process
+        self.context_digest:tuple       = (None, None)
+        self.pool:ServicePool           = pool # shared with the other tenants of an AgentHost
 
         self.config:dict[str:Any]       = config
-        self.context_lock:Lock          = Lock()
-        self.workspace_lock:Lock        = Lock()
-        self.update_queue:Queue         = Queue()
+        # every background refresh of the services and the agent runs here, see scheduler.Scheduler
+        if pool:
+            self.scheduler:ScopedScheduler = pool.scheduler.scope(config.get("tenant", str(id(self))))
+        else:
+            self.scheduler:Scheduler       = Scheduler(**config.get("scheduler", {}))
         
+        # warm restart, the state of the previous run is read back before the services revalidate it; off unless configured
+        if "state" in config:
+            self.state_store = StateStore(**config["state"])
+
         self.Document = None 
         self._load_document(path=config["document_path"])
         self._initialize_services()
+        restored = self._restore_state()
         self._upload_context()
+        if restored.get("iot"):
+            self._refresh_iot_context(force=True) # topics known before the first live message
+        if self.news_aggregator and not self.pool:
+            self.news_aggregator.start()
+        if self.state_store:
+            self.state_store.start(self.scheduler)
 
-        Thread(target=self._iot_update_loop, daemon=True).start()
-        Thread(target=self._google_update_loop, daemon=True).start()
-        Thread(target=self._process_updates, daemon=True).start()
-        Thread(target=self._update_news, daemon=True).start()
+        if self.iot_object:
+            self.scheduler.every("iot.context", self._refresh_iot_context, interval=3, min_interval=3, max_interval=30)
+        if self.google_object:
+            self.scheduler.every("google.sync", self._sync_google, interval=60, min_interval=30, max_interval=600)
 
         del self.config #clean 
 
 
     def _initialize_services(self):
+        if "google" in self.config or "news" in self.config:
+            # mail bodies and news pages are parsed in worker processes, away from the MQTT callbacks
+            self.parse_pool = self.pool.parse_pool if self.pool else ParsePool(**self.config.get("parsing", {}))
+
         if "iot" in self.config:
             iotConfig = self.config["iot"]
             self.iot_object = IoT(
@@ -46,31 +84,50 @@ class Handler:
                 iot_thing_names=iotConfig["iot_thing_names"],
                 iot_root_cacert_path=iotConfig["iot_root_cacert"],
                 iot_device_cert_path=iotConfig["iot_device_cert"],
-                iot_private_key_path=iotConfig["iot_private_key"]
+                iot_private_key_path=iotConfig["iot_private_key"],
+                transport_factory=iotConfig.get("transport_factory"),
+                scheduler=self.scheduler,
+                subscription=iotConfig.get("subscription", "per_thing"),
+                shards=iotConfig.get("shards", 1),
+                subscribe_batch=iotConfig.get("subscribe_batch", 8)
             )
+            self.iot_command_timeout = iotConfig.get("command_timeout", self.iot_command_timeout)
         
         if "google" in self.config:
-            self.google_object = Google(client_credentials_file_path=self.config["google"]["client_credentials"])
+            googleConfig = self.config["google"]
+            self.google_object = Google(client_credentials_file_path=googleConfig["client_credentials"], parser=self.parse_pool)
+            self.mail_store = MailStore(path=googleConfig.get("mail_store", "mail_store.db"), cache_kib=googleConfig.get("mail_cache_kib"))
+            self.recent_mails = googleConfig.get("recent_mails", self.recent_mails)
+            self.mail_sync_limit = googleConfig.get("mail_sync_limit", self.mail_sync_limit)
+            self.mail_outbox = MailOutbox(sender=self.google_object.send_emails, path=googleConfig.get("outbox", "mail_outbox.db"))
+            self.mail_outbox.start(scheduler=self.scheduler if self.pool else None)
+
+        # every analysed video of the agent, kept across restarts
+        self.video_events = VideoEventLog(**self.config.get("video", {}))
 
         if "news" in self.config:
-            self.webscraper = WebScraper(reference_website=self.config["news"]["reference"])
+            if self.pool:
+                self.news_aggregator = self.pool.news(self.config["news"])
+            else:
+                self.news_aggregator = NewsAggregator.from_config(self.config["news"], parser=self.parse_pool)
 
 
     def _upload_context(self):
         try:
             with open(self.config["base_context"], "r") as file:
-                self.context = json.load(file)
+                context = json.load(file)
                 
                 if "user" in self.config:
                      UserInfo = self.config["user"]
                      UserInfo["Description"] = self.Document
                      
-                     self.context["Context"]["Owner"] = UserInfo
+                     context["Context"]["Owner"] = UserInfo
 
-                     time.sleep(5)
-                     self.context["IoTSystemAvailable"] = self.iot_object.feature_topics
+                     self.iot_object.wait_topics(timeout=5) # at once when the topics were restored
+                     context["IoTSystemAvailable"] = self.iot_object.get_feature_topics()
  
                 file.close()
+                self.context.publish(context)
 
         except Exception as e: 
             print(f"Failed to load the context. Exception: {e}")
@@ -82,55 +139,184 @@ class Handler:
             file.close()
 
 
-    def _iot_update_loop(self):
-        while True:
-            if self.iot_object:
-                if self.iot_object.get_iot_status():
-                    self.update_queue.put(("iot", self.iot_object.feature_topics))
-            time.sleep(3)  
+    def _restore_state(self) -> Dict[str,int]:
+        # registers what the store saves and reads back what the previous run saved; mails and video events are on disk already
+        restored = {}
+        if not self.state_store:
+            return restored
+        store = self.state_store
+        if self.iot_object:
+            store.register("iot", self.iot_object.ingest.dump)
+            restored["iot"] = self.iot_object.ingest.restore(store.get("iot", {}))
+        if self.google_object:
+            store.register("workspace", lambda: self.workspace.data)
+            workspace = store.get("workspace")
+            if workspace:
+                # JSON made the mail indexes strings
+                self.workspace.publish({**workspace, "mail" : {int(index) : mail for index, mail in (workspace.get("mail") or {}).items()}})
+                restored["workspace"] = 1
+        if self.news_aggregator and not self.pool:
+            # an AgentHost aggregator is shared by the tenants, none of them owns its state
+            store.register("news", self.news_aggregator.dump_state)
+            restored["news"] = self.news_aggregator.restore_state(store.get("news", {}))
+        return restored
+
+
+    def _refresh_iot_context(self, force:bool=False) -> bool:
+        if not force and not self.iot_object.get_iot_status():
+            return False
+        version = self.iot_object.ingest.topics_version
+        changed, self.iot_topics_version = version != self.iot_topics_version, version
+        if changed:
+            topics = self.iot_object.get_feature_topics()
+            self.context.update(lambda context: {**context, "IoTSystemTopics" : topics})
+        return changed
+
+
+    def _sync_google(self) -> bool:
+        added = self.google_object.sync_emails(store=self.mail_store, max_results=self.mail_sync_limit)
+        calendar = self.google_object.get_events(max_results=1000)
+        current = self.workspace.data
+        previous = current["calendar"] if current else None
+        if added or calendar != previous or current is None:
+            # a new version only when something changed, its number is the workspace state version
+            self.workspace.publish({
+                                    "mail": self.mail_store.recent(limit=self.recent_mails), # only the newest, the rest stays on disk
+                                    "calendar": calendar
+                                   })
+
+        if added:
+            self._emit("mail", self.mail_store.recent(limit=added))
+        changes = self._calendar_changes(previous, calendar)
+        if changes:
+            self._emit("calendar", changes)
+        return bool(added or changes)
+
 
+    def _calendar_changes(self, previous, calendar) -> List[Dict[str,Any]]:
+        # get_events returns {"Events": "No up coming events"} when empty, events otherwise
+        def events(value):
+            return [event for event in value.values() if isinstance(event, dict)] if isinstance(value, dict) else []
+        known = {(event.get("Event"), event.get("Start")) for event in events(previous)}
+        return [event for event in events(calendar) if (event.get("Event"), event.get("Start")) not in known] if previous is not None else []
 
-    def _google_update_loop(self):
-        while True:
-            if self.google_object :
-                time.sleep(60) #1min 
-                with self.workspace_lock : 
-                    self.google_data = {
-                                        "mail": self.google_object.get_emails(max_results=1000),
-                                        "calendar": self.google_object.get_events(max_results=1000)
-                                      }
+
+    def close(self):
+        # stops this tenant's tasks and connection, shared services keep running
+        if self.state_store:
+            self.state_store.save()
+        self.scheduler.shutdown()
+        if self.iot_object:
+            self.iot_object.stop = True
+            self.iot_object._clean_aws_client()
+        if self.mail_outbox:
+            self.mail_outbox.stop = True
+        if self.parse_pool and not self.pool:
+            self.parse_pool.shutdown()
+
+
+    def add_listener(self, listener:Callable[[str, Any], None]):
+        self.listeners.append(listener)
+
+
+    def _emit(self, kind:str, payload):
+        for listener in self.listeners:
+            try:
+                listener(kind, payload)
+            except Exception as e:
+                print(f"Exception {e}")
                
+    def get_context_digest(self) -> str:
+        # content hash of the context, recomputed only when its version moved; stable across restarts
+        snapshot = self.context.get()
+        version, digest = self.context_digest
+        if version != snapshot.version or digest is None:
+            digest = hashlib.sha256(json.dumps(snapshot.data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+            self.context_digest = (snapshot.version, digest)
+        return digest
+
+
+    def state_version(self, source:str) -> Any:
+        # "context", "iot", "iot:<topic>", "workspace" or "news"; equal values mean the model would see the same thing
+        if source == "context":
+            return self.get_context_digest()
+        if source == "workspace":
+            return f"{self.epoch}:{self.workspace.version}"
+        if source == "video":
+            return f"{self.epoch}:{self.video_events.version}"
+        if source == "news":
+            return f"{self.epoch}:{self.news_aggregator.cursor}" if self.news_aggregator else None
+        if source == "iot":
+            return f"{self.epoch}:{self.iot_object.ingest.state_version}" if self.iot_object else None
+        if source.startswith("iot:"):
+            # the reading itself, other sensors of the same thing do not invalidate it and it holds across restarts
+            return json.dumps(self.iot_object.get_state(source[4:]), default=str) if self.iot_object else None
+        return None
+
+
+    def memory_usage(self) -> Dict[str,Any]:
+        # estimated bytes per subsystem; the news aggregator of an AgentHost is shared, every tenant reports the same one
+        usage = {
+                 "document"  : deep_size(self.Document),
+                 "context"   : deep_size(self.context.data),
+                 "workspace" : deep_size(self.workspace.data),
+                 "video"     : self.video_events.memory_usage(),
+                }
+        if self.iot_object:
+            usage["iot"] = self.iot_object.memory_usage()
+        if self.mail_store:
+            usage["mail"] = {**self.mail_store.memory_usage(), "outbox_pending" : self.mail_outbox.pending()}
+        if self.news_aggregator:
+            usage["news"] = {**self.news_aggregator.memory_usage(), "shared" : self.pool is not None}
+        return usage
+
+
     def get_worspace_data(self):
-        with self.workspace_lock : 
-            return self.google_data
-
-
-    def _update_news(self):
-        if self.webscraper : 
-            while True : 
-                self.news = self.webscraper.get_news()
-                time.sleep(600)
-
-    def _process_updates(self):
-        while True:
-            update_type, data = self.update_queue.get()
-            with self.context_lock:
-                if update_type == "iot":
-                    self.context["IoTSystemTopics"] = data       
-            self.update_queue.task_done()
-
-    def get_mails(self):
-        return self.google_data["mail"]
+        return self.workspace.data
+
+
+    def get_mails(self, limit:int=5, offset:int=0):
+        return self.mail_store.recent(limit=limit, offset=offset)
+
+    def queue_mail(self, to:str, subject:str, body:str) -> str:
+        return self.mail_outbox.enqueue(to=to, subject=subject, body=body)
+
+    def get_mail_status(self, mail_id:str):
+        return self.mail_outbox.status(mail_id)
+
+    def count_mails(self):
+        return self.mail_store.count()
+
+    def search_mails(self, query:Optional[str]=None, since:Optional[str]=None, limit:int=10):
+        return self.mail_store.search(query=query, since=since, limit=limit)
     
     def get_events(self):
-        return self.google_data["calendar"]
+        workspace = self.workspace.data
+        return workspace["calendar"] if workspace else {"Events" : "Calendar not synchronised yet"}
     
-    def get_news(self):
-        return self.news
+    def add_video_event(self, camera:str, path:str, description:str, at:Optional[float]=None, **details) -> Dict[str,Any]:
+        return self.video_events.append(camera=camera, path=path, description=description, at=at, **details)
+
+
+    def get_video_events(self, since:Optional[str]=None, until:Optional[str]=None, camera:Optional[str]=None, limit:int=20):
+        return self.video_events.range(since=parse_time(since), until=parse_time(until), camera=camera or None, limit=limit)
+
+
+    def get_video_cameras(self) -> List[str]:
+        return self.video_events.cameras()
+
+
+    def get_news(self, since:Optional[int]=None, limit:Optional[int]=None):
+        return self.news_aggregator.get_news(since=since, limit=limit)
+
+    def get_news_cursor(self):
+        return self.news_aggregator.cursor
     
     def get_news_source(self):
-        return self.webscraper.source
+        return self.news_aggregator.source
+
+    def get_news_health(self):
+        return self.news_aggregator.get_health()
 
     def get_context(self):
-        with self.context_lock:
-            return json.dumps(self.context.copy())
+        return json.dumps(self.context.data)
@@ -0,0 +1,45 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Any, Optional, Callable, Hashable
+
+from .scheduler import Scheduler
+from .news_aggregator import NewsAggregator
+from .model_governor import ModelGovernor
+from .parse_pool import ParsePool
+
+
+class ServicePool:
+    # tenant independent resources shared by every agent of an AgentHost
+    def __init__(self, workers:int=8, tool_workers:int=8, governor:Optional[Dict[str,Any]]=None, parsing:Optional[Dict[str,Any]]=None,
+                 tenant_workers:Optional[int]=None):
+        # a tenant holds half the workers at most, a stuck household cannot delay every other one
+        self.scheduler:Scheduler              = Scheduler(workers=workers, scope_workers=tenant_workers or max(1, workers // 2))
+        self.governor:ModelGovernor           = ModelGovernor(**(governor or {})) # one model quota for every tenant
+        self.tool_executor:ThreadPoolExecutor = ThreadPoolExecutor(max_workers=tool_workers, thread_name_prefix="tools")
+        self.parse_pool:ParsePool             = ParsePool(**(parsing or {})) # one set of parse processes for every tenant
+        self.resources:Dict[Hashable,Any]     = {}
+        self.lock:Lock                        = Lock()
+
+
+    def shared(self, key:Hashable, create:Callable[[], Any]) -> Any:
+        # created once per key, the first tenant asking pays for it
+        with self.lock:
+            if key not in self.resources:
+                self.resources[key] = create()
+            return self.resources[key]
+
+
+    def news(self, config:Dict[str,Any]) -> NewsAggregator:
+        # tenants with the same news configuration read the same aggregator, every site is fetched once
+        def create():
+            aggregator = NewsAggregator.from_config(config, parser=self.parse_pool)
+            aggregator.start()
+            return aggregator
+        return self.shared(("news", json.dumps(config, sort_keys=True, default=str)), create)
+
+
+    def shutdown(self):
+        self.scheduler.shutdown()
+        self.tool_executor.shutdown(wait=False)
+        self.parse_pool.shutdown()
@@ -0,0 +1,142 @@
+from threading import Lock
+from typing import Dict, Any, List, Optional, Callable, Hashable, Tuple
+
+
+# copy on write state shared between the service threads and the tool calls: a published value is never mutated again,
+# writers replace it with a new one in a single reference assignment, atomic under the GIL, so readers need no lock
+
+
+class Snapshot:
+    __slots__ = ("version", "data")
+
+    def __init__(self, version:int, data:Any):
+        self.version:int = version
+        self.data:Any    = data
+
+
+class Published:
+    # a value replaced as a whole: the workspace data after a sync, the context after the IoT topics changed
+    def __init__(self, data:Any=None):
+        self.current:Snapshot = Snapshot(0, data)
+        self.lock:Lock        = Lock() # writers only, a read is one attribute load
+
+
+    def get(self) -> Snapshot:
+        return self.current
+
+
+    @property
+    def data(self) -> Any:
+        return self.current.data
+
+
+    @property
+    def version(self) -> int:
+        return self.current.version
+
+
+    def publish(self, data:Any) -> Snapshot:
+        with self.lock:
+            self.current = Snapshot(self.current.version + 1, data)
+            return self.current
+
+
+    def update(self, function:Callable[[Any], Any]) -> Snapshot:
+        # function builds the new value from the current one, it must not modify it
+        with self.lock:
+            self.current = Snapshot(self.current.version + 1, function(self.current.data))
+            return self.current
+
+
+class SnapshotMap:
+    # a dict written entry by entry at a high rate, the sensor readings of every thing; copying it on each write would
+    # cost O(things) per message, so a reader takes the copy instead, at most once per version, and shares it
+    def __init__(self):
+        self.entries:Dict[Hashable,Any] = {} # written by the writers only, never handed out
+        self.version:int      = 0
+        self.cached:Snapshot  = Snapshot(0, {})
+        self.lock:Lock        = Lock() # writers only
+
+
+    def __setitem__(self, key:Hashable, value:Any):
+        with self.lock:
+            self.entries[key] = value
+            self.version += 1
+
+
+    def get(self, key:Hashable, default:Any=None) -> Any:
+        return self.entries.get(key, default) # one dict lookup, atomic
+
+
+    def __getitem__(self, key:Hashable) -> Any:
+        return self.entries[key]
+
+
+    def __contains__(self, key:Hashable) -> bool:
+        return key in self.entries
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+    def snapshot(self) -> Snapshot:
+        cached = self.cached
+        version = self.version # read before the copy: the copy is at least this recent, a newer write only triggers another copy
+        if cached.version == version:
+            return cached
+        # dict.copy runs in C without releasing the GIL, a concurrent insert can not tear it
+        cached = Snapshot(version, self.entries.copy())
+        self.cached = cached # two readers racing here both publish a valid copy
+        return cached
+
+
+class ShardedSnapshotMap:
+    # a SnapshotMap per partition of the keys, lock striped: writers of different things take different locks and a reader
+    # only recopies the partitions written since its last snapshot; same interface as SnapshotMap
+    def __init__(self, shards:int=16):
+        self.shards:List[SnapshotMap] = [SnapshotMap() for _ in range(max(1, shards))]
+        # (shard versions, merged snapshot) in one attribute, a reader never pairs a merge with the wrong versions
+        self.cached:Tuple[Tuple[int,...], Snapshot] = (tuple(0 for _ in self.shards), Snapshot(0, {}))
+
+
+    def _shard(self, key:Hashable) -> SnapshotMap:
+        return self.shards[hash(key) % len(self.shards)]
+
+
+    def __setitem__(self, key:Hashable, value:Any):
+        self._shard(key)[key] = value
+
+
+    def get(self, key:Hashable, default:Any=None) -> Any:
+        return self._shard(key).get(key, default)
+
+
+    def __getitem__(self, key:Hashable) -> Any:
+        return self._shard(key)[key]
+
+
+    def __contains__(self, key:Hashable) -> bool:
+        return key in self._shard(key)
+
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+
+    @property
+    def version(self) -> int:
+        return sum(shard.version for shard in self.shards) # every write bumps one shard, the sum only grows
+
+
+    def snapshot(self) -> Snapshot:
+        versions, cached = self.cached
+        current = tuple(shard.version for shard in self.shards) # read before the copies, as in SnapshotMap
+        if current == versions:
+            return cached
+        data = {}
+        for shard in self.shards:
+            data.update(shard.snapshot().data) # unchanged shards hand back their cached copy
+        cached = Snapshot(sum(current), data)
+        self.cached = (current, cached) # racing readers both publish a valid merge
+        return cached
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import time
+from threading import Lock
+from typing import Dict, Any, List, Optional, Callable
+
+
+class StateStore:
+    # warm restarts: named sections of in memory state saved to one JSON file, read back before the services revalidate them;
+    # every save is a new version written next to the file and renamed over it, the previous ones are kept as path.1, path.2...
+    FORMAT = 1 # bumped when a section changes shape, older files are then ignored
+
+    def __init__(self, path:str="agent_state.json", interval:float=30, max_age:Optional[float]=24 * 3600, keep:int=2):
+        self.path:str                = path
+        self.interval:float          = interval
+        self.max_age:Optional[float] = max_age # older state is a worse start than none, mails and readings moved on
+        self.keep:int                = max(1, keep)
+        self.sections:Dict[str,Callable[[], Any]] = {} # name -> function returning the JSON serialisable state
+        self.loaded:Dict[str,Any]    = {}
+        self.version:int             = 0
+        self.saved_at:Optional[float] = None
+        self.digest:Optional[str]    = None # of the last written sections, an unchanged state is not written again
+        self.lock:Lock               = Lock()
+        self.counters:Dict[str,int]  = {"saves" : 0, "unchanged" : 0, "errors" : 0}
+        self._load()
+
+
+    def _generations(self) -> List[str]:
+        return [self.path] + [f"{self.path}.{index}" for index in range(1, self.keep)]
+
+
+    def _load(self):
+        # the newest readable generation wins, a torn or foreign file falls back to the previous one
+        for path in self._generations():
+            try:
+                with open(path, "r") as file:
+                    state = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(state, dict) or state.get("format") != self.FORMAT:
+                continue
+            self.version = state.get("version", 0) # numbering goes on even when the content is too old to use
+            if self.max_age and time.time() - state.get("saved_at", 0) > self.max_age:
+                return
+            self.loaded = state.get("sections", {})
+            self.saved_at = state.get("saved_at")
+            return
+
+
+    def register(self, name:str, dump:Callable[[], Any]):
+        self.sections[name] = dump
+
+
+    def get(self, name:str, default:Any=None) -> Any:
+        # the section as saved by the previous run, default when there was none
+        return self.loaded.get(name, default)
+
+
+    def start(self, scheduler):
+        scheduler.every("state.save", self.save, interval=self.interval)
+
+
+    def save(self) -> bool:
+        with self.lock:
+            sections = {}
+            for name, dump in self.sections.items():
+                try:
+                    sections[name] = dump()
+                except Exception as e:
+                    # one failing section keeps what the file had, the others are still saved
+                    self.counters["errors"] += 1
+                    print(f"Failed to save the {name} state. Exception: {e}")
+                    if name in self.loaded:
+                        sections[name] = self.loaded[name]
+            body = json.dumps(sections, default=str)
+            digest = hashlib.sha256(body.encode()).hexdigest()
+            if digest == self.digest:
+                self.counters["unchanged"] += 1
+                return False
+
+            now = time.time()
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w") as file:
+                file.write(f'{{"format": {self.FORMAT}, "version": {self.version + 1}, "saved_at": {now}, "sections": {body}}}')
+                file.flush()
+                os.fsync(file.fileno()) # on disk before the rename, a crash never leaves a renamed empty file
+            generations = self._generations()
+            for older, newer in reversed(list(zip(generations[1:], generations[:-1]))):
+                if os.path.exists(newer):
+                    os.replace(newer, older)
+            os.replace(temporary, self.path)
+
+            self.version += 1
+            self.saved_at = now
+            self.digest = digest
+            self.loaded = sections
+            self.counters["saves"] += 1
+            return True
+
+
+    def stats(self) -> Dict[str,Any]:
+        with self.lock:
+            return {"version" : self.version, "saved_at" : self.saved_at, "sections" : list(self.sections), **self.counters}
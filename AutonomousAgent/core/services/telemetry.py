@@ -0,0 +1,187 @@
+import functools
+import json
+import os
+import time
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue
+from threading import Thread, Lock
+from typing import Dict, Any, List, Optional, Tuple
+
+from .iot_commands import LatencyHistogram
+from .memory import rss_bytes
+
+
+class SpanHistogram(LatencyHistogram):
+    # MQTT ingest is in the microseconds, model calls in the seconds
+    BUCKETS:Tuple[float,...] = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+_current_span:ContextVar = ContextVar("span", default=None)
+
+
+class Span:
+    __slots__ = ("telemetry", "name", "attrs", "span_id", "parent", "trace_id", "start", "started_at", "token")
+
+    def __init__(self, telemetry:"Telemetry", name:str, attrs:Dict[str,Any]):
+        self.telemetry = telemetry
+        self.name      = name
+        self.attrs     = attrs
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.span_id    = os.urandom(8).hex()
+        self.parent     = parent.span_id if parent else None
+        self.trace_id   = parent.trace_id if parent else self.span_id
+        self.token      = _current_span.set(self)
+        self.started_at = time.time()
+        self.start      = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self.token)
+        self.telemetry._finish(self, duration, repr(exc) if exc else None)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Telemetry:
+    # spans with counters and latency histograms; span() costs one attribute check while disabled
+    def __init__(self):
+        self.enabled:bool = False
+        self.lock:Lock    = Lock()
+        self.calls:Dict[str,int]    = {}
+        self.errors:Dict[str,int]   = {}
+        self.histograms:Dict[str,SpanHistogram] = {}
+        self.trace_queue:Optional[Queue] = None
+        self.server:Optional[ThreadingHTTPServer] = None
+
+
+    def configure(self, enabled:bool=True, prometheus_port:Optional[int]=None, prometheus_host:str="127.0.0.1", trace_file:Optional[str]=None):
+        if trace_file and not self.trace_queue:
+            self.trace_queue = Queue()
+            Thread(target=self._write_traces, args=(trace_file,), daemon=True).start()
+        if prometheus_port and not self.server:
+            self.server = ThreadingHTTPServer((prometheus_host, prometheus_port), self._metrics_handler())
+            Thread(target=self.server.serve_forever, daemon=True).start()
+        self.enabled = enabled
+
+
+    def span(self, name:str, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attrs)
+
+
+    def _finish(self, span:Span, duration:float, error:Optional[str]):
+        with self.lock:
+            self.calls[span.name] = self.calls.get(span.name, 0) + 1
+            if error:
+                self.errors[span.name] = self.errors.get(span.name, 0) + 1
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = SpanHistogram()
+            histogram.observe(duration)
+
+        if self.trace_queue is not None:
+            self.trace_queue.put({
+                                  "name"        : span.name,
+                                  "trace_id"    : span.trace_id,
+                                  "span_id"     : span.span_id,
+                                  "parent"      : span.parent,
+                                  "start"       : span.started_at,
+                                  "duration_ms" : round(duration * 1000, 3),
+                                  "error"       : error,
+                                  "attrs"       : span.attrs,
+                                 })
+
+
+    def _write_traces(self, path:str):
+        with open(path, "a") as file:
+            while True:
+                records = [self.trace_queue.get()]
+                while not self.trace_queue.empty() and len(records) < 512:
+                    records.append(self.trace_queue.get())
+                file.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+                file.flush()
+
+
+    def snapshot(self) -> Dict[str,Dict[str,Any]]:
+        with self.lock:
+            return {name : {**histogram.snapshot(), "errors" : self.errors.get(name, 0)} for name, histogram in self.histograms.items()}
+
+
+    def render_prometheus(self) -> str:
+        lines:List[str] = [
+                           "# TYPE agent_span_total counter",
+                           "# TYPE agent_span_errors_total counter",
+                           "# TYPE agent_span_duration_seconds histogram",
+                           "# TYPE agent_process_resident_bytes gauge",
+                           f"agent_process_resident_bytes {rss_bytes()}",
+                          ]
+        with self.lock:
+            for name, value in sorted(self.calls.items()):
+                lines.append(f'agent_span_total{{span="{name}"}} {value}')
+            for name, value in sorted(self.errors.items()):
+                lines.append(f'agent_span_errors_total{{span="{name}"}} {value}')
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'agent_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'agent_span_duration_seconds_sum{{span="{name}"}} {histogram.total}')
+                lines.append(f'agent_span_duration_seconds_count{{span="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+    def _metrics_handler(self):
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+
+telemetry = Telemetry()
+
+
+def traced(name:str):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not telemetry.enabled:
+                return function(*args, **kwargs)
+            with Span(telemetry, name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,155 @@
+import bisect
+import json
+import os
+import time
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Any, List, Optional
+
+from .memory import deep_size
+
+
+class VideoEventLog:
+    # append only log of video analyses, ordered by the time of the clip; one JSON line per event on disk
+    def __init__(self, path:Optional[str]="video_events.jsonl", max_age:float=7 * 24 * 3600, max_events:int=10000,
+                 max_bytes:Optional[int]=None):
+        self.path:Optional[str] = path # None keeps the log in memory
+        self.max_age:float      = max_age
+        self.max_events:int     = max_events
+        self.max_bytes:Optional[int] = max_bytes # descriptions are free text of any length
+        self.times:List[float]  = [] # sorted, searched with bisect
+        self.events:List[Dict[str,Any]] = []
+        self.sizes:List[int]    = [] # estimated bytes of each event, same order
+        self.bytes:int          = 0
+        self.version:int        = 0 # bumped on every append, see Handler.state_version
+        self.dropped:int        = 0 # events pruned since the file was last rewritten
+        self.lock:Lock          = Lock()
+        self._load()
+
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # a line cut by a crash, the next compaction drops it
+                self._insert(event)
+        self._prune(time.time())
+        self._compact()
+
+
+    def _insert(self, event:Dict[str,Any]):
+        # clips are analysed out of order, the lists stay sorted by bisect insertion
+        index = bisect.bisect_right(self.times, event["at"])
+        self.times.insert(index, event["at"])
+        self.events.insert(index, event)
+        self.sizes.insert(index, deep_size(event))
+        self.bytes += self.sizes[index]
+
+
+    def _prune(self, now:float) -> int:
+        # retention: older than max_age, beyond max_events or over max_bytes, oldest first
+        cut = bisect.bisect_left(self.times, now - self.max_age) if self.max_age else 0
+        cut = max(cut, len(self.times) - self.max_events)
+        if self.max_bytes is not None:
+            kept = self.bytes - sum(self.sizes[:cut])
+            while kept > self.max_bytes and cut < len(self.times) - 1:
+                kept -= self.sizes[cut]
+                cut += 1
+        if cut > 0:
+            self.bytes -= sum(self.sizes[:cut])
+            del self.times[:cut]
+            del self.events[:cut]
+            del self.sizes[:cut]
+            self.dropped += cut
+        return cut
+
+
+    def _compact(self):
+        # rewrite the file once it holds as many pruned lines as live ones, atomically so a crash keeps the old file
+        if not self.path or self.dropped < max(1, len(self.events)):
+            return
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as file:
+            for event in self.events:
+                file.write(json.dumps(event) + "\n")
+        os.replace(temporary, self.path)
+        self.dropped = 0
+
+
+    def append(self, camera:str, path:str, description:str, at:Optional[float]=None, **details) -> Dict[str,Any]:
+        event = {
+                 "at"          : at if at is not None else time.time(),
+                 "camera"      : camera,
+                 "path"        : path,
+                 "description" : description,
+                 **details
+                }
+        with self.lock:
+            self._insert(event)
+            if self.path:
+                with open(self.path, "a") as file:
+                    file.write(json.dumps(event) + "\n")
+            self._prune(time.time())
+            self._compact()
+            self.version += 1
+        return event
+
+
+    def retained(self, at:float, now:Optional[float]=None) -> bool:
+        # whether an event of a clip stamped at would survive _prune; False for clips pruned before a restart,
+        # older than max_age or older than everything kept in a log already full
+        now = time.time() if now is None else now
+        with self.lock:
+            if self.max_age and at < now - self.max_age:
+                return False
+            if not self.times or at >= self.times[0]:
+                return True
+            full = len(self.times) >= self.max_events
+            if self.max_bytes is not None:
+                full = full or self.bytes + self.bytes / len(self.times) > self.max_bytes
+            return not full
+
+
+    def range(self, since:Optional[float]=None, until:Optional[float]=None, camera:Optional[str]=None,
+              limit:Optional[int]=None) -> List[Dict[str,Any]]:
+        # events with since <= at <= until in time order, the newest ones when limit cuts the window
+        with self.lock:
+            start = bisect.bisect_left(self.times, since) if since is not None else 0
+            end = bisect.bisect_right(self.times, until) if until is not None else len(self.times)
+            events = [event for event in self.events[start:end] if camera is None or event["camera"] == camera]
+        return events[-limit:] if limit else events
+
+
+    def cameras(self) -> List[str]:
+        with self.lock:
+            return sorted({event["camera"] for event in self.events})
+
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+
+    def memory_usage(self) -> Dict[str,Any]:
+        with self.lock:
+            return {"events" : len(self.events), "bytes" : self.bytes, "max_bytes" : self.max_bytes}
+
+
+def parse_time(value:Any) -> Optional[float]:
+    # tool arguments come as YYYY-MM-DD[ HH:MM:SS] strings, ISO timestamps or epoch seconds
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
@@ -1,8 +1,10 @@
 from .assistance_interface import AssistantInterface
 from .service_interface import ServiceInterface
+from .transport_interface import TransportInterface
 
 
 __all__ = [
     "AssistantInterface", 
-    "ServiceInterface"
+    "ServiceInterface",
+    "TransportInterface"
 ]
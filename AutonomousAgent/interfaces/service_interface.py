@@ -14,10 +14,18 @@ class ServiceInterface(ABC):
     def get_mails(self,id:Optional[int]=None, number_of_mail:Optional[int]=None) -> Dict[str,Any]:
         pass 
 
+    @abstractmethod
+    def search_mails(self, query:Optional[str]=None, since:Optional[str]=None, limit:Optional[int]=None) -> Dict[str,Any]:
+        pass 
+
     @abstractmethod
     def send_mail(self, to:str, subject:str, body:str) -> Dict[str,Any] :
         pass 
 
+    @abstractmethod
+    def get_mail_status(self, id:str) -> Dict[str,Any] :
+        pass 
+
     @abstractmethod
     def get_events(self) -> Dict[Any,Any] :
         pass 
@@ -26,6 +34,10 @@ class ServiceInterface(ABC):
     def set_event(self, summary:str, start_time:str, end_time:str, location:Optional[str] = None, description:Optional[str] = None) -> Dict[str,Any]:
         pass 
 
+    @abstractmethod
+    def set_events(self, events:List[Dict[str,Any]]) -> Dict[str,Any]:
+        pass 
+
     @abstractmethod
     def get_context(self)->Dict:
         pass 
@@ -0,0 +1,38 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, List
+
+
+class TransportInterface(ABC):
+    onOnline:Optional[Callable[[], None]]  = None
+    onOffline:Optional[Callable[[], None]] = None
+
+    @abstractmethod
+    def network_available(self) -> bool:
+        pass 
+
+    @abstractmethod
+    def connect(self) -> bool:
+        pass 
+
+    @abstractmethod
+    def disconnect(self) -> bool:
+        pass 
+
+    @abstractmethod
+    def subscribe(self, topic:str, QoS:int, callback:Callable) -> bool:
+        pass 
+
+    @abstractmethod
+    def unsubscribe(self, topic:str) -> bool:
+        pass 
+
+    @abstractmethod
+    def publish(self, topic:str, payload, QoS:int) -> bool:
+        pass 
+
+    def subscribe_many(self, topics:List[str], QoS:int, callback:Callable) -> bool:
+        # one request for several topics where the transport has it, one at a time otherwise
+        return all([self.subscribe(topic, QoS, callback) for topic in topics])
+
+    def unsubscribe_many(self, topics:List[str]) -> bool:
+        return all([self.unsubscribe(topic) for topic in topics]) 
@@ -5,6 +5,8 @@ from typing import List
 class ItemConfig:
     type : str 
     enum: List[str] = field(default_factory=list)
+    properties: List["ParamConfig"] = field(default_factory=list) # for items of type object
+    required: List[str] = field(default_factory=list)
 
 @dataclass
 class ParamConfig:
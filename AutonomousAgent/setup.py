@@ -16,7 +16,8 @@ setup(
         'google-generativeai',
         'AWSIoTPythonSDK==1.5.4',
         "bs4",
-        'python-dotenv' 
+        'python-dotenv',
+        'numpy'
     ],
     classifiers=[
         'Development Status :: 3 - Alpha',
@@ -0,0 +1,14 @@
+from .fake_gemini import FakeGemini, FakeGenerativeModel, FakeChat, FakeResponse
+from .fake_devices import EchoDevice
+from .fake_audio import FakeSynthesizer, conversation, write_wav
+
+__all__ = [
+    "FakeGemini",
+    "FakeGenerativeModel",
+    "FakeChat",
+    "FakeResponse",
+    "EchoDevice",
+    "FakeSynthesizer",
+    "conversation",
+    "write_wav",
+]
@@ -0,0 +1,60 @@
+import time
+import wave
+from threading import Lock
+from typing import List, Tuple
+
+import numpy as np
+
+
+def voiced(seconds:float, rate:int=16000, level:float=0.3, seed:int=0) -> np.ndarray:
+    # speech like enough for the detector: a few harmonics of a wandering pitch, opened and closed four times a second
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, np.pi))
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    signal = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 6))
+    syllables = 0.35 + 0.65 * np.abs(np.sin(2 * np.pi * 2 * t))
+    return level * signal * syllables / np.max(np.abs(signal))
+
+
+def noise(seconds:float, rate:int=16000, level:float=0.003, seed:int=0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(0, level, int(seconds * rate))
+
+
+def write_wav(path:str, samples:np.ndarray, rate:int=16000):
+    with wave.open(path, "wb") as target:
+        target.setnchannels(1)
+        target.setsampwidth(2)
+        target.setframerate(rate)
+        target.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+
+
+def conversation(path:str, layout:List[Tuple[str,float]], rate:int=16000, seed:int=0) -> List[Tuple[float,float]]:
+    # writes ("silence", seconds) and ("speech", seconds) parts over a noisy room, returns where the speech is
+    parts, spoken, position = [], [], 0.0
+    for index, (kind, seconds) in enumerate(layout):
+        part = noise(seconds, rate, seed=seed + index)
+        if kind == "speech":
+            part = part + voiced(seconds, rate, seed=seed + index)
+            spoken.append((position, position + seconds))
+        parts.append(part)
+        position += seconds
+    write_wav(path, np.concatenate(parts), rate)
+    return spoken
+
+
+class FakeSynthesizer:
+    # text_to_speech backend: 16 bit silence as long as the text would take to say, after delay seconds per character
+    def __init__(self, rate:int=16000, seconds_per_char:float=0.06, delay_per_char:float=0.002, delay:float=0.05):
+        self.rate:int               = rate
+        self.seconds_per_char:float = seconds_per_char
+        self.delay_per_char:float   = delay_per_char
+        self.delay:float            = delay # per call, what a round trip costs
+        self.texts:List[str]        = []
+        self.lock:Lock              = Lock()
+
+    def __call__(self, text:str) -> bytes:
+        with self.lock:
+            self.texts.append(text)
+        time.sleep(self.delay + self.delay_per_char * len(text))
+        return bytes(2 * int(self.rate * self.seconds_per_char * len(text)))
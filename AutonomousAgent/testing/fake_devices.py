@@ -0,0 +1,46 @@
+import json
+import random
+from typing import Dict, Any, List
+
+from ..core.services.iot_transport import FakeBroker
+
+
+class EchoDevice:
+    # an IoT thing on the fake broker: publishes its topics and readings, applies CMD messages and echoes the new state
+    def __init__(self, broker:FakeBroker, thing:str, lights:int=4, sensors:int=8, seed:int=0):
+        self.broker:FakeBroker = broker
+        self.thing:str         = thing
+        self.rng               = random.Random(seed)
+        self.features:Dict[str,List[str]] = {
+                                             "lights"  : [f"{thing}/light{i}/command" for i in range(lights)],
+                                             "sensors" : [f"{thing}/sensor{i}" for i in range(sensors)]
+                                            }
+        self.state:Dict[str,Any] = {f"{thing}/sensor{i}" : 0.0 for i in range(sensors)}
+        self.state.update({f"{thing}/light{i}/state" : "OFF" for i in range(lights)})
+
+        self.transport = broker.client(f"device_{thing}")
+        self.transport.connect()
+        self.transport.subscribe(f"{thing}/sub", 1, self._on_command)
+
+
+    def announce(self):
+        self.transport.publish(f"{self.thing}/topics", json.dumps(self.features), 1)
+        self.report()
+
+
+    def report(self):
+        for key in self.state:
+            if not key.endswith("/state"):
+                self.state[key] = round(self.rng.uniform(0, 100), 2)
+        self.transport.publish(f"{self.thing}/data/all", json.dumps(self.state), 1)
+
+
+    def _on_command(self, client, userdata, message):
+        msg = json.loads(message.payload)
+        if msg.get("type") != "CMD":
+            return
+        for topic, state in zip(msg["topic_names"], msg["states"]):
+            key = f"{topic[:-len('/command')]}/state" if topic.endswith("/command") else topic
+            if key in self.state:
+                self.state[key] = state
+        self.transport.publish(f"{self.thing}/data/all", json.dumps(self.state), 1)
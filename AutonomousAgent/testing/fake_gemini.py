@@ -0,0 +1,240 @@
+import random
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import google.api_core.exceptions
+
+
+# a scripted step is either the text of the reply or the function calls of the turn: [("iot_get_states", {"topics": [...]}), ...]
+Step = Union[str, List[Tuple[str, Dict[str, Any]]]]
+
+
+class FakeFunctionCall:
+    __slots__ = ("name", "args")
+
+    def __init__(self, name:str, args:Dict[str,Any]):
+        self.name = name
+        self.args = args
+
+    def __bool__(self):
+        return bool(self.name)
+
+
+class FakePart:
+    __slots__ = ("text", "function_call")
+
+    def __init__(self, text:str="", function_call:Optional[FakeFunctionCall]=None):
+        self.text          = text
+        self.function_call = function_call or FakeFunctionCall("", {})
+
+
+class FakeContent:
+    __slots__ = ("parts", "role")
+
+    def __init__(self, parts:List[FakePart], role:str="model"):
+        self.parts = parts
+        self.role  = role
+
+
+class FakeCandidate:
+    __slots__ = ("content",)
+
+    def __init__(self, content:FakeContent):
+        self.content = content
+
+
+class FakeResponse:
+    __slots__ = ("candidates",)
+
+    def __init__(self, step:Step):
+        if isinstance(step, str):
+            parts = [FakePart(text=step)]
+        else:
+            parts = [FakePart(function_call=FakeFunctionCall(name, args)) for name, args in step]
+        self.candidates = [FakeCandidate(FakeContent(parts))]
+
+    @property
+    def text(self) -> str:
+        parts = self.candidates[0].content.parts
+        if any(part.function_call for part in parts):
+            raise ValueError("The response contains a function call, not text")
+        return "".join(part.text for part in parts)
+
+
+class Latency:
+    def __init__(self, seconds:float=0, jitter:float=0, seed:int=0):
+        self.seconds = seconds
+        self.jitter  = jitter
+        self.rng     = random.Random(seed)
+        self.lock    = Lock()
+
+    def wait(self):
+        if not self.seconds and not self.jitter:
+            return
+        with self.lock:
+            delay = self.seconds + self.rng.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, delay))
+
+
+class Chunking:
+    # how a reply is cut when streamed: chunk_size characters every delay seconds after the first one
+    def __init__(self, chunk_size:int=16, delay:float=0):
+        self.chunk_size = chunk_size
+        self.delay      = delay
+
+    def split(self, step:Step) -> List[Step]:
+        if not isinstance(step, str) or not step:
+            return [step]
+        return [step[index:index + self.chunk_size] for index in range(0, len(step), self.chunk_size)]
+
+
+class Quota:
+    # server side limits: requests over the last minute and calls in flight, a 429 past either
+    def __init__(self, requests_per_minute:Optional[int]=None, max_concurrency:Optional[int]=None):
+        self.requests_per_minute:Optional[int] = requests_per_minute
+        self.max_concurrency:Optional[int]     = max_concurrency
+        self.accepted:deque = deque()
+        self.in_flight:int  = 0
+        self.rejected:int   = 0
+        self.served:int     = 0
+        self.lock:Lock      = Lock()
+
+    def enter(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.accepted and now - self.accepted[0] >= 60:
+                self.accepted.popleft()
+            if ((self.requests_per_minute is not None and len(self.accepted) >= self.requests_per_minute)
+                    or (self.max_concurrency is not None and self.in_flight >= self.max_concurrency)):
+                self.rejected += 1
+                raise google.api_core.exceptions.ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+            self.accepted.append(now)
+            self.in_flight += 1
+
+    def exit(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.served += 1
+
+
+def to_contents(history:list) -> list:
+    # the dict form the SDK accepts, turned into contents as it does
+    contents = []
+    for record in history:
+        if isinstance(record, dict):
+            parts = [FakePart(function_call=FakeFunctionCall(part["function_call"]["name"], part["function_call"].get("args", {})))
+                     if "function_call" in part else FakePart(text=part.get("text", "")) for part in record.get("parts", [])]
+            record = FakeContent(parts, role=record.get("role", "user"))
+        contents.append(record)
+    return contents
+
+
+class FakeChat:
+    # deterministic ChatSession stand-in: every send_message consumes the next scripted step, the script loops
+    def __init__(self, script:List[Step], latency:Latency, quota:Optional[Quota]=None, chunking:Optional[Chunking]=None):
+        self.script:List[Step] = script
+        self.latency:Latency   = latency
+        self.quota:Quota       = quota or Quota()
+        self.chunking:Chunking = chunking or Chunking()
+        self._history:List[Any] = []
+        self.calls:int         = 0
+        self.lock:Lock         = Lock()
+
+    @property
+    def history(self) -> List[Any]:
+        return self._history
+
+    @history.setter
+    def history(self, history:list):
+        self._history = to_contents(history)
+
+    def send_message(self, content, stream:bool=False, **kwargs):
+        self.quota.enter()
+        try:
+            with self.lock:
+                step = self.script[self.calls % len(self.script)] if self.script else "{}"
+                self.calls += 1
+                self.history.append(content)
+                self.history.append(FakeResponse(step).candidates[0].content) # the reply, as a ChatSession records it
+            self.latency.wait()
+        except BaseException:
+            self.quota.exit()
+            raise
+        chunks = self.chunking.split(step)
+        if stream:
+            return self._stream(chunks)
+        try:
+            if self.chunking.delay:
+                time.sleep(self.chunking.delay * (len(chunks) - 1)) # the whole generation, not only the first token
+        finally:
+            self.quota.exit()
+        return FakeResponse(step)
+
+    def _stream(self, chunks:List[Step]):
+        try:
+            for index, chunk in enumerate(chunks):
+                if index and self.chunking.delay:
+                    time.sleep(self.chunking.delay)
+                yield FakeResponse(chunk)
+        finally:
+            self.quota.exit()
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name:str, tools:Optional[list], script:List[Step], latency:Latency, quota:Optional[Quota]=None,
+                 chunking:Optional[Chunking]=None):
+        self.model_name = model_name
+        self.tools      = tools
+        self.script     = script
+        self.latency    = latency
+        self.quota      = quota or Quota()
+        self.chunking   = chunking or Chunking()
+        self.chats:List[FakeChat] = []
+        self.calls:int  = 0
+        self.lock:Lock  = Lock()
+
+    def start_chat(self, enable_automatic_function_calling:bool=False, history:Optional[list]=None) -> FakeChat:
+        chat = FakeChat(script=self.script, latency=self.latency, quota=self.quota, chunking=self.chunking)
+        chat.history = history or []
+        self.chats.append(chat)
+        return chat
+
+    def generate_content(self, contents, request_options:Optional[Dict[str,Any]]=None, **kwargs) -> FakeResponse:
+        # video analyses and transcriptions, the text steps of the script in turn
+        texts = [step for step in self.script if isinstance(step, str)]
+        with self.lock:
+            step = texts[self.calls % len(texts)] if texts else ""
+            self.calls += 1
+        self.quota.enter()
+        try:
+            self.latency.wait()
+        finally:
+            self.quota.exit()
+        return FakeResponse(step)
+
+
+class FakeGemini:
+    # model_factory for GoogleAgent: GoogleAgent(..., model_factory=FakeGemini(script, latency=0.2))
+    def __init__(self, script:Optional[List[Step]]=None, latency:float=0, jitter:float=0, seed:int=0,
+                 requests_per_minute:Optional[int]=None, max_concurrency:Optional[int]=None, chunk_size:int=16, chunk_delay:float=0):
+        self.script:List[Step] = list(script or [])
+        self.latency:Latency   = Latency(seconds=latency, jitter=jitter, seed=seed) # time to the first chunk
+        self.quota:Quota       = Quota(requests_per_minute=requests_per_minute, max_concurrency=max_concurrency)
+        self.chunking:Chunking = Chunking(chunk_size=chunk_size, delay=chunk_delay)
+        self.models:List[FakeGenerativeModel] = []
+
+    def __call__(self, model_name:str, tools:Optional[list]=None) -> FakeGenerativeModel:
+        model = FakeGenerativeModel(model_name=model_name, tools=tools, script=self.script, latency=self.latency, quota=self.quota,
+                                    chunking=self.chunking)
+        self.models.append(model)
+        return model
+
+    def set_script(self, script:List[Step]):
+        # in place, so chats already started pick it up on their next turn
+        self.script[:] = script
+        for model in self.models:
+            model.calls = 0
+            for chat in model.chats:
+                chat.calls = 0
@@ -0,0 +1,118 @@
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+import pytest
+
+from ..core.assistants.gemini_assistant import GoogleAgent
+from ..core.services.handler import ServiceHandler
+from ..core.services.iot_service import IoT
+from ..core.services.iot_transport import FakeBroker
+from ..testing import EchoDevice, FakeGemini
+
+
+PROMPT = Path(__file__).resolve().parent.parent / "data" / "prompt.json"
+REPLY  = json.dumps({"response" : "done"})
+
+
+def text(seed:int, words:int=40) -> str:
+    # distinct random words, far apart for the near duplicate check of the article store
+    rng = random.Random(seed)
+    return " ".join("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(words))
+
+
+@pytest.fixture
+def document(tmp_path) -> str:
+    path = tmp_path / "document.txt"
+    path.write_text("Company document.\n")
+    return str(path)
+
+
+@pytest.fixture
+def service_handler(tmp_path, document):
+    # ServiceHandler factory over the given services, closed at the end of the test
+    handlers = []
+    def build(**services) -> ServiceHandler:
+        config = {"document_path" : document, "base_context" : str(PROMPT), "video" : {"path" : str(tmp_path / "video_events.jsonl")}}
+        config.update(services)
+        handler = ServiceHandler(service_config=config)
+        handlers.append(handler)
+        return handler
+    yield build
+    for handler in handlers:
+        handler.service_handler.close()
+
+
+def wait_for(condition, timeout:float=5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class Fleet:
+    # echo devices on the fake broker, announced to an IoT service once it subscribed
+    def __init__(self, things:int=2):
+        self.broker  = FakeBroker()
+        self.names   = [f"thing{index}" for index in range(things)]
+        self.iot     = None
+        self.devices = []
+
+    def iot_config(self, **options):
+        # the "iot" section of a service config on this broker
+        return {"iot_endpoint" : None, "iot_thing_names" : self.names, "iot_root_cacert" : None, "iot_device_cert" : None,
+                "iot_private_key" : None, "transport_factory" : self.broker.client, **options}
+
+    def start(self, iot:IoT=None, **options) -> "Fleet":
+        self.iot = iot or IoT(iot_endpoint=None, iot_thing_names=self.names, iot_root_cacert_path=None, iot_device_cert_path=None,
+                              iot_private_key_path=None, transport_factory=self.broker.client, **options)
+        expected = 2 if self.iot.subscription == "wildcard" else 2 * len(self.names)
+        assert wait_for(lambda: self.broker.subscriber_count() >= expected)
+        self.devices = [EchoDevice(self.broker, name, seed=index) for index, name in enumerate(self.names)]
+        for device in self.devices:
+            device.announce()
+        self.broker.flush()
+        return self
+
+    def close(self):
+        if self.iot:
+            self.iot.stop = True
+            self.iot.scheduler.shutdown()
+
+
+@pytest.fixture
+def fleet():
+    fleets = []
+    def build(things:int=2, **options) -> Fleet:
+        fleets.append(Fleet(things).start(**options))
+        return fleets[-1]
+    yield build
+    for built in fleets:
+        built.close()
+
+
+@pytest.fixture
+def agent_factory(tmp_path, document):
+    # GoogleAgent on FakeGemini, with a fleet of echo devices when things is set
+    agents = []
+    def build(script=None, things:int=0, videos_folder:str=None, model:FakeGemini=None, **services):
+        model = model or FakeGemini(script=script or [REPLY])
+        config = {"document_path" : document, "base_context" : str(PROMPT), "video" : {"path" : str(tmp_path / "video_events.jsonl")}}
+        fleet = Fleet(things) if things else None
+        if fleet:
+            config["iot"] = fleet.iot_config(command_timeout=1)
+        config.update(services)
+        folder = videos_folder or str(tmp_path / "videos")
+        os.makedirs(folder, exist_ok=True)
+        agent = GoogleAgent(service_config=config, api_key="fake", model_name="fake-gemini", videos_folder=folder, model_factory=model)
+        agents.append(agent)
+        if fleet:
+            fleet.start(agent.service_handler.service_handler.iot_object)
+        return agent, model, fleet
+    yield build
+    for agent in agents:
+        agent.service_handler.service_handler.close()
@@ -0,0 +1,110 @@
+import json
+import threading
+
+import pytest
+
+from ..core.assistants.agent_host import AgentHost
+from ..core.services.service_pool import ServicePool
+from ..testing import FakeGemini
+from .conftest import PROMPT, wait_for
+
+
+@pytest.fixture
+def host(tmp_path, monkeypatch):
+    # tenant files are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    host = AgentHost(api_key="fake", model_name="fake-gemini", model_factory=FakeGemini(), workers=2, tool_workers=2)
+    yield host
+    host.shutdown()
+
+
+@pytest.fixture
+def add(host, tmp_path, document):
+    (tmp_path / "videos").mkdir()
+    def build(tenant:str):
+        return host.add(tenant, {"document_path" : document, "base_context" : str(PROMPT)}, str(tmp_path / "videos"))
+    return build
+
+
+def test_shared_resource_is_created_once():
+    pool = ServicePool(workers=1, tool_workers=1)
+    try:
+        created = []
+        first = pool.shared("key", lambda: created.append(1) or object())
+        assert pool.shared("key", lambda: created.append(1) or object()) is first
+        assert created == [1]
+    finally:
+        pool.shutdown()
+
+
+def test_tenant_config_keeps_files_apart(host):
+    config = host._tenant_config("alice", {"google" : {"client_credentials" : "c.json"}, "response_cache" : {"path" : "cache/responses.db"},
+                                           "state" : {}})
+    assert config["tenant"] == "alice"
+    assert config["google"] == {"client_credentials" : "c.json", "mail_store" : "alice_mail_store.db", "outbox" : "alice_mail_outbox.db"}
+    assert config["video"]["path"] == "alice_video_events.jsonl"
+    assert config["response_cache"]["path"] == "cache/alice_responses.db"
+    assert config["state"]["path"] == "alice_agent_state.json"
+
+    shared = host._tenant_config("alice", {"google" : {"mail_store" : "data/mails.db", "outbox" : "data/outbox.db"},
+                                           "video" : {"path" : "data/events.jsonl", "max_events" : 10}})
+    assert shared["google"] == {"mail_store" : "data/alice_mails.db", "outbox" : "data/alice_outbox.db"}
+    assert shared["video"] == {"path" : "data/alice_events.jsonl", "max_events" : 10}
+    assert host._tenant_config("alice", {"video" : {"path" : None}})["video"]["path"] is None # in memory
+
+
+def test_tenants_share_the_pool(host, add):
+    alice = add("alice")
+    bob = add("bob")
+    assert host.tenants() == ["alice", "bob"]
+    assert alice.governor is bob.governor is host.pool.governor
+    assert alice.tool_executor is bob.tool_executor
+    assert alice.video_analyser is bob.video_analyser
+    assert alice.service_handler.scheduler.scheduler is bob.service_handler.scheduler.scheduler is host.pool.scheduler
+    assert host.stats()["tenants"] == 2
+
+
+def test_queries_go_to_their_tenant(host, add):
+    alice = add("alice")
+    bob = add("bob")
+    host.model_factory.set_script([json.dumps({"response" : "hello"})])
+    assert json.loads(host.process_user_query("bob", "hi")) == {"response" : "hello"}
+    assert bob.llm.history[::2][-1] == "hi"
+    assert "hi" not in alice.llm.history[::2]
+
+
+def test_duplicate_and_unknown_tenants(host, add):
+    add("alice")
+    with pytest.raises(ValueError):
+        add("alice")
+    with pytest.raises(KeyError):
+        host.get("bob")
+
+
+def test_removing_a_tenant_leaves_the_others_running(host, add):
+    add("alice")
+    add("bob")
+    host.pool.scheduler.every("alice/probe", lambda: None, interval=60, delay=60)
+    host.pool.scheduler.every("bob/probe", lambda: None, interval=60, delay=60)
+    host.remove("alice")
+    assert host.tenants() == ["bob"]
+    assert not any(name.startswith("alice/") for name in host.pool.scheduler.tasks)
+    assert "bob/probe" in host.pool.scheduler.tasks
+    host.remove("alice") # already gone
+
+
+def test_a_stuck_tenant_leaves_the_others_running(host, add):
+    add("alice")
+    add("bob")
+    stuck, ticks = threading.Event(), []
+    # alice's tasks hang on a broker that never answers, they hold her share of the two workers and no more
+    alice = host.get("alice").service_handler.scheduler
+    alice.once("iot.setup", lambda: stuck.wait(5), dedicated=True)
+    alice.every("probe", lambda: stuck.wait(5), interval=60)
+    alice.every("sync", lambda: stuck.wait(5), interval=60)
+    host.get("bob").service_handler.scheduler.every("probe", lambda: ticks.append(1), interval=0.01, jitter=0)
+    try:
+        assert wait_for(lambda: len(ticks) >= 5, timeout=2)
+        assert host.pool.scheduler.busy["alice"] == 1 and host.pool.scheduler.deferred > 0
+    finally:
+        stuck.set()
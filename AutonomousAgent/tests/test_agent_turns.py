@@ -0,0 +1,63 @@
+import json
+
+from .conftest import REPLY
+
+
+def sent(model) -> list:
+    # what the agent sent in its chat, the context upload first
+    return model.models[0].chats[0].history[::2]
+
+
+def test_plain_reply(agent_factory):
+    agent, model, _ = agent_factory()
+    model.set_script([json.dumps({"response" : "hello there"})])
+    assert json.loads(agent.process_user_query("hello")) == {"response" : "hello there"}
+    assert sent(model)[1] == "hello"
+
+
+def test_tool_call_result_goes_back_to_the_model(agent_factory):
+    agent, model, fleet = agent_factory(things=1)
+    model.set_script([[("iot_get_states", {"topics" : ["thing0/sensor1"]})], REPLY])
+    assert agent.process_user_query("what is sensor1") == json.dumps({"response" : "done"})
+
+    function_response = json.loads(sent(model)[-1])
+    assert function_response == {"thing0/sensor1" : fleet.devices[0].state["thing0/sensor1"]}
+
+
+def test_parallel_tool_calls_return_together(agent_factory):
+    agent, model, fleet = agent_factory(things=1)
+    model.set_script([[("iot_get_states", {"topics" : ["thing0/sensor0"]}),
+                       ("iot_set_states", {"topics" : ["thing0/light0/command"], "states" : ["ON"]})], REPLY])
+    agent.process_user_query("check and switch")
+
+    responses = json.loads(sent(model)[-1])
+    assert [entry["function"] for entry in responses] == ["iot_get_states", "iot_set_states"]
+    assert responses[1]["response"]["thing0/light0/command"]["confirmed"] is True
+    assert fleet.devices[0].state["thing0/light0/state"] == "ON"
+
+
+def test_unknown_tool_is_reported_to_the_model(agent_factory):
+    agent, model, _ = agent_factory()
+    model.set_script([[("no_such_tool", {})], REPLY])
+    agent.process_user_query("do something")
+    assert "Error" in json.dumps(json.loads(sent(model)[-1]))
+
+
+def test_chained_tool_calls_all_go_back_to_the_model(agent_factory):
+    agent, model, fleet = agent_factory(things=1)
+    model.set_script([[("iot_get_states", {"topics" : ["thing0/sensor0"]})],
+                      [("iot_set_states", {"topics" : ["thing0/light0/command"], "states" : ["ON"]})], REPLY])
+    assert agent.process_user_query("switch on if it is dark") == json.dumps({"response" : "done"})
+
+    assert json.loads(sent(model)[-2]) == {"thing0/sensor0" : fleet.devices[0].state["thing0/sensor0"]}
+    assert json.loads(sent(model)[-1])["thing0/light0/command"]["confirmed"] is True
+    assert fleet.devices[0].state["thing0/light0/state"] == "ON"
+    assert json.loads(model.models[0].chats[0].history[-1].parts[0].text) == {"response" : "done"} # the chat ends on the answer
+
+
+def test_tool_rounds_are_bounded(agent_factory):
+    agent, model, _ = agent_factory(things=1, max_tool_rounds=3)
+    model.set_script([[("iot_get_states", {"topics" : ["thing0/sensor0"]})]])
+    before = len(agent.llm.history)
+    assert "3 rounds" in agent.process_user_query("loop forever")
+    assert len(agent.llm.history) == before + 2 and agent.llm.history[-2].parts[0].text == "loop forever"
@@ -0,0 +1,92 @@
+import math
+
+from ..core.assistants.daemon import AgentDaemon, SensorHistory, SignificanceScorer
+
+
+def test_zscore_matches_the_window_statistics():
+    history = SensorHistory(window=4)
+    for value in [1, 2, 3, 4, 5]: # the first reading falls out of the window
+        history.add(value)
+    assert list(history.values) == [2, 3, 4, 5]
+    std = math.sqrt(sum((value - 3.5) ** 2 for value in [2, 3, 4, 5]) / 4)
+    assert abs(history.zscore(8, min_samples=4) - 4.5 / std) < 1e-9
+    assert history.zscore(8, min_samples=5) is None
+
+
+def test_a_single_spike_is_not_an_incident():
+    scorer = SignificanceScorer(min_samples=10, persistence=2)
+    for index in range(30):
+        assert scorer.score_readings("hub", {"hub/temperature" : 20 + index % 2}) == []
+    assert scorer.score_readings("hub", {"hub/temperature" : 40}) == [] # one noisy sample
+    assert scorer.score_readings("hub", {"hub/temperature" : 20}) == []
+    assert scorer.score_readings("hub", {"hub/temperature" : 40}) == []
+    events = scorer.score_readings("hub", {"hub/temperature" : 41})
+    assert len(events) == 1 and events[0]["score"] >= 1.0 and events[0]["reason"].startswith("z-score")
+
+
+def test_threshold_fires_once_when_crossed():
+    scorer = SignificanceScorer(thresholds={"hub/smoke" : {"above" : 50}})
+    assert scorer.score_readings("hub", {"hub/smoke" : 10}) == []
+    events = scorer.score_readings("hub", {"hub/smoke" : 60})
+    assert events[0]["score"] == 1.0 and events[0]["reason"] == "crossed above 50"
+    assert scorer.score_readings("hub", {"hub/smoke" : 70}) == [] # still above, already reported
+
+
+def test_state_changes_score_by_watch_list():
+    scorer = SignificanceScorer(watch=["hub/door"])
+    assert scorer.score_readings("hub", {"hub/door" : "closed", "hub/light" : "off"}) == []
+    events = {event["key"] : event["score"] for event in scorer.score_readings("hub", {"hub/door" : "open", "hub/light" : "on"})}
+    assert events == {"hub/door" : 1.0, "hub/light" : 0.3}
+
+
+def test_mail_and_video_keywords():
+    scorer = SignificanceScorer()
+    mails = scorer.score_mails([{"Id" : "1", "suject" : "URGENT: alarm", "Body" : "the alarm went off"},
+                                {"Id" : "2", "suject" : "lunch", "Body" : "see you"}])
+    assert mails[0]["score"] == 2.0 and mails[0]["reason"] == "keywords alarm, urgent"
+    assert mails[1]["score"] == 0.3 and mails[1]["reason"] == "new mail"
+    video = scorer.score_video("clip.mp4", {"Video Description" : "A person walks by"})
+    assert video[0]["score"] == 0.4 # a passer-by alone does not open an incident
+
+
+def test_daemon_waits_for_things_to_settle():
+    incidents = []
+    daemon = AgentDaemon(incidents.append, debounce=5, max_wait=30, min_interval=60, watch=["hub/door"])
+    daemon._step([("iot", ("hub", {"hub/door" : "closed", "hub/light" : "off"}))], 100)
+    daemon._step([("iot", ("hub", {"hub/light" : "on"}))], 101)
+    assert daemon.opened_at is None and incidents == [] # context only
+
+    daemon._step([("iot", ("hub", {"hub/door" : "open"}))], 102)
+    assert daemon.opened_at == 102
+    daemon._step([], 104)
+    assert incidents == [] # still within the debounce
+    daemon._step([], 107)
+    assert [event["key"] for event in incidents[0]] == ["hub/door", "hub/light"] # context travels along, by score
+    assert daemon.pending == {} and daemon.stats()["incidents"] == 1
+
+
+def test_daemon_flushes_a_busy_incident_at_max_wait_and_respects_min_interval():
+    incidents = []
+    daemon = AgentDaemon(incidents.append, debounce=5, max_wait=30, min_interval=60, watch=["hub/door"])
+    daemon.last_call = -1000
+    daemon._step([("iot", ("hub", {"hub/door" : "closed"}))], 0)
+    for now in range(1, 40, 2): # keeps changing, never settles
+        daemon._step([("iot", ("hub", {"hub/door" : "open" if now % 4 == 1 else "closed"}))], now)
+    assert len(incidents) == 1 and incidents[0][0]["count"] > 1 # coalesced under one key
+
+    first = daemon.last_call
+    assert first == 31 # opened at 1, flushed at max_wait
+    daemon._step([("iot", ("hub", {"hub/door" : "open"}))], 50)
+    daemon._step([], 80)
+    assert len(incidents) == 1 # settled, but the last call was under a minute ago
+    assert abs(daemon._wait(80) - (first + 60 - 80 + 0.01)) < 1e-9
+    daemon._step([], daemon.last_call + 60)
+    assert len(incidents) == 2
+
+
+def test_daemon_drops_stale_context():
+    daemon = AgentDaemon(lambda events: None, max_context_age=900)
+    daemon._step([("mail", ([{"Id" : "1", "suject" : "lunch", "Body" : ""}],))], 0)
+    assert len(daemon.pending) == 1
+    daemon._step([], 1000)
+    assert daemon.pending == {}
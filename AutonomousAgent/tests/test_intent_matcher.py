@@ -0,0 +1,93 @@
+import json
+import time
+
+import pytest
+
+from ..core.services.intent_matcher import IntentMatcher, tokenize
+from .conftest import wait_for
+
+
+TOPICS = {
+          "kitchen"    : ["kitchen/light/command", "kitchen/temperature"],
+          "livingRoom" : ["livingRoom/light/command", "livingRoom/ac/command"],
+          "garden"     : ["garden/valve1/command", "garden/valve2/command", "garden/pump/command", "garden/soilHumidity"],
+         }
+
+
+@pytest.fixture
+def matcher() -> IntentMatcher:
+    matcher = IntentMatcher()
+    matcher.build(TOPICS)
+    return matcher
+
+
+def test_tokenize_normalises_devices():
+    assert tokenize("the livingRoom lamps") == ["living", "light"]
+    assert tokenize("valve 1") == tokenize("valve_1") == ["valve1"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("turn on the kitchen light", ("iot_set_states", {"topics" : ["kitchen/light/command"], "states" : ["ON"]})),
+    ("Switch the living room AC off.", ("iot_set_states", {"topics" : ["livingRoom/ac/command"], "states" : ["OFF"]})),
+    ("please turn off the garden pump", ("iot_set_states", {"topics" : ["garden/pump/command"], "states" : ["OFF"]})),
+    ("turn on valve 2", ("iot_set_states", {"topics" : ["garden/valve2/command"], "states" : ["ON"]})),
+    ("allume la lumière kitchen", ("iot_set_states", {"topics" : ["kitchen/light/command"], "states" : ["ON"]})),
+    ("what is the kitchen temperature?", ("iot_get_states", {"topics" : ["kitchen/temperature"]})),
+    ("is the garden pump on?", ("iot_get_states", {"topics" : ["garden/pump/command"]})),
+])
+def test_simple_requests_match_one_topic(matcher, query, expected):
+    assert matcher.match(query) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "turn on the light",                             # three lights, no clear winner
+    "turn on the kitchen light and the pump",        # chained
+    "turn off the pump in 10 minutes",               # scheduled
+    "turn on the garage door",                       # unknown device
+    "turn on valve 3",                               # valve3 is not a typo of valve1
+    "write a poem about my garden",
+])
+def test_anything_unsure_goes_to_the_model(matcher, query):
+    assert matcher.match(query) is None
+
+
+def test_tolerates_typos(matcher):
+    assert matcher.match("turn on the kitchn ligt") == ("iot_set_states", {"topics" : ["kitchen/light/command"], "states" : ["ON"]})
+
+
+def test_fast_path_answers_without_waiting_for_the_device(agent_factory):
+    agent, model, fleet = agent_factory(things=1, fast_path={})
+    calls = model.models[0].chats[0].calls
+    for device in fleet.devices:
+        device.transport.connected = False # the echo never comes
+
+    start = time.perf_counter()
+    answer = json.loads(agent.process_user_query("turn on thing0 light 1"))
+    assert time.perf_counter() - start < 0.5 # the command timeout is 1s
+    assert answer["response"] == "thing0/light1/command set to ON"
+    assert answer["result"]["thing0/light1/command"]["status"] == "sent"
+    assert model.models[0].chats[0].calls == calls # no model call
+
+    iot = fleet.iot
+    assert wait_for(lambda: not any(iot.command_tracker.pending.values()), timeout=3) # expired, not leaked
+
+
+def test_stream_reports_the_confirmation_after_the_answer(agent_factory):
+    agent, _, fleet = agent_factory(things=1, fast_path={})
+    events = list(agent.stream_user_query("turn on thing0 light 2"))
+    assert [event["type"] for event in events] == ["result", "confirmation"]
+    assert events[1]["confirmed"] is True and events[1]["topic"] == "thing0/light2/command"
+    assert fleet.devices[0].state["thing0/light2/state"] == "ON"
+
+
+def test_fast_path_turns_are_in_the_chat_history(agent_factory):
+    agent, model, _ = agent_factory(things=1, fast_path={})
+    answer = agent.process_user_query("turn off thing0 light 0")
+    history = model.models[0].chats[0].history
+    assert [entry.role for entry in history[-2:]] == ["user", "model"]
+    assert history[-2].parts[0].text == "turn off thing0 light 0"
+    assert history[-1].parts[0].text == answer
+
+    # the next model turn carries it
+    agent.process_user_query("and turn it back on")
+    assert model.models[0].chats[0].history[-3].parts[0].text == answer
@@ -0,0 +1,60 @@
+import time
+
+from ..core.services.iot_commands import CommandTracker, state_keys
+
+
+def test_state_keys_cover_the_echo_forms():
+    assert state_keys("hub/light/command") == ("hub/light/command", "hub/light/state", "hub/light/status", "hub/light")
+
+
+def test_command_is_confirmed_by_the_matching_echo():
+    tracker = CommandTracker()
+    command = tracker.track("hub", "hub/light/command", "ON")
+    tracker.on_state("hub", {"hub/light/state" : "off"})
+    assert not command.future.done() # still the old state
+    tracker.on_state("hub", {"hub/light/state" : "on"})
+    result = tracker.wait(command, timeout=0)
+    assert result["confirmed"] and result["state"] == "on"
+    assert tracker.pending["hub"] == []
+    assert tracker.latency_stats()["hub"]["count"] == 1
+
+
+def test_unconfirmed_command_times_out_and_is_discarded():
+    tracker = CommandTracker()
+    command = tracker.track("hub", "hub/light/command", "ON")
+    result = tracker.wait(command, timeout=0.01)
+    assert not result["confirmed"]
+    assert tracker.pending["hub"] == []
+    assert tracker.latency_stats()["hub"]["timeouts"] == 1
+
+
+def test_stale_commands_are_dropped():
+    tracker = CommandTracker(max_age=0.01)
+    tracker.track("hub", "hub/light/command", "ON")
+    time.sleep(0.02)
+    fresh = tracker.track("hub", "hub/light/command", "OFF")
+    assert tracker.pending["hub"] == [fresh]
+
+
+def test_send_and_wait_round_trip(fleet):
+    iot = fleet().iot
+    commands = iot.send_command("thing0/light1/command", "ON")
+    result = iot.wait_command(commands, timeout=2)
+    assert result["confirmed"] and result["state"] == "ON"
+    assert iot.get_state("thing0/light1/state") == "ON"
+
+
+def test_set_state_leaves_nothing_pending(fleet):
+    built = fleet()
+    for device in built.devices:
+        device.transport.connected = False # offline devices never echo
+    for _ in range(50):
+        assert built.iot.set_state("thing0/light0/command", "ON") == "Done"
+    assert sum(len(commands) for commands in built.iot.command_tracker.pending.values()) == 0
+
+
+def test_unknown_topic_sends_nothing(fleet):
+    iot = fleet().iot
+    assert iot.send_command("nowhere/light/command", "ON") == []
+    assert iot.set_state("nowhere/light/command", "ON") == "Failed"
+    assert iot.wait_command([], timeout=0)["confirmed"] is False
@@ -0,0 +1,65 @@
+import json
+from array import array
+
+from ..core.services.iot_commands import CommandTracker
+from ..core.services.iot_ingest import MessageIngest, KeySchemas
+
+
+def test_float_payloads_are_packed_into_arrays():
+    readings = KeySchemas().pack({"hub/temperature" : 21.5, "hub/humidity" : 40.0})
+    assert isinstance(readings.values_, array)
+    assert dict(readings) == {"hub/temperature" : 21.5, "hub/humidity" : 40.0}
+
+
+def test_packing_keeps_ints_booleans_and_strings():
+    schemas = KeySchemas()
+    payload = {"hub/light/state" : True, "hub/door" : "OPEN", "hub/count" : 3, "hub/level" : 0.5}
+    readings = schemas.pack(payload)
+    assert dict(readings) == payload
+    assert [type(readings[key]) for key in payload] == [bool, str, int, float]
+    # the shape stays on tuples afterwards, even for an all float payload
+    assert isinstance(schemas.pack({"hub/light/state" : 1.0, "hub/door" : 0.0, "hub/count" : 1.0, "hub/level" : 1.0}).values_, tuple)
+
+
+def test_payloads_with_the_same_keys_share_them():
+    schemas = KeySchemas()
+    first, second = schemas.pack({"a" : 1.0, "b" : 2.0}), schemas.pack({"a" : 3.0, "b" : 4.0})
+    assert first.keys_ is second.keys_
+
+
+def test_ingest_routes_data_and_topics():
+    states = []
+    ingest = MessageIngest(["hub"], on_state=lambda thing, readings: states.append((thing, dict(readings))))
+    assert ingest.ingest("hub/topics", json.dumps({"lights" : ["hub/light/command"]}))
+    assert ingest.ingest("hub/data/all", json.dumps({"hub/light/state" : "ON"}))
+    assert not ingest.ingest("hub/other", "{}")
+    assert not ingest.ingest("stranger/data/all", "{}") # wildcard deliveries of other things are dropped
+    assert "stranger/data/all" not in ingest.routes
+
+    assert states == [("hub", {"hub/light/state" : "ON"})]
+    assert ingest.owners_of("hub/light/command") == ("hub",)
+    assert ingest.topics_version == 1 and ingest.state_version == 1
+
+
+def test_state_version_only_moves_on_changes():
+    ingest = MessageIngest(["hub"])
+    for value in (1.0, 1.0, 2.0):
+        ingest.ingest("hub/data/all", json.dumps({"hub/sensor" : value}))
+    assert ingest.state_version == 2
+
+
+def test_owners_follow_reannounced_topics():
+    ingest = MessageIngest(["a", "b"])
+    ingest.ingest("a/topics", json.dumps({"lights" : ["shared/command", "a/command"]}))
+    ingest.ingest("b/topics", json.dumps({"lights" : ["shared/command"]}))
+    assert ingest.owners_of("shared/command") == ("a", "b")
+    ingest.ingest("a/topics", json.dumps({"lights" : ["a/command"]}))
+    assert ingest.owners_of("shared/command") == ("b",)
+
+
+def test_numeric_command_is_confirmed_by_its_echo():
+    tracker = CommandTracker()
+    ingest = MessageIngest(["hub"], on_state=tracker.on_state)
+    command = tracker.track("hub", "hub/dimmer/command", "1")
+    ingest.ingest("hub/data/all", json.dumps({"hub/dimmer/state" : 1, "hub/temperature" : 20.5}))
+    assert tracker.wait(command, timeout=0)["confirmed"]
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from ..core.services.iot_service import IoT
+from ..core.services.iot_transport import FakeBroker
+from ..core.services.scheduler import Scheduler
+from ..core.services.snapshot import ShardedSnapshotMap
+from .conftest import Fleet, wait_for
+
+
+def test_client_id_is_short_and_stable_per_fleet():
+    names, ids = [f"thing{index}" for index in range(10000)], []
+    for order in (names, names[::-1]):
+        iot = IoT(None, order, None, None, None, transport_factory=FakeBroker().client, subscription="wildcard")
+        ids += [iot._client_id(), iot._client_id()]
+        iot.stop = True
+        iot.scheduler.shutdown()
+    assert len(ids[0]) < 64
+    assert len(set(ids)) == 1 # every reconnect resumes the same session
+    assert ids[0].endswith(f"_{os.getpid()}")
+
+
+def test_reconnect_keeps_the_client_id(fleet):
+    built = fleet(things=1)
+    first = built.iot.aws_client
+    built.broker.drop(first)
+    assert wait_for(lambda: built.iot.aws_client is not first and built.iot.aws_client_status)
+    assert built.iot.aws_client.client_id == first.client_id
+
+
+def test_unknown_subscription_mode():
+    with pytest.raises(ValueError):
+        IoT(None, ["hub"], None, None, None, subscription="everything")
+
+
+def test_wildcard_fleet_holds_two_subscriptions(fleet):
+    built = fleet(things=20, subscription="wildcard", shards=4)
+    iot = built.iot
+    assert sorted(built.broker.wildcard) == ["+/data/all", "+/topics"]
+    assert not any(topic.endswith("/data/all") for topic in built.broker.exact) # only the devices' own command topics
+    assert isinstance(iot.sensors_data, ShardedSnapshotMap)
+    assert sorted(iot.ingest.sensors_data.snapshot().data) == sorted(built.names)
+    device = built.devices[7]
+    assert iot.get_state("thing7/sensor3") == device.state["thing7/sensor3"]
+
+    commands = iot.send_command("thing7/light1/command", "ON")
+    assert [command.thing for command in commands] == ["thing7"]
+    assert iot.wait_command(commands, timeout=2)["confirmed"]
+    assert device.state["thing7/light1/state"] == "ON"
+
+
+def test_per_thing_subscriptions_go_in_batches():
+    fleet = Fleet(things=20)
+    requests = []
+    subscribe = fleet.broker._subscribe
+    fleet.broker._subscribe = lambda transport, topics, callback: requests.append(len(topics)) or subscribe(transport, topics, callback)
+    try:
+        fleet.start(subscription="per_thing", subscribe_batch=8)
+        assert wait_for(lambda: sum(requests) >= 40 + 20) # the agent's topics, then one subscription per device
+        assert requests[:5] == [8, 8, 8, 8, 8]
+    finally:
+        fleet.close()
+
+
+def test_get_state_falls_back_for_topics_without_the_thing_prefix(fleet):
+    built = fleet(things=2)
+    built.broker.publish("thing1/data/all", '{"shared/temperature" : 21.5}')
+    built.broker.flush()
+    assert built.iot.get_state("shared/temperature") == 21.5
+    assert built.iot.get_state("thing0/nothing") is None
+
+
+def test_unreachable_broker_is_retried_without_holding_a_worker():
+    broker = FakeBroker()
+    broker.online = False
+    iot = IoT(None, ["hub"], None, None, None, transport_factory=broker.client, subscription="wildcard", scheduler=Scheduler(workers=1))
+    iot.setup_delay = iot.max_setup_delay = 0.05
+    try:
+        assert wait_for(lambda: iot.scheduler.stats().get("iot.status", {}).get("runs", 0) >= 1)
+        assert wait_for(lambda: iot.scheduler.stats().get("iot.setup", {}).get("runs", 1) == 0) # a new attempt waits its turn
+        broker.online = True
+        assert wait_for(lambda: iot.aws_client_status and broker.subscriber_count() == 2)
+    finally:
+        iot.stop = True
+        iot.scheduler.shutdown()
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from ..core.services.iot_transport import FakeBroker, topic_matches
+from .conftest import wait_for
+
+
+@pytest.mark.parametrize("topic_filter, topic, matches", [
+    ("hub/data/all", "hub/data/all", True),
+    ("+/data/all", "hub/data/all", True),
+    ("+/data/all", "hub/data", False),
+    ("hub/#", "hub/light/state", True),
+    ("+/topics", "hub/light/topics", False),
+])
+def test_topic_matches(topic_filter, topic, matches):
+    assert topic_matches(topic_filter, topic) is matches
+
+
+def test_messages_reach_exact_and_wildcard_subscribers():
+    broker = FakeBroker()
+    received = []
+    exact, wildcard = broker.client("exact"), broker.client("wildcard")
+    for transport in (exact, wildcard):
+        transport.connect()
+    exact.subscribe("hub/data/all", 0, lambda client, userdata, message: received.append(("exact", message.topic)))
+    wildcard.subscribe("+/data/all", 0, lambda client, userdata, message: received.append(("wildcard", message.topic)))
+
+    exact.publish("hub/data/all", "{}", 0)
+    exact.publish("other/data/all", "{}", 0)
+    broker.flush()
+    assert sorted(received) == [("exact", "hub/data/all"), ("wildcard", "hub/data/all"), ("wildcard", "other/data/all")]
+
+    exact.unsubscribe("hub/data/all")
+    assert broker.subscriber_count() == 1
+
+
+def test_subscribe_many_costs_one_round_trip():
+    broker = FakeBroker(round_trip=0.05)
+    transport = broker.client("client")
+    transport.connect()
+    start = time.perf_counter()
+    transport.subscribe_many([f"thing{index}/data/all" for index in range(8)], 1, lambda *args: None)
+    assert time.perf_counter() - start < 0.1
+    assert broker.subscriber_count() == 8
+
+
+def test_publish_needs_a_connection():
+    transport = FakeBroker().client("client")
+    with pytest.raises(ConnectionError):
+        transport.publish("hub/sub", "{}", 0)
+
+
+def test_dropped_iot_client_reconnects_and_resubscribes(fleet):
+    built = fleet(things=3)
+    first = built.iot.aws_client
+    built.broker.drop(first)
+    assert wait_for(lambda: built.broker.subscriber_count() >= 6 + 3) # the agent's topics again, plus the devices' own
+    assert built.iot.aws_client is not first and built.iot.aws_client.connected
+
+    built.devices[0].report()
+    built.broker.flush()
+    assert built.iot.get_state("thing0/sensor0") == built.devices[0].state["thing0/sensor0"]
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from ..core.assistants.json_stream import JsonStream
+
+
+REPLY = {"response" : "Line one\nsaid \"hi\" été \\ done", "data" : {"response" : "nested"}, "items" : ["a", "b"], "count" : 2, "note" : ""}
+
+
+def fields(chunks) -> dict:
+    stream, seen = JsonStream(), {}
+    for chunk in chunks:
+        for key, text in stream.feed(chunk):
+            seen[key] = seen.get(key, "") + text
+    return seen
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_top_level_strings_match_the_parsed_reply(size):
+    text = "```json\n" + json.dumps(REPLY, ensure_ascii=True) + "\n```"
+    chunks = [text[index:index + size] for index in range(0, len(text), size)]
+    assert fields(chunks) == {"response" : REPLY["response"]} # nested and non string values only come with the result
+
+
+def test_each_chunk_yields_only_what_it_added():
+    stream = JsonStream()
+    assert stream.feed('{"response" : "Hel') == [("response", "Hel")]
+    assert stream.feed('lo\\') == [("response", "lo")] # the escape is not complete yet
+    assert stream.feed('n", "other": "x"}') == [("response", "\n"), ("other", "x")]
+    assert stream.done
+
+
+def test_text_after_the_value_is_ignored():
+    stream = JsonStream()
+    assert stream.feed('{"response" : "ok"} trailing {"response" : "again"}') == [("response", "ok")]
+    assert stream.done
+    assert stream.result() == '{"response" : "ok"} trailing {"response" : "again"}' # does not parse, kept raw
+
+
+def test_result_is_the_compact_reply():
+    stream = JsonStream()
+    for chunk in ["```json\n{\"response\" :", " \"ok\"}\n```"]:
+        stream.feed(chunk)
+    assert stream.result() == json.dumps({"response" : "ok"})
+
+
+def test_stream_user_query_yields_fields_as_they_arrive(agent_factory):
+    agent, model, _ = agent_factory()
+    model.set_script([json.dumps({"response" : "a fairly long answer that spans several chunks"})])
+    events = list(agent.stream_user_query("hello"))
+    deltas = [event["text"] for event in events if event["type"] == "field"]
+    assert len(deltas) > 1 and "".join(deltas) == "a fairly long answer that spans several chunks"
+    assert events[-1] == {"type" : "result", "text" : json.dumps({"response" : "a fairly long answer that spans several chunks"})}
@@ -0,0 +1,117 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from ..core.services.mail_outbox import MailOutbox
+
+
+def http_error(status:int, reason:str="error") -> HttpError:
+    return HttpError(httplib2.Response({"status" : status}), f'{{"error": {{"message": "{reason}"}}}}'.encode())
+
+
+class Sender:
+    # answers each send with the next scripted outcome per recipient: None sent, an exception or a message otherwise
+    def __init__(self, outcomes=None):
+        self.outcomes = outcomes or {}
+        self.calls    = []
+
+    def __call__(self, messages):
+        self.calls.append([message["to"] for message in messages])
+        errors = {}
+        for message in messages:
+            outcomes = self.outcomes.get(message["to"])
+            errors[message["id"]] = outcomes.pop(0) if outcomes else None
+        return errors
+
+
+@pytest.fixture
+def outbox_factory(tmp_path):
+    def build(sender, **options) -> MailOutbox:
+        return MailOutbox(sender=sender, path=str(tmp_path / "outbox.db"), base_backoff=0, **options)
+    return build
+
+
+def test_queued_mails_are_sent_in_batches(outbox_factory):
+    sender = Sender()
+    outbox = outbox_factory(sender, batch_size=2)
+    ids = [outbox.enqueue(f"user{index}@example.com", "subject", "body") for index in range(5)]
+    assert outbox.pending() == 5
+
+    assert outbox._drain_all() is True
+    assert [len(call) for call in sender.calls] == [2, 2, 1]
+    assert all(outbox.status(mail_id)["status"] == "sent" for mail_id in ids)
+    assert outbox._drain_all() is False
+
+
+def test_transient_errors_are_retried(outbox_factory):
+    sender = Sender({"a@example.com" : [http_error(503), http_error(429), TimeoutError("network"), None]})
+    outbox = outbox_factory(sender)
+    mail_id = outbox.enqueue("a@example.com", "subject", "body")
+
+    for _ in range(4):
+        outbox.drain()
+    status = outbox.status(mail_id)
+    assert status["status"] == "sent" and status["attempts"] == 3
+
+
+def test_permanent_errors_fail_at_once(outbox_factory):
+    sender = Sender({"bad" : [http_error(400, "Invalid To header")], "denied@example.com" : [http_error(403, "forbidden")]})
+    outbox = outbox_factory(sender)
+    bad, denied = outbox.enqueue("bad", "s", "b"), outbox.enqueue("denied@example.com", "s", "b")
+
+    outbox.drain()
+    assert outbox.status(bad)["status"] == "failed" and outbox.status(bad)["attempts"] == 1
+    assert "Invalid To header" in outbox.status(bad)["last_error"]
+    assert outbox.status(denied)["status"] == "failed"
+    assert outbox.drain() == 0 # nothing resent
+
+
+def test_rate_limit_403_is_retried(outbox_factory):
+    sender = Sender({"a@example.com" : [http_error(403, "User-rate limit exceeded, rateLimitExceeded"), None]})
+    outbox = outbox_factory(sender)
+    mail_id = outbox.enqueue("a@example.com", "s", "b")
+    outbox.drain()
+    assert outbox.status(mail_id)["status"] == "queued"
+    outbox.drain()
+    assert outbox.status(mail_id)["status"] == "sent"
+
+
+def test_gives_up_after_max_attempts(outbox_factory):
+    sender = Sender({"a@example.com" : [http_error(500)] * 3})
+    outbox = outbox_factory(sender, max_attempts=3)
+    mail_id = outbox.enqueue("a@example.com", "s", "b")
+    for _ in range(5):
+        outbox.drain()
+    assert outbox.status(mail_id)["status"] == "failed" and outbox.status(mail_id)["attempts"] == 3
+
+
+def test_sender_exception_retries_the_whole_batch(outbox_factory):
+    calls = []
+    def sender(messages):
+        calls.append(len(messages))
+        if len(calls) == 1:
+            raise ConnectionError("offline")
+        return {message["id"] : None for message in messages}
+    outbox = outbox_factory(sender)
+    ids = [outbox.enqueue(f"user{index}@example.com", "s", "b") for index in range(3)]
+    outbox.drain()
+    assert {outbox.status(mail_id)["status"] for mail_id in ids} == {"queued"}
+    outbox.drain()
+    assert {outbox.status(mail_id)["status"] for mail_id in ids} == {"sent"}
+
+
+def test_interrupted_sends_are_queued_again(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = MailOutbox(sender=Sender(), path=path)
+    mail_id = outbox.enqueue("a@example.com", "s", "b")
+    outbox._claim_due() # claimed, then the process died
+    assert outbox.status(mail_id)["status"] == "sending"
+
+    assert MailOutbox(sender=Sender(), path=path).status(mail_id)["status"] == "queued"
+
+
+def test_stopped_outbox_reports_no_work(outbox_factory):
+    outbox = outbox_factory(Sender())
+    outbox.enqueue("a@example.com", "s", "b")
+    outbox.stop = True
+    assert outbox._drain_all() is False
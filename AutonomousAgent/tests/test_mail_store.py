@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+from ..core.services.mail_store import MailStore
+
+
+def mail(index:int, subject:str, body:str, sender:str="alice@example.com", day:int=1):
+    return {"id" : f"m{index}", "thread_id" : f"t{index}", "From" : sender, "suject" : subject, "Body" : body,
+            "received_at" : datetime(2024, 5, day, 12).timestamp()}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MailStore(path=str(tmp_path / "mails.db"))
+    store.add([
+               mail(1, "Invoice for May", "please find the invoice attached", day=1),
+               mail(2, "Team lunch", "lunch on friday at noon", sender="bob@example.com", day=3),
+               mail(3, "Invoice reminder", "the invoice is overdue", day=5),
+              ])
+    yield store
+    store.close()
+
+
+def test_add_ignores_known_ids(store):
+    assert store.add([mail(1, "Invoice for May", "again")]) == 0
+    assert store.count() == 3
+    assert store.known_ids(["m1", "m9"]) == {"m1"}
+
+
+def test_recent_is_newest_first_with_offsets(store):
+    assert [mail["Id"] for mail in store.recent(limit=2).values()] == ["m3", "m2"]
+    assert list(store.recent(limit=2, offset=1)) == [1, 2]
+
+
+def test_search_matches_subject_body_and_sender(store):
+    assert {mail["Id"] for mail in store.search("invoice")} == {"m1", "m3"}
+    assert [mail["Id"] for mail in store.search("friday")] == ["m2"]
+    assert [mail["Id"] for mail in store.search("bob")] == ["m2"]
+    assert store.search("missing") == []
+
+
+def test_search_since_and_limit(store):
+    assert [mail["Id"] for mail in store.search("invoice", since="2024-05-02")] == ["m3"]
+    assert len(store.search(limit=2)) == 2
+    with pytest.raises(ValueError):
+        store.search("invoice", since="yesterday")
+
+
+def test_search_quotes_fts_operators(store):
+    # user text is searched for, not parsed as FTS5 syntax
+    assert store.search('invoice OR "lunch') == []
+    assert store.search("NEAR(invoice") == []
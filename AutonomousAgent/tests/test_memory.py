@@ -0,0 +1,65 @@
+import json
+import sys
+
+from ..core.services.memory import deep_size, memory_tracer
+from ..core.services.news_service import ArticleStore
+from ..core.services.snapshot import Snapshot
+from .conftest import text
+
+
+def test_deep_size_counts_shared_objects_once():
+    body = "x" * 1000
+    single = deep_size([body])
+    assert deep_size([body, body]) == single + sys.getsizeof([body, body]) - sys.getsizeof([body])
+    assert deep_size([body, "y" * 1000]) > single + 1000
+
+
+def test_deep_size_follows_slots_and_cycles():
+    snapshot = Snapshot(1, {"text" : "x" * 1000})
+    assert deep_size(snapshot) > 1000
+    cycle = []
+    cycle.append(cycle)
+    assert deep_size(cycle) == sys.getsizeof(cycle)
+
+
+def test_article_store_stays_within_max_bytes():
+    store = ArticleStore(max_articles=1000, max_bytes=20000)
+    for index in range(40):
+        store.add([{"title" : str(index), "text" : text(index, words=100)}])
+    usage = store.memory_usage()
+    assert usage["bytes"] <= 20000 and usage["bytes"] == sum(store.sizes)
+    assert usage["evicted"] == 40 - usage["articles"] and store.articles[-1]["title"] == "39"
+
+
+def test_chat_history_keeps_the_context_and_the_latest_turns(agent_factory):
+    agent, model, _ = agent_factory(memory={"chat_history_bytes" : 4000})
+    model.set_script([json.dumps({"response" : text(turn, words=60)}) for turn in range(10)])
+    context = list(agent.llm.history[:2])
+    for turn in range(10):
+        agent.process_user_query(f"question {turn}")
+    history = agent.llm.history
+    assert history[:2] == context # the context upload stays
+    assert history[-2] == "question 9"
+    assert len(history) < 2 + 2 * 10
+    assert deep_size(history[2:-2]) <= 4000 # the last turn is kept whatever its size
+
+
+def test_agent_reports_its_stores(agent_factory):
+    agent, _, _ = agent_factory(response_cache={"max_bytes" : 1000})
+    usage = agent.memory_usage()
+    assert {"document", "context", "workspace", "video", "chat_history", "response_cache", "process"} <= set(usage)
+    assert usage["chat_history"]["messages"] == 2
+    assert usage["response_cache"]["max_bytes"] == 1000
+    assert usage["process"]["tracing"] is False
+
+
+def test_tracer_reports_growth_since_start():
+    memory_tracer.start()
+    try:
+        held = [str(index) * 50 for index in range(10000)]
+        top = memory_tracer.top(5, since_start=True)
+        assert top and top[0]["growth"] > 500000 and "test_memory.py" in top[0]["where"]
+        assert memory_tracer.stats()["traced"] > 0
+    finally:
+        memory_tracer.stop()
+    assert memory_tracer.top() == [] and len(held) == 10000
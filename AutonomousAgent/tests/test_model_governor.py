@@ -0,0 +1,121 @@
+import time
+from threading import Event, Thread
+
+import google.api_core.exceptions
+import pytest
+
+from ..core.services.model_governor import ModelGovernor, TokenBucket
+from .conftest import wait_for
+
+
+def test_token_bucket_never_exceeds_the_minute_rate():
+    bucket = TokenBucket(rate_per_minute=60, burst=10)
+    now = bucket.updated
+    for _ in range(10):
+        assert bucket.wait_time(1, now) == 0
+        bucket.take(1, now)
+    assert abs(bucket.wait_time(1, now) - 60 / 50) < 1e-9 # 50 refilled over the minute, 10 of burst
+
+
+def test_token_bucket_with_a_tiny_quota_or_a_burst_above_it():
+    bucket = TokenBucket(rate_per_minute=1)
+    now = bucket.updated
+    assert bucket.capacity == 0.5 and bucket.wait_time(1, now) == 0
+    bucket.take(1, now)
+    assert bucket.wait_time(1, now) == 60 # half a call refilled over a minute
+    for rate, burst in ((60, 60), (60, 100), (0, None)):
+        with pytest.raises(ValueError):
+            TokenBucket(rate_per_minute=rate, burst=burst)
+
+
+def test_successes_at_the_limit_raise_it():
+    governor = ModelGovernor(initial_concurrency=1, increase=0.25)
+    assert governor.call(lambda: "ok") == "ok"
+    assert governor.limit == 1.25
+    assert governor.stats()["calls"] == 1
+
+
+def test_throttling_is_retried_and_lowers_the_limit():
+    governor = ModelGovernor(initial_concurrency=4, decrease=0.5, base_backoff=0.01)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise google.api_core.exceptions.TooManyRequests("slow down")
+        return "ok"
+
+    assert governor.call(flaky) == "ok"
+    stats = governor.stats()
+    assert len(attempts) == 2 and stats["throttled"] == 1 and stats["errors"] == 0
+    assert governor.limit == 2
+
+
+def test_other_errors_fail_at_once():
+    governor = ModelGovernor()
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        governor.call(broken)
+    assert attempts == [1] and governor.stats()["errors"] == 1 and governor.in_flight == 0
+
+
+def test_waiting_calls_go_in_priority_order():
+    governor = ModelGovernor(initial_concurrency=1, max_concurrency=1)
+    release, order = Event(), []
+    blocker = Thread(target=governor.call, args=(release.wait,))
+    blocker.start()
+    assert wait_for(lambda: governor.in_flight == 1)
+
+    threads = [Thread(target=governor.call, args=(order.append, name), kwargs={"priority" : name}) for name in ["background", "interactive"]]
+    for thread in threads:
+        thread.start()
+        assert wait_for(lambda: len(governor.waiting) == threads.index(thread) + 1)
+    release.set()
+    for thread in threads + [blocker]:
+        thread.join(2)
+    assert order == ["interactive", "background"]
+
+
+def test_stream_holds_the_slot_until_the_last_chunk():
+    governor = ModelGovernor(initial_concurrency=1)
+    chunks = governor.stream(lambda: iter(["a", "b"]))
+    assert next(chunks) == "a"
+    assert governor.in_flight == 1
+    assert list(chunks) == ["b"]
+    assert governor.in_flight == 0 and governor.limit == 1.25
+
+
+def test_stream_failing_after_the_first_chunk_is_an_error():
+    governor = ModelGovernor(initial_concurrency=1)
+
+    def broken():
+        yield "a"
+        raise ConnectionError("stream reset")
+
+    chunks = governor.stream(broken)
+    assert next(chunks) == "a"
+    with pytest.raises(ConnectionError):
+        next(chunks)
+    stats = governor.stats()
+    assert stats["errors"] == 1 and stats["calls"] == 0
+    assert governor.in_flight == 0 and governor.limit == 1 # no additive increase for a broken stream
+
+
+def test_stream_throttled_mid_way_pauses_the_others():
+    governor = ModelGovernor(initial_concurrency=1, base_backoff=10)
+
+    def throttled():
+        yield "a"
+        raise google.api_core.exceptions.ResourceExhausted("quota")
+
+    chunks = governor.stream(throttled)
+    next(chunks)
+    with pytest.raises(google.api_core.exceptions.ResourceExhausted):
+        next(chunks)
+    assert governor.stats()["throttled"] == 1
+    assert governor.paused_until > time.monotonic()
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+
+import pytest
+
+from ..core.services.news_aggregator import NewsAggregator
+from ..core.services.telemetry import telemetry
+from .conftest import text
+
+
+TEXTS = [
+         "the city council approved the new budget for public transport after a long debate",
+         "heavy rain is expected over the weekend in the northern regions with local flooding",
+         "the national team won the final match in extra time in front of a full stadium",
+        ]
+
+
+class FakeReader:
+    def __init__(self, pages):
+        self.pages         = list(pages) # one list of articles per fetch, None for a 304
+        self.calls         = 0
+        self.etag          = None
+        self.last_modified = None
+
+    def fetch_articles(self, timeout=10):
+        self.calls += 1
+        page = self.pages.pop(0) if self.pages else None
+        return None if page is None else [dict(article) for article in page]
+
+
+def aggregator_with(reader, **options) -> NewsAggregator:
+    aggregator = NewsAggregator(sources=[{"url" : "https://news.example", "interval" : 60, "timeout" : 1}], **options)
+    aggregator.sources[0].reader = reader
+    return aggregator
+
+
+def refresh(aggregator:NewsAggregator):
+    # one scheduler turn for the first source, without the background thread
+    async def cycle():
+        aggregator._loop   = asyncio.get_running_loop()
+        aggregator._wakeup = asyncio.Event()
+        source = aggregator.sources[0]
+        source.running = True
+        await aggregator._refresh_source(source, asyncio.Semaphore(1))
+    asyncio.run(cycle())
+
+
+@pytest.fixture(params=[False, True], ids=["telemetry-off", "telemetry-on"])
+def tracing(request):
+    enabled = telemetry.enabled
+    telemetry.enabled = request.param
+    yield request.param
+    telemetry.enabled = enabled
+
+
+def test_refresh_cycle_stores_articles_and_reschedules(tracing):
+    reader = FakeReader([[{"title" : f"t{index}", "text" : text} for index, text in enumerate(TEXTS)]])
+    aggregator = aggregator_with(reader)
+    source = aggregator.sources[0]
+
+    refresh(aggregator)
+
+    assert reader.calls == 1
+    assert len(aggregator.get_news()) == 3
+    assert source.fetches == 1 and source.articles_added == 3 and source.last_error is None
+    assert not source.running
+    assert source.next_run > 0
+    if tracing:
+        assert telemetry.snapshot()["news.fetch"]["count"] >= 1
+
+
+def test_refresh_cycle_records_not_modified_and_errors():
+    class FailingReader(FakeReader):
+        def fetch_articles(self, timeout=10):
+            self.calls += 1
+            raise RuntimeError("boom")
+
+    aggregator = aggregator_with(FakeReader([None]))
+    refresh(aggregator)
+    assert aggregator.sources[0].not_modified == 1
+
+    aggregator = aggregator_with(FailingReader([]))
+    refresh(aggregator)
+    source = aggregator.sources[0]
+    assert source.failures == 1 and source.last_error == "boom"
+    assert not source.running
+
+
+def test_get_news_pages_in_id_order_when_limited(service_handler):
+    handler = service_handler(news={"sources" : []})
+    store = handler.service_handler.news_aggregator.store
+    store.add([{"title" : f"t{index}", "text" : text(index)} for index in range(10)])
+
+    seen, cursor = [], 0
+    for _ in range(5):
+        page = handler.get_news(since=cursor, number_of_articles=3)
+        seen += [article["id"] for article in page["News"]]
+        cursor = page["Cursor"]
+    assert sorted(seen) == list(range(1, 11))
+    assert cursor == store.cursor
+
+
+def test_timed_out_fetch_keeps_source_running_until_it_returns():
+    release = threading.Event()
+
+    class SlowReader(FakeReader):
+        def fetch_articles(self, timeout=10):
+            self.calls += 1
+            release.wait(5)
+            return None
+
+    aggregator = aggregator_with(SlowReader([]))
+    source = aggregator.sources[0]
+    source.timeout = 0.05
+
+    async def cycle():
+        aggregator._loop   = asyncio.get_running_loop()
+        aggregator._wakeup = asyncio.Event()
+        source.running = True
+        await aggregator._refresh_source(source, asyncio.Semaphore(1))
+        assert source.last_error.startswith("Timeout")
+        assert source.running # the reader thread is still busy
+        release.set()
+        while source.running:
+            await asyncio.sleep(0.01)
+    asyncio.run(cycle())
+
+    assert source.reader.calls == 1 and source.next_run > 0
+
+
+def test_articles_arriving_after_the_timeout_are_kept():
+    release = threading.Event()
+
+    class LateReader(FakeReader):
+        def fetch_articles(self, timeout=10):
+            self.calls += 1
+            release.wait(5)
+            return [{"title" : "late", "text" : TEXTS[0]}] # its validators have moved, the next fetch is a 304
+
+    aggregator = aggregator_with(LateReader([]))
+    source = aggregator.sources[0]
+    source.timeout = 0.05
+
+    async def cycle():
+        aggregator._loop   = asyncio.get_running_loop()
+        aggregator._wakeup = asyncio.Event()
+        source.running = True
+        await aggregator._refresh_source(source, asyncio.Semaphore(1))
+        assert source.last_error.startswith("Timeout") and aggregator.store.get() == []
+        release.set()
+        while source.running:
+            await asyncio.sleep(0.01)
+    asyncio.run(cycle())
+
+    assert [article["title"] for article in aggregator.store.get()] == ["late"]
@@ -0,0 +1,90 @@
+import pytest
+
+from ..core.services import news_service
+from ..core.services.news_service import ArticleStore, FeedReader, WebScraper
+from ..utils.text_hashing import content_hash, simhash, hamming_distance
+from .conftest import text
+
+
+class FakeResponse:
+    def __init__(self, status_code:int, text:str="", headers=None):
+        self.status_code = status_code
+        self.text        = text
+        self.content     = text.encode()
+        self.headers     = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise news_service.requests.HTTPError(str(self.status_code))
+
+
+def test_content_hash_ignores_case_and_punctuation():
+    assert content_hash("Hello, World!") == content_hash("hello world")
+    assert content_hash("hello world") != content_hash("hello there")
+
+
+def test_store_drops_exact_and_near_duplicates():
+    store = ArticleStore()
+    body = text(1, words=400)
+    near = body.rsplit(" ", 1)[0] + " different"
+    assert hamming_distance(simhash(body), simhash(near)) <= store.near_duplicate_distance
+
+    assert store.add([{"title" : "a", "text" : body}]) == 1
+    assert store.add([{"title" : "b", "text" : body.upper()}]) == 0
+    assert store.add([{"title" : "c", "text" : near}]) == 0
+    assert store.add([{"title" : "d", "text" : text(2, words=80)}]) == 1
+    assert [article["id"] for article in store.get()] == [1, 2]
+    assert [article["id"] for article in store.get(since=1)] == [2]
+
+
+def test_evicted_articles_can_come_back():
+    store = ArticleStore(max_articles=2)
+    store.add([{"title" : str(index), "text" : text(index)} for index in range(3)])
+    assert [article["title"] for article in store.get()] == ["1", "2"]
+    assert store.add([{"title" : "0", "text" : text(0)}]) == 1
+
+
+def test_conditional_get_sends_validators_and_skips_unchanged_pages(monkeypatch):
+    requests_seen = []
+    responses = [
+                 FakeResponse(200, "<html></html>", {"ETag" : '"v1"', "Last-Modified" : "Mon, 01 Jan 2024 00:00:00 GMT"}),
+                 FakeResponse(304),
+                ]
+    def get(url, headers=None, timeout=None):
+        requests_seen.append(dict(headers))
+        return responses.pop(0)
+    monkeypatch.setattr(news_service.requests, "get", get)
+
+    scraper = WebScraper(reference_website="https://news.example", load_links=False)
+    assert scraper.fetch_articles() == []
+    assert scraper.fetch_articles() is None # 304, nothing to parse
+
+    assert "If-None-Match" not in requests_seen[0]
+    assert requests_seen[1]["If-None-Match"] == '"v1"'
+    assert requests_seen[1]["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def test_validators_wait_until_the_page_is_parsed(monkeypatch):
+    requests_seen = []
+    monkeypatch.setattr(news_service.requests, "get", lambda url, headers=None, timeout=None: requests_seen.append(dict(headers))
+                        or FakeResponse(200, "<html></html>", {"ETag" : '"v1"'}))
+    scraper = WebScraper(reference_website="https://news.example", load_links=False)
+    scraper._extract_articles = lambda html: 1 / 0
+    with pytest.raises(ZeroDivisionError):
+        scraper.fetch_articles()
+    assert scraper.etag is None
+    del scraper._extract_articles
+    assert scraper.fetch_articles() == [] and scraper.etag == '"v1"'
+    assert "If-None-Match" not in requests_seen[1] # the failed page is asked for in full again
+
+
+def test_feed_reader_parses_the_raw_bytes_and_sends_validators(monkeypatch):
+    feed = ('<?xml version="1.0" encoding="utf-8"?><rss><channel><item><title>Budget approved</title>'
+            '<link>https://news.example/budget</link><description>the council approved the budget</description></item></channel></rss>')
+    requests_seen, responses = [], [FakeResponse(200, feed, {"Last-Modified" : "Mon, 01 Jan 2024 00:00:00 GMT"}), FakeResponse(304)]
+    monkeypatch.setattr(news_service.requests, "get", lambda url, headers=None, timeout=None: requests_seen.append(dict(headers))
+                        or responses.pop(0))
+    reader = FeedReader("https://news.example/rss")
+    assert [article["title"] for article in reader.fetch_articles()] == ["Budget approved"]
+    assert reader.fetch_articles() is None
+    assert requests_seen[1]["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT" and "If-None-Match" not in requests_seen[1]
@@ -0,0 +1,52 @@
+import multiprocessing
+import os
+
+import pytest
+
+from ..core.services.parse_pool import ParsePool
+
+
+def double(values:list) -> list:
+    return [value * 2 for value in values]
+
+
+def crash_in_worker(values:list) -> list:
+    # what the OOM killer does to a worker; parsed inline it is harmless
+    if multiprocessing.current_process().name != "MainProcess":
+        os._exit(1)
+    return double(values)
+
+
+@pytest.fixture
+def pool():
+    pool = ParsePool(workers=1, batch_size=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_inline_without_workers():
+    pool = ParsePool(workers=0)
+    assert pool.map_batches(double, [1, 2, 3]) == [2, 4, 6]
+    assert pool.run(sum, [1, 2]) == 3
+    assert pool.executor is None and pool.stats()["inline"] == 2
+
+
+def test_batches_keep_their_order(pool):
+    assert pool.map_batches(double, list(range(7))) == [value * 2 for value in range(7)]
+    assert pool.stats()["tasks"] == 4
+
+
+def test_broken_pool_is_replaced(pool):
+    assert pool.run(sum, [1, 2]) == 3
+    broken = pool.executor
+    assert pool.run(crash_in_worker, [1, 2]) == [2, 4] # parsed inline instead
+    assert pool.executor is None and pool.stats()["restarts"] == 1
+
+    assert pool.map_batches(double, [1, 2, 3]) == [2, 4, 6] # on a new pool
+    assert pool.executor is not None and pool.executor is not broken
+
+
+def test_broken_pool_during_batches(pool):
+    assert pool.map_batches(crash_in_worker, [1, 2, 3]) == [2, 4, 6]
+    assert pool.stats()["restarts"] == 1
+    assert pool.run(sum, [3, 4]) == 7
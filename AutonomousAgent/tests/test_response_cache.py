@@ -0,0 +1,100 @@
+import json
+
+from ..core.assistants.response_cache import ResponseCache, tool_sources
+from .conftest import REPLY
+
+
+def versions(**values):
+    return lambda source: values.get(source)
+
+
+def test_same_question_in_other_words_hits():
+    cache = ResponseCache()
+    cache.put(cache.key("What's the  temperature?", "ctx"), "warm", {"iot" : 1})
+    assert cache.get(cache.key("what's the temperature", "ctx"), versions(iot=1)) == "warm"
+    assert cache.get(cache.key("what's the temperature", "other"), versions(iot=1)) is None
+
+
+def test_moved_state_invalidates_the_entry():
+    cache = ResponseCache()
+    cache.put("key", "warm", {"iot:hub/temperature" : "21", "workspace" : "0:3"})
+    assert cache.get("key", versions(**{"iot:hub/temperature" : "21", "workspace" : "0:4"})) is None
+    assert "key" not in cache.entries # dropped, not only skipped
+    stats = cache.stats()
+    assert stats["invalidated"] == 1 and stats["hits"] == 0
+
+
+def test_expired_entries_miss():
+    cache = ResponseCache(ttl=0)
+    cache.put("key", "warm", {})
+    assert cache.get("key", versions()) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_goes_first():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "1", {})
+    cache.put("b", "2", {})
+    cache.get("a", versions())
+    cache.put("c", "3", {})
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_memory_tier_stays_within_max_bytes():
+    cache = ResponseCache(max_bytes=4000)
+    for index in range(20):
+        cache.put(f"key{index}", "x" * 500, {})
+    assert cache.bytes <= 4000 and cache.bytes == sum(cache.sizes.values())
+    assert "key19" in cache.entries and "key0" not in cache.entries
+    cache.put("huge", "x" * 10000, {}) # the newest entry stays even alone over the budget
+    assert list(cache.entries) == ["huge"]
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "responses.db")
+    ResponseCache(path=path).put("key", "warm", {"workspace" : "0:3"})
+    cache = ResponseCache(path=path)
+    assert cache.get("key", versions(workspace="0:3")) == "warm"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_only_reads_have_sources():
+    assert tool_sources("iot_get_states", {"topics" : ["hub/temperature"]}) == ["iot:hub/temperature"]
+    assert tool_sources("iot_get_states", {}) == ["iot"]
+    assert tool_sources("iot_set_states", {"topics" : ["hub/light/command"]}) is None
+
+
+def test_agent_answers_again_once_the_reading_moves(agent_factory):
+    agent, model, fleet = agent_factory(things=1, response_cache={})
+    read = [("iot_get_states", {"topics" : ["thing0/sensor1"]})]
+    model.set_script([read, REPLY, read, REPLY])
+
+    first = list(agent.stream_user_query("how warm is it"))
+    second = list(agent.stream_user_query("How warm is it?"))
+    assert not first[-1].get("cached") and second[-1] == {"type" : "result", "text" : first[-1]["text"], "cached" : True}
+    history = model.models[0].chats[0].history
+    assert len(history) == 2 + 4 + 2 # the context upload, one turn of two messages, and the answer from the cache
+    assert [history[-2].parts[0].text, history[-1].parts[0].text] == ["How warm is it?", first[-1]["text"]]
+
+    fleet.devices[0].report()
+    fleet.broker.flush()
+    third = list(agent.stream_user_query("how warm is it"))
+    assert not third[-1].get("cached")
+    assert any(event["type"] == "function_call" for event in third)
+
+
+def test_agent_never_caches_an_action(agent_factory):
+    agent, model, fleet = agent_factory(things=1, response_cache={})
+    action = [("iot_set_states", {"topics" : ["thing0/light0/command"], "states" : ["ON"]})]
+    model.set_script([action, REPLY, action, REPLY])
+    agent.process_user_query("switch the lamp on")
+    events = list(agent.stream_user_query("switch the lamp on"))
+    assert not events[-1].get("cached")
+    assert agent.response_cache.stats()["stored"] == 0
+
+
+def test_answers_without_tools_are_not_cached(agent_factory):
+    agent, model, _ = agent_factory(response_cache={})
+    model.set_script([json.dumps({"response" : "it was the red one"})])
+    agent.process_user_query("which one did I pick")
+    assert agent.response_cache.stats()["stored"] == 0 # another conversation would get this answer
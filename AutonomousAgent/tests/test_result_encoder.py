@@ -0,0 +1,53 @@
+from ..core.services.result_encoder import ResultEncoder, dumps
+
+
+def test_mails_become_a_projected_table():
+    encoder = ResultEncoder()
+    mails = {0 : {"Id" : "a", "From" : "x", "suject" : "s", "Body" : "b", "Labels" : ["INBOX"]},
+             1 : {"Id" : "b", "From" : "y", "suject" : "t", "Body" : "c", "Labels" : []}}
+    encoded = encoder.encode("get_mails", {"Mails" : mails})
+    assert encoded["Mails"]["columns"] == ["#", "Id", "From", "suject", "Body"]
+    assert encoded["Mails"]["rows"] == [[0, "a", "x", "s", "b"], [1, "b", "y", "t", "c"]]
+
+
+def test_long_text_is_cut_behind_a_cursor():
+    encoder = ResultEncoder(max_text=10)
+    encoded = encoder.encode("get_news", {"text" : "0123456789abcdefghij"})
+    head, cursor = encoded["text"].split("… [more: ")
+    assert head == "0123456789"
+    assert encoder.get_more(cursor.rstrip("]")) == {"content" : "abcdefghij"}
+
+
+def test_byte_cap_moves_rows_behind_more_rows():
+    encoder = ResultEncoder(max_bytes=300)
+    records = [{"id" : index, "title" : f"article {index}", "text" : "x" * 40} for index in range(20)]
+    encoded = encoder.encode("get_news", {"News" : records})
+    assert len(dumps(encoded)) <= 300
+
+    rows, cursor = list(encoded["News"]["rows"]), encoded["News"].get("more_rows")
+    while cursor:
+        page = encoder.get_more(cursor)
+        rows += page["rows"]
+        cursor = page.get("more_rows")
+    assert [row[0] for row in rows] == list(range(20))
+
+
+def test_unknown_cursor_is_an_error():
+    assert "Error" in ResultEncoder().get_more("c404")
+
+
+def test_stash_evicts_least_recently_used():
+    encoder = ResultEncoder(max_text=1, max_stash=2)
+    first  = encoder._store("first")
+    second = encoder._store("second")
+    assert encoder.get_more(first) == {"content" : "first"} # read again, now the most recent
+    encoder._store("third")
+    assert encoder.get_more(first) == {"content" : "first"}
+    assert "Error" in encoder.get_more(second)
+
+
+def test_pages_can_be_read_again():
+    encoder = ResultEncoder(max_bytes=200)
+    encoded = encoder.encode("get_news", {"News" : [{"id" : index, "text" : "x" * 40} for index in range(10)]})
+    cursor = encoded["News"]["more_rows"]
+    assert encoder.get_more(cursor)["rows"] == encoder.get_more(cursor)["rows"]
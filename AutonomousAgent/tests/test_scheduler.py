@@ -0,0 +1,103 @@
+import time
+from threading import Event
+
+import pytest
+
+from ..core.services.scheduler import Scheduler, ScheduledTask
+from .conftest import wait_for
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(workers=2)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_interval_adapts_within_bounds():
+    task = ScheduledTask("poll", lambda: None, interval=10, periodic=True, min_interval=4, max_interval=20)
+    task.adapt(True)
+    assert task.interval == 5
+    task.adapt(True)
+    assert task.interval == 4
+    for _ in range(5):
+        task.adapt(False)
+    assert task.interval == 20
+    task.adapt(None)
+    assert task.interval == 20
+
+
+def test_jitter_stays_within_its_share():
+    task = ScheduledTask("poll", lambda: None, interval=10, periodic=True, jitter=0.1)
+    assert all(9 <= task.delay() <= 11 for _ in range(200))
+
+
+def test_once_runs_and_forgets_itself(scheduler):
+    done = Event()
+    scheduler.once("job", done.set, delay=0.01)
+    assert done.wait(2)
+    assert wait_for(lambda: "job" not in scheduler.tasks)
+
+
+def test_cancelled_task_never_runs(scheduler):
+    ran = Event()
+    scheduler.once("job", ran.set, delay=0.05)
+    scheduler.cancel("job")
+    time.sleep(0.15)
+    assert not ran.is_set()
+
+
+def test_periodic_task_backs_off_and_records_errors(scheduler):
+    calls = []
+
+    def poll():
+        calls.append(time.monotonic())
+        if len(calls) == 2:
+            raise RuntimeError("feed down")
+        return False
+
+    scheduler.every("poll", poll, interval=0.01, max_interval=0.04, jitter=0)
+    assert wait_for(lambda: scheduler.stats()["poll"]["interval"] == 0.04)
+    stats = scheduler.stats()["poll"]
+    assert stats["errors"] == 1 and "feed down" in stats["last_error"]
+    assert len(calls) >= 5 # the failed run kept its interval
+
+
+def test_slow_task_does_not_starve_the_others(scheduler):
+    release, fast = Event(), []
+    scheduler.once("slow", lambda: release.wait(2))
+    scheduler.every("fast", lambda: fast.append(1), interval=0.01)
+    assert wait_for(lambda: len(fast) >= 5, timeout=1) # the second worker keeps going
+    release.set()
+
+
+def test_trigger_runs_a_periodic_task_early(scheduler):
+    calls = []
+    scheduler.every("sync", lambda: calls.append(1), interval=60, delay=60)
+    scheduler.trigger("sync")
+    assert wait_for(lambda: calls == [1])
+    time.sleep(0.05)
+    assert calls == [1] # back on its interval afterwards
+
+
+def test_scoped_tasks_keep_their_own_names(scheduler):
+    scope = scheduler.scope("tenant")
+    other = scheduler.scope("other")
+    scope.every("sync", lambda: None, interval=60, delay=60)
+    other.every("sync", lambda: None, interval=60, delay=60)
+    assert set(scheduler.tasks) == {"tenant/sync", "other/sync"}
+    assert list(scope.stats()) == ["sync"]
+    scope.shutdown()
+    assert set(scheduler.tasks) == {"other/sync"}
+
+
+def test_dedicated_tasks_leave_the_workers_to_periodic_ones():
+    scheduler, release, ticks = Scheduler(workers=1), Event(), []
+    try:
+        scheduler.once("setup", lambda: release.wait(5), dedicated=True)
+        scheduler.every("status", lambda: ticks.append(1), interval=0.01, jitter=0)
+        assert wait_for(lambda: len(ticks) >= 5, timeout=2) # the single worker is not held by the blocked setup
+        assert scheduler.stats()["setup"]["dedicated"] and not scheduler.stats()["status"]["dedicated"]
+    finally:
+        release.set()
+        scheduler.shutdown()
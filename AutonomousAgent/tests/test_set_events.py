@@ -0,0 +1,71 @@
+from ..core.services.google_service import Google
+
+
+class FakeCalendar:
+    # events().insert(...) and batch requests of the Calendar API, an event named "conflict" fails
+    def __init__(self):
+        self.batches = []
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId, body):
+        return body
+
+    def new_batch_http_request(self, callback):
+        calendar = self
+        class Batch:
+            def __init__(self):
+                self.requests = []
+            def add(self, body, request_id):
+                self.requests.append((request_id, body))
+            def execute(self):
+                calendar.batches.append(len(self.requests))
+                for request_id, body in self.requests:
+                    if body["summary"] == "conflict":
+                        callback(request_id, None, RuntimeError("conflict"))
+                    else:
+                        callback(request_id, {"htmlLink" : f"https://calendar.example/{request_id}"}, None)
+        return Batch()
+
+
+def event(summary:str="meeting", start:str="2024-05-01 10:00:00", end:str="2024-05-01 11:00:00"):
+    return {"summary" : summary, "start_time" : start, "end_time" : end}
+
+
+def calendar_handler(service_handler):
+    handler = service_handler()
+    google = Google(client_credentials_file_path=None)
+    google.calendar_service = FakeCalendar()
+    handler.service_handler.google_object = google
+    return handler, google.calendar_service
+
+
+def test_set_events_creates_in_batches_of_fifty(service_handler):
+    handler, calendar = calendar_handler(service_handler)
+    result = handler.set_events([event(f"meeting {index}") for index in range(120)])
+    assert result["created"] == 120
+    assert calendar.batches == [50, 50, 20]
+    assert result["results"][119]["summary"] == "meeting 119"
+
+
+def test_set_events_reports_each_failure(service_handler):
+    handler, _ = calendar_handler(service_handler)
+    result = handler.set_events([event(), event("conflict")])
+    assert result["created"] == 1
+    assert result["results"][1] == {"event" : "failed", "error" : "conflict", "index" : 1, "summary" : "conflict"}
+
+
+def test_invalid_events_are_rejected_by_index(service_handler):
+    handler, calendar = calendar_handler(service_handler)
+    result = handler.set_events([
+                                 event(),
+                                 event(start=1714557600),                       # a number instead of a date string
+                                 {"summary" : "no end", "start_time" : "2024-05-01 10:00:00"},
+                                 event(start="2024-05-01 12:00:00"),            # ends before it starts
+                                 event(end="tomorrow"),
+                                 "not an event",
+                                ])
+    assert result["events"] == "rejected"
+    assert [error["index"] for error in result["errors"]] == [1, 2, 3, 4, 5]
+    assert calendar.batches == [] # all or nothing
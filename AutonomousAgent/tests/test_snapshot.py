@@ -0,0 +1,82 @@
+from threading import Thread
+
+from ..core.services.snapshot import Published, ShardedSnapshotMap, SnapshotMap
+
+
+def test_published_value_is_never_modified():
+    published = Published({"mails" : 1})
+    before = published.get()
+    after = published.update(lambda data: {**data, "mails" : 2})
+    assert before.data == {"mails" : 1} and before.version == 0
+    assert after.data == {"mails" : 2} and published.version == 1
+    published.publish(None)
+    assert published.data is None and published.version == 2
+
+
+def test_snapshot_is_copied_once_per_version():
+    readings = SnapshotMap()
+    readings["hub"] = {"temperature" : 20}
+    first = readings.snapshot()
+    assert readings.snapshot() is first # unchanged, shared
+    readings["hub"] = {"temperature" : 21}
+    second = readings.snapshot()
+    assert second is not first and second.version == first.version + 1
+    assert first.data == {"hub" : {"temperature" : 20}} # an earlier snapshot does not move
+
+
+def test_snapshot_is_not_the_live_dict():
+    readings = SnapshotMap()
+    readings["hub"] = 1
+    snapshot = readings.snapshot()
+    readings["garden"] = 2
+    assert snapshot.data == {"hub" : 1}
+    assert "garden" in readings and readings.get("garden") == 2 and len(readings) == 2
+
+
+def test_readers_iterate_while_writers_insert():
+    readings = SnapshotMap()
+    errors = []
+
+    def write():
+        for index in range(5000):
+            readings[f"thing{index}"] = index
+
+    def read():
+        try:
+            for _ in range(300):
+                snapshot = readings.snapshot()
+                assert sum(1 for _ in snapshot.data.items()) == len(snapshot.data)
+                assert len(snapshot.data) <= len(readings)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [Thread(target=write)] + [Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert readings.snapshot().data == {f"thing{index}" : index for index in range(5000)}
+
+
+def test_sharded_map_recopies_only_the_written_shards():
+    readings = ShardedSnapshotMap(shards=4)
+    for index in range(40):
+        readings[f"thing{index}"] = index
+    first = readings.snapshot()
+    assert first.data == {f"thing{index}" : index for index in range(40)} and readings.snapshot() is first
+
+    copies = [shard.snapshot() for shard in readings.shards]
+    readings["thing0"] = -1
+    second = readings.snapshot()
+    assert second.data["thing0"] == -1 and first.data["thing0"] == 0
+    changed = [shard.snapshot() is not copy for shard, copy in zip(readings.shards, copies)]
+    assert changed.count(True) == 1 and second.version == first.version + 1
+
+
+def test_sharded_map_reads_like_a_single_map():
+    readings = ShardedSnapshotMap(shards=3)
+    readings["hub"] = {"temperature" : 20}
+    assert readings["hub"] == readings.get("hub") == {"temperature" : 20}
+    assert "hub" in readings and "garden" not in readings and readings.get("garden", 0) == 0
+    assert len(readings) == 1
@@ -0,0 +1,91 @@
+import json
+import os
+import time
+
+from ..core.services.state_store import StateStore
+
+
+def saved(path:str, **sections) -> StateStore:
+    store = StateStore(path=path)
+    for name, value in sections.items():
+        store.register(name, lambda value=value: value)
+    store.save()
+    return store
+
+
+def test_sections_come_back_after_a_restart(tmp_path):
+    path = str(tmp_path / "state.json")
+    saved(path, iot={"hub/temperature" : 21}, chat=["hello"])
+    store = StateStore(path=path)
+    assert store.get("iot") == {"hub/temperature" : 21} and store.get("chat") == ["hello"]
+    assert store.get("news", {}) == {} and store.version == 1
+
+
+def test_older_generations_are_kept(tmp_path):
+    path = str(tmp_path / "state.json")
+    store, value = StateStore(path=path, keep=3), {"count" : 0}
+    store.register("counter", lambda: dict(value))
+    for count in range(4):
+        value["count"] = count
+        assert store.save()
+    generations = [json.load(open(name))["sections"]["counter"]["count"] for name in [path, f"{path}.1", f"{path}.2"]]
+    assert generations == [3, 2, 1]
+    assert not os.path.exists(f"{path}.3") and not os.path.exists(f"{path}.tmp")
+
+
+def test_torn_file_falls_back_to_the_previous_generation(tmp_path):
+    path = str(tmp_path / "state.json")
+    store, value = StateStore(path=path), {"count" : 1}
+    store.register("counter", lambda: dict(value))
+    store.save()
+    value["count"] = 2
+    store.save()
+    with open(path, "w") as file:
+        file.write('{"format": 1, "version": 3, "sect') # a crash mid write
+    restarted = StateStore(path=path)
+    assert restarted.get("counter") == {"count" : 1} and restarted.version == 1
+
+
+def test_unchanged_state_is_not_written_again(tmp_path):
+    path = str(tmp_path / "state.json")
+    store = saved(path, iot={"hub/temperature" : 21})
+    modified = os.path.getmtime(path)
+    assert store.save() is False
+    assert store.stats()["unchanged"] == 1 and store.version == 1 and os.path.getmtime(path) == modified
+
+
+def test_foreign_and_stale_files_are_ignored(tmp_path):
+    path = str(tmp_path / "state.json")
+    with open(path, "w") as file:
+        json.dump({"format" : StateStore.FORMAT + 1, "version" : 7, "saved_at" : time.time(), "sections" : {"iot" : 1}}, file)
+    assert StateStore(path=path).get("iot") is None
+
+    with open(path, "w") as file:
+        json.dump({"format" : StateStore.FORMAT, "version" : 7, "saved_at" : time.time() - 7200, "sections" : {"iot" : 1}}, file)
+    store = StateStore(path=path, max_age=3600)
+    assert store.get("iot") is None and store.version == 7 # numbering goes on
+
+
+def test_a_failing_section_keeps_its_last_state(tmp_path):
+    path = str(tmp_path / "state.json")
+    saved(path, iot={"hub/temperature" : 21}, news=[1])
+    store = StateStore(path=path)
+    store.register("iot", lambda: 1 / 0)
+    store.register("news", lambda: [1, 2])
+    store.save()
+    assert StateStore(path=path).loaded == {"iot" : {"hub/temperature" : 21}, "news" : [1, 2]}
+    assert store.stats()["errors"] == 1
+
+
+def test_chat_is_restored_without_priming_the_model_again(agent_factory, tmp_path):
+    state = {"path" : str(tmp_path / "agent_state.json")}
+    agent, model, _ = agent_factory(state=state)
+    model.set_script([json.dumps({"response" : "hello there"})])
+    agent.process_user_query("hello")
+    agent.service_handler.service_handler.close() # saves the state
+
+    restarted, _, _ = agent_factory(state=state)
+    history = restarted.llm.history
+    assert len(history) == 4 # the context upload and the turn, no new upload
+    assert [history[2].role, history[2].parts[0].text] == ["user", "hello"]
+    assert json.loads(history[3].parts[0].text) == {"response" : "hello there"}
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from ..core.services import telemetry as telemetry_module
+from ..core.services.telemetry import Telemetry, NOOP_SPAN, traced
+from .conftest import wait_for
+
+
+def test_disabled_spans_are_free():
+    assert Telemetry().span("anything") is NOOP_SPAN
+
+
+def test_spans_count_calls_errors_and_durations():
+    telemetry = Telemetry()
+    telemetry.configure()
+    with telemetry.span("work"):
+        pass
+    with pytest.raises(RuntimeError):
+        with telemetry.span("work"):
+            raise RuntimeError("boom")
+    snapshot = telemetry.snapshot()["work"]
+    assert snapshot["count"] == 2 and snapshot["errors"] == 1
+
+
+def test_nested_spans_share_the_trace(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    telemetry = Telemetry()
+    telemetry.configure(trace_file=str(path))
+    with telemetry.span("turn") as turn:
+        with telemetry.span("tool", tool="iot_get_states") as tool:
+            tool.set(topics=2)
+
+    def records():
+        return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+    assert wait_for(lambda: len(records()) == 2) # written by the trace thread
+    tool_record, turn_record = records()
+    assert tool_record["parent"] == turn_record["span_id"]
+    assert tool_record["trace_id"] == turn_record["trace_id"] == turn.span_id
+    assert tool_record["attrs"] == {"tool" : "iot_get_states", "topics" : 2}
+
+
+def test_prometheus_exposition():
+    telemetry = Telemetry()
+    telemetry.configure()
+    with telemetry.span("model.call"):
+        pass
+    text = telemetry.render_prometheus()
+    assert 'agent_span_total{span="model.call"} 1' in text
+    assert 'agent_span_duration_seconds_count{span="model.call"} 1' in text
+    assert 'agent_span_duration_seconds_bucket{span="model.call",le="+Inf"} 1' in text
+
+
+def test_traced_uses_the_shared_telemetry(monkeypatch):
+    telemetry = Telemetry()
+    telemetry.configure()
+    monkeypatch.setattr(telemetry_module, "telemetry", telemetry)
+
+    @traced("decorated")
+    def work(value):
+        return value * 2
+
+    assert work(2) == 4
+    assert telemetry.snapshot()["decorated"]["count"] == 1
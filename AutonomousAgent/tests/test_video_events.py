@@ -0,0 +1,95 @@
+import json
+import os
+import time
+
+from ..core.services.video_events import VideoEventLog, parse_time
+
+
+def test_range_is_in_clip_order():
+    log = VideoEventLog(path=None, max_age=0)
+    for at, camera in [(30, "door"), (10, "garden"), (20, "door")]: # analyses finish out of order
+        log.append(camera=camera, path=f"{camera}/{at}.mp4", description="", at=at)
+    assert [event["at"] for event in log.range()] == [10, 20, 30]
+    assert [event["at"] for event in log.range(since=15, until=30)] == [20, 30]
+    assert [event["at"] for event in log.range(camera="door", limit=1)] == [30]
+    assert log.cameras() == ["door", "garden"]
+
+
+def test_retention_keeps_the_newest(tmp_path):
+    now = time.time()
+    log = VideoEventLog(path=str(tmp_path / "events.jsonl"), max_age=3600, max_events=2)
+    log.append(camera="door", path="old.mp4", description="", at=now - 7200)
+    assert len(log) == 0
+    for index in range(3):
+        log.append(camera="door", path=f"{index}.mp4", description="", at=now - 300 + index)
+    assert [event["path"] for event in log.range()] == ["1.mp4", "2.mp4"]
+
+
+def test_file_is_compacted_once_half_of_it_is_pruned(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    log = VideoEventLog(path=path, max_events=2)
+    now = time.time()
+    for index in range(3):
+        log.append(camera="door", path=f"{index}.mp4", description="", at=now + index)
+    with open(path) as file:
+        assert len(file.readlines()) == 3
+    log.append(camera="door", path="3.mp4", description="", at=now + 3)
+    with open(path) as file:
+        assert file.readlines() == [f"{json.dumps(event)}\n" for event in log.range()]
+
+
+def test_reload_skips_a_cut_line(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    now = time.time()
+    VideoEventLog(path=path).append(camera="door", path="0.mp4", description="", at=now)
+    with open(path, "a") as file:
+        file.write('{"at" : 1') # a crash mid write
+    assert [event["path"] for event in VideoEventLog(path=path).range()] == ["0.mp4"]
+
+
+def test_retained_predicts_the_prune():
+    now = time.time()
+    log = VideoEventLog(path=None, max_age=3600, max_events=2)
+    assert not log.retained(now - 7200, now)
+    assert log.retained(now - 600, now) # room left
+    log.append(camera="door", path="a.mp4", description="", at=now - 300)
+    log.append(camera="door", path="b.mp4", description="", at=now - 200)
+    assert not log.retained(now - 600, now) # older than everything kept in a full log
+    assert log.retained(now - 250, now)
+
+
+def test_retained_with_a_byte_budget():
+    now = time.time()
+    log = VideoEventLog(path=None, max_events=100, max_bytes=2000)
+    for index in range(50):
+        log.append(camera="door", path=f"{index}.mp4", description="x" * 100, at=now - 1000 + index)
+    assert log.bytes <= 2000
+    assert not log.retained(now - 5000, now)
+
+
+def test_parse_time_forms():
+    assert parse_time(None) is None and parse_time(12) == 12.0
+    assert parse_time("2024-05-01") == parse_time("2024-05-01 00:00:00") == parse_time("2024-05-01T00:00:00")
+
+
+def test_pruned_clips_are_not_analysed_again_after_a_restart(agent_factory, tmp_path):
+    folder = tmp_path / "videos"
+    folder.mkdir()
+    now = time.time()
+    clips = {"old.mp4" : now - 7200, "a.mp4" : now - 300, "b.mp4" : now - 200, "c.mp4" : now - 100}
+    for name, at in clips.items():
+        (folder / name).write_bytes(b"")
+        os.utime(folder / name, (at, at))
+
+    # the previous run analysed a, b and c; a was pruned by max_events and old.mp4 is past max_age
+    video = {"path" : str(tmp_path / "video_events.jsonl"), "max_age" : 3600, "max_events" : 2}
+    log = VideoEventLog(**video)
+    for name in ["a.mp4", "b.mp4", "c.mp4"]:
+        log.append(camera="default", path=str(folder / name), description="quiet", at=clips[name])
+    assert len(log) == 2
+
+    agent, _, _ = agent_factory(things=1, videos_folder=str(folder), video=video)
+    analysed = []
+    agent.analyse_video = lambda path: analysed.append(path)
+    assert agent._refresh_state() is False
+    assert analysed == []
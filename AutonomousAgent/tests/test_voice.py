@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from ..core.assistants.voice import SentenceChunker, SpeechSegmenter, merge_transcripts, read_wav, to_wav
+from ..testing.fake_audio import FakeSynthesizer, conversation
+
+
+def segments_of(path:str, **options) -> list:
+    rate, frames = read_wav(path)
+    segmenter = SpeechSegmenter(rate, **options)
+    segments = [segment for frame in frames for segment in segmenter.feed(frame)]
+    return segments + segmenter.flush()
+
+
+def test_segments_follow_the_speech(tmp_path):
+    path = str(tmp_path / "talk.wav")
+    spoken = conversation(path, [("silence", 1.0), ("speech", 1.5), ("silence", 1.0), ("speech", 1.0), ("silence", 0.5)])
+    segments = segments_of(path)
+    assert [(segment.utterance, segment.final) for segment in segments] == [(0, True), (1, True)]
+    for segment, (start, end) in zip(segments, spoken):
+        assert start - 0.25 <= segment.start <= start and end <= segment.end <= end + 0.4 # padding before, hangover after
+
+
+def test_long_utterance_goes_out_in_overlapping_pieces(tmp_path):
+    path = str(tmp_path / "talk.wav")
+    conversation(path, [("silence", 0.5), ("speech", 9.0), ("silence", 0.5)])
+    segments = segments_of(path, max_segment=4.0, overlap=0.5)
+    assert [segment.final for segment in segments] == [False, False, True]
+    assert {segment.utterance for segment in segments} == {0}
+    for first, second in zip(segments, segments[1:]):
+        assert first.end - second.start == pytest.approx(0.48, abs=0.03) # 16 frames of 30 ms
+
+
+def test_silence_and_clicks_are_not_sent(tmp_path):
+    path = str(tmp_path / "room.wav")
+    conversation(path, [("silence", 2.0), ("speech", 0.06), ("silence", 2.0)])
+    assert segments_of(path) == []
+
+
+def test_wav_round_trip(tmp_path):
+    samples = (np.arange(-200, 200) * 50).astype(np.int16)
+    path = tmp_path / "round.wav"
+    path.write_bytes(to_wav(samples, 8000))
+    rate, frames = read_wav(str(path), frame_ms=10)
+    assert rate == 8000 and np.array_equal(np.concatenate(list(frames)), samples)
+
+
+def test_merge_drops_the_repeated_words():
+    assert merge_transcripts("turn on the kitchen", "the Kitchen light please") == "light please"
+    assert merge_transcripts("good morning", "what time is it") == "what time is it"
+
+
+def test_chunker_cuts_at_sentence_ends():
+    chunker = SentenceChunker(min_chars=15, max_chars=60) # "Take a coat!" alone is too short
+    pieces = []
+    for piece in ["It is 3.5 degrees", " outside. Take a coat", "! And an umbrella"]:
+        pieces += chunker.feed(piece)
+    assert pieces == ["It is 3.5 degrees outside."]
+    assert chunker.flush() == ["Take a coat! And an umbrella"]
+
+
+def test_chunker_cuts_long_text_at_a_space():
+    chunker = SentenceChunker(min_chars=10, max_chars=20)
+    assert chunker.feed("one two three four five six seven") == ["one two three four"]
+    assert chunker.flush() == ["five six seven"]
+
+
+def test_speech_starts_with_the_first_sentence(agent_factory):
+    synthesizer = FakeSynthesizer(delay=0, delay_per_char=0)
+    agent, _, _ = agent_factory(voice={"synthesizer" : synthesizer, "chunker" : {"min_chars" : 5}})
+    audio = list(agent.stream_text_to_speech(iter(["Hello there. ", "The lights ", "are on."])))
+    assert synthesizer.texts == ["Hello there.", "The lights are on."]
+    assert len(audio) == 2 and all(audio)
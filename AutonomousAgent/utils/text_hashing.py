@@ -0,0 +1,37 @@
+import hashlib
+import re
+from typing import List
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _shingles(words: List[str], size: int) -> List[str]:
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str, shingle_size: int = 3) -> int: # 64 bits, near duplicates differ by few bits
+    weights = [0] * 64
+    for shingle in _shingles(normalize_text(text).split(), shingle_size):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (value >> bit) & 1 else -1
+
+    fingerprint = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")